@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import urlparse
+
+
+# Gather page signals in one CDP evaluate: title, HTTP status of the main document,
+# known challenge markup/iframes, a short slice of visible text, plus form/load state,
+# failed fetch/XHR responses (Resource Timing) and uncaught page errors used by the
+# failure classifier.
+SIGNALS_JS = r"""
+(() => {
+  if (!window.__weaszelErrors) {
+    // Uncaught errors / rejections from here on (the buffer lives as long as the document)
+    const buf = window.__weaszelErrors = [];
+    const push = (m) => { buf.push(String(m || 'error').slice(0, 200)); if (buf.length > 5) buf.shift(); };
+    window.addEventListener('error', (e) => push(e.message));
+    window.addEventListener('unhandledrejection', (e) => push('unhandled rejection: ' + ((e.reason && e.reason.message) || e.reason)));
+  }
+  const since = performance.now() - 15000;
+  const net_failed = performance.getEntriesByType('resource')
+    .filter(r => (r.initiatorType === 'fetch' || r.initiatorType === 'xmlhttprequest') && r.startTime >= since &&
+      r.responseStatus >= 400)
+    .slice(-5).map(r => ({ status: r.responseStatus, url: r.name.slice(0, 120) }));
+  const nav = performance.getEntriesByType('navigation')[0];
+  const frames = Array.from(document.querySelectorAll('iframe')).map(f => {
+    const r = f.getBoundingClientRect();
+    return { src: (f.src || '').slice(0, 200), visible: r.width > 30 && r.height > 30 };
+  }).filter(f => /recaptcha|hcaptcha|challenges\.cloudflare\.com|captcha|arkoselabs|funcaptcha/i.test(f.src));
+  const markers = ['#challenge-form', '#cf-challenge-running', '.cf-browser-verification', '#cf-wrapper',
+    '#px-captcha', '#captcha-container', '.g-recaptcha', '.h-captcha', '#datadome-captcha']
+    .filter(sel => document.querySelector(sel));
+  const text = (document.body && document.body.innerText || '').replace(/\s+/g, ' ').trim();
+  const alerts = Array.from(document.querySelectorAll('[role=alert], [aria-live=assertive], .error, .field-error'))
+    .map(el => (el.innerText || '').trim()).filter(t => t && t.length < 200).slice(0, 3);
+  return {
+    url: location.href,
+    title: document.title || '',
+    status: nav && nav.responseStatus ? nav.responseStatus : null,
+    frames, markers,
+    text: text.slice(0, 1500).toLowerCase(),
+    text_len: text.length,
+    ready_state: document.readyState,
+    auth_inputs: Array.from(document.querySelectorAll('input[type=password], input[type=email]')).filter(el => {
+      const r = el.getBoundingClientRect();
+      return r.width > 0 && r.height > 0;
+    }).length,
+    invalid_fields: document.querySelectorAll('[aria-invalid=true], input:user-invalid, select:user-invalid, textarea:user-invalid').length,
+    alerts,
+    net_failed,
+    console_errors: window.__weaszelErrors.slice(-3),
+  };
+})()
+"""
+
+_CHALLENGE_TITLES = re.compile(
+    r"just a moment|attention required|access denied|are you a robot|security check|verify you are human|"
+    r"pardon our interruption|robot check|captcha",
+    re.IGNORECASE,
+)
+_CHALLENGE_TEXT = re.compile(
+    r"verify you are (a )?human|are you a robot|unusual traffic|checking (if the site connection is secure|your browser)|"
+    r"press (&|and) hold|complete the security check|enable javascript and cookies to continue|"
+    r"access (to this page has been )?denied|request blocked|you have been blocked"
+)
+
+# Full-page interstitial containers (not the .g-recaptcha / .h-captcha widgets that login forms embed).
+_WALL_MARKERS = ("#px-captcha", "#captcha-container", "#datadome-captcha")
+
+# Pages below this much visible text are "interstitial-sized": a real content page with an
+# embedded invisible reCAPTCHA is much longer.
+_INTERSTITIAL_TEXT_LEN = 1200
+
+
+@dataclass(frozen=True)
+class BotWall:
+    kind: str  # cloudflare | captcha | http_block | challenge_text
+    url: str
+    detail: str
+
+
+def classify_bot_wall(signals: dict[str, Any]) -> BotWall | None:
+    """Map raw page signals to a bot-wall verdict (None if the page looks normal)."""
+    if not signals:
+        return None
+    url = str(signals.get("url") or "")
+    title = str(signals.get("title") or "")
+    text = str(signals.get("text") or "")
+    short = int(signals.get("text_len") or 0) < _INTERSTITIAL_TEXT_LEN
+    markers = [str(m) for m in signals.get("markers") or []]
+    frames = [f for f in signals.get("frames") or [] if f.get("visible")]
+    status = signals.get("status")
+
+    if any(m.startswith(("#challenge-form", "#cf-", ".cf-")) for m in markers) or (
+        short and any("challenges.cloudflare.com" in str(f.get("src")) for f in frames)
+    ):
+        return BotWall(kind="cloudflare", url=url, detail=title or "cloudflare challenge")
+    wall_markers = [m for m in markers if m in _WALL_MARKERS]
+    if short and wall_markers:
+        return BotWall(kind="captcha", url=url, detail=wall_markers[0])
+    # A visible captcha iframe alone is what every short login/signup page with a reCAPTCHA
+    # checkbox looks like: it needs challenge wording or a 403/429 too, and no sign-in form.
+    challenged = bool(_CHALLENGE_TITLES.search(title) or _CHALLENGE_TEXT.search(text)) or status in (403, 429)
+    auth_form = int(signals.get("auth_inputs") or 0) > 0
+    if short and frames and challenged and not auth_form:
+        return BotWall(kind="captcha", url=url, detail=str(frames[0].get("src"))[:120])
+    if status in (403, 429) and short:
+        return BotWall(kind="http_block", url=url, detail=f"HTTP {status}")
+    if short and (_CHALLENGE_TITLES.search(title) or _CHALLENGE_TEXT.search(text)):
+        m = _CHALLENGE_TEXT.search(text)
+        return BotWall(kind="challenge_text", url=url, detail=(m.group(0) if m else title)[:120])
+    return None
+
+
+def domain_of(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class SiteBlockStats:
+    """
+    Per-domain visit/block counters persisted to logs/site_blocks.json.
+    Used to deprioritize sites that keep throwing bot walls at us.
+    record() only updates memory; flush() writes pending changes off the event loop.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.abspath("logs/site_blocks.json")
+        self.counts: dict[str, dict[str, int]] = self._load()
+        self._dirty = False
+
+    def _load(self) -> dict[str, dict[str, int]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            return {d: {"visits": int(v.get("visits", 0)), "blocks": int(v.get("blocks", 0))} for d, v in raw.items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save(self, payload: dict[str, dict[str, int]]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def record(self, domain: str, *, blocked: bool) -> None:
+        if not domain:
+            return
+        c = self.counts.setdefault(domain, {"visits": 0, "blocks": 0})
+        c["visits"] += 1
+        if blocked:
+            c["blocks"] += 1
+        self._dirty = True
+
+    async def flush(self) -> None:
+        """Persist recorded visits (no-op when nothing changed since the last flush)."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        payload = {d: dict(c) for d, c in self.counts.items()}
+        try:
+            await asyncio.to_thread(self._save, payload)
+        except OSError:
+            self._dirty = True
+
+    def block_rate(self, domain: str) -> float:
+        c = self.counts.get(domain)
+        if not c:
+            return 0.0
+        # Shrunk towards zero with two clean pseudo-visits (not Laplace: an unvisited site
+        # would start at 0.5), so a single unlucky visit doesn't bury a site forever.
+        return c["blocks"] / (c["visits"] + 2)
+
+    def rank(self, urls: list[str]) -> list[str]:
+        """Order URLs by ascending block rate (stable for ties)."""
+        return sorted(urls, key=lambda u: self.block_rate(domain_of(u)))
@@ -10,8 +10,18 @@ from retry_controller import RetryController
 from perf_context import current_task_id, current_step
 from perf_logger import span, emit
 from timed_llm import TimedLLM
+from llm_scheduler import Priority
 from thinking_engine import ThinkingEngine
 from thinking_controller import ThinkingController
+from form_filler import register_form_actions
+from popup_dismisser import PopupDismisser
+from bot_wall import SiteBlockStats, domain_of
+from replan import ReplanCache
+from site_ranking import SiteStrategyStore
+from user_profile import load_user_profile
+from memory_store import MemoryStore
+from memory_consolidation import MemoryConsolidator
+from checkpoint import CheckpointStore, StepCheckpointer, TaskCheckpoint, restore_browser_state
 
 console = Console()
 
@@ -48,8 +58,9 @@ class BrowserAgent:
             api_key=self.api_key,
             temperature=0.0,
         )
-        # Wrap for timing telemetry (thinking is integrated via step hooks, not by wrapping every LLM call)
-        self.llm = TimedLLM(base_llm)
+        # Wrap for timing telemetry and the shared rate-limit scheduler (agent steps run at foreground priority;
+        # thinking is integrated via step hooks, not by wrapping every LLM call)
+        self.llm = TimedLLM(base_llm, priority=Priority.FOREGROUND, site="agent")
         
         # Initialize or reuse the Browser session (Browser-Use BrowserSession)
         if browser is not None:
@@ -126,10 +137,73 @@ class BrowserAgent:
         
         # Initialize Controller
         self.controller = Controller()
+
+        # Bulk form filling from user_data.md (one action instead of one step per field)
+        self.user_profile = load_user_profile()
+        if self.user_profile is not None:
+            register_form_actions(self.controller, lambda: self.user_profile)
         
-        # Initialize Retry Controller
+        # Retry state is per task (RetryController); the stores it learns into below are per session.
+        # Kept on the instance for callers that inspect the last task.
         self.retry_controller = None
+
+        # Consent/newsletter overlay dismissal (local rules, no LLM steps); stats persist across tasks
+        self.popup_dismisser = PopupDismisser()
+        # Per-domain bot-wall rates, shared by every task's RetryController
+        self.site_blocks = SiteBlockStats()
+        self.replan_cache = ReplanCache()
+        # Learned site ordering per task type (success rate, wall time, block rate)
+        self.site_store = SiteStrategyStore(
+            block_stats=self.site_blocks, defaults=RetryController.WEBSITE_ALTERNATIVES
+        )
+        # Per-step checkpoints (logs/checkpoints/<task_id>.json.gz) for `resume <task_id>`
+        self.checkpoints = CheckpointStore()
+        # Relevance-indexed agent memory (logs/memory.sqlite3), shared by every task's ThinkingEngine
+        self.memory_store = MemoryStore(legacy_json=os.path.abspath("logs/working_memory.json"))
+        self.memory_consolidator = MemoryConsolidator(self.memory_store)
+        # One ThinkingEngine per session (LLM clients, rules, steering, caches); tasks only get a
+        # lightweight ThinkingController. The engine holds no per-task state, so tasks can share it.
+        self.thinking_engine = self._create_thinking_engine()
     
+    def _create_thinking_engine(self) -> ThinkingEngine | None:
+        try:
+            return ThinkingEngine(memory=self.memory_store)
+        except Exception as e:
+            console.print(f"[dim yellow]Thinking layer disabled ({e})[/dim yellow]")
+            return None
+
+    def _record_site_outcome(self, history, task_id: str | None, num_steps: int) -> None:
+        """
+        Credit (or debit) the site the task finished on, for SiteStrategyStore ranking.
+        Candidate sites the task left for another one count as failed attempts.
+        """
+        try:
+            urls = [u for u in (history.urls() or []) if u and u.startswith("http")]
+            if not urls:
+                return
+            domain = domain_of(urls[-1])
+            success = bool(history.is_done() and history.is_successful())
+            wall_s = history.total_duration_seconds()
+            candidates = {domain_of(u) for u in self.site_store.alternatives(self.task_type)}
+            abandoned = list(dict.fromkeys(d for d in map(domain_of, urls[:-1]) if d in candidates and d != domain))
+            for d in abandoned:
+                self.site_store.record_outcome(self.task_type, d, success=False, save=False)
+                emit("site.outcome", task_id=task_id, task_type=self.task_type, domain=d, success=False, abandoned=True)
+            self.site_store.record_outcome(
+                self.task_type, domain, success=success, steps=num_steps, wall_s=wall_s
+            )
+            emit(
+                "site.outcome",
+                task_id=task_id,
+                task_type=self.task_type,
+                domain=domain,
+                success=success,
+                steps=num_steps,
+                wall_s=round(wall_s, 2),
+            )
+        except Exception:
+            pass
+
     def _display_cost(self, num_steps: int = 0):
         """Display colorful cost breakdown"""
         # Gemini 2.5 Flash pricing per 1M tokens
@@ -212,13 +286,21 @@ class BrowserAgent:
         ))
         console.print()
 
-    def run_sync(self, task: str):
+    def _token_totals(self) -> dict[str, int]:
+        return {
+            "input": self.total_input_tokens,
+            "output": self.total_output_tokens,
+            "cached": self.total_cached_tokens,
+        }
+
+    def run_sync(self, task: str, resume: TaskCheckpoint | None = None):
         """Synchronous wrapper around async run method"""
-        return asyncio.run(self.run(task))
+        return asyncio.run(self.run(task, resume=resume))
 
-    async def run(self, task: str) -> str:
+    async def run(self, task: str, resume: TaskCheckpoint | None = None) -> str:
         """
         Executes the given task using the browser agent with intelligent retry logic.
+        With `resume`, continues a checkpointed task from its last completed step.
         """
         console.print(f"[bold cyan]🚀 Browser-Use Agent Starting...[/bold cyan]")
         console.print(f"[dim]Model: {self.model_name}[/dim]")
@@ -251,7 +333,29 @@ class BrowserAgent:
             use_judge = False
             step_timeout = 120
 
-        agent = Agent(
+        agent_kwargs = {}
+        if resume is not None:
+            state = resume.restore_agent_state()
+            if state is not None:
+                agent_kwargs["injected_agent_state"] = state
+                console.print(f"[dim]↩️  Resuming from step {resume.step} ({resume.url or 'no url'})[/dim]")
+            else:
+                console.print("[yellow]⚠️  Checkpoint history is not compatible; restarting from the saved page.[/yellow]")
+            self.total_input_tokens = max(self.total_input_tokens, int(resume.totals.get("input", 0)))
+            self.total_output_tokens = max(self.total_output_tokens, int(resume.totals.get("output", 0)))
+            self.total_cached_tokens = max(self.total_cached_tokens, int(resume.totals.get("cached", 0)))
+
+        # WEASZEL_STREAMING=1: start each action as soon as the model has written it (see streaming_agent.py)
+        agent_cls = Agent
+        if os.environ.get("WEASZEL_STREAMING", "0").lower() in ("1", "true", "yes", "on"):
+            try:
+                from streaming_agent import StreamingAgent
+
+                agent_cls = StreamingAgent
+            except ImportError as e:
+                console.print(f"[yellow]⚠️  Streaming disabled: {e}[/yellow]")
+
+        agent = agent_cls(
             task=task,
             llm=self.llm,
             browser=self.browser,
@@ -263,39 +367,73 @@ class BrowserAgent:
             use_judge=use_judge,
             step_timeout=step_timeout,
             save_conversation_path="logs/conversation.json",
+            **agent_kwargs,
         )
         
         # Set default search engine to DuckDuckGo
         if hasattr(agent, 'browser_context') and hasattr(agent.browser_context, 'config'):
             agent.browser_context.config.default_search_engine = 'duckduckgo'
 
+        checkpointer: StepCheckpointer | None = None
+        thinking_controller: ThinkingController | None = None
+        task_success = False
         try:
-            # Initialize retry controller
-            self.retry_controller = RetryController(
+            # Per-task retry state over the session's shared stores (cheap to construct)
+            retry = RetryController(
                 llm=self.llm,
                 browser_session=agent.browser_session,
-                task_type=self.task_type
+                task_type=self.task_type,
+                block_stats=self.site_blocks,
+                replan_cache=self.replan_cache,
+                site_store=self.site_store,
             )
+            self.retry_controller = retry
+            if resume is not None:
+                retry.restore(resume.retry_state)
 
-            # Initialize thinking system (optional, gated by WEASZEL_THINKING_MODE)
-            thinking_engine = None
-            thinking_controller = None
-            try:
-                thinking_engine = ThinkingEngine()
-                thinking_controller = ThinkingController(thinking_engine, task=task)
-            except Exception:
-                thinking_controller = None
+            if task_id:
+                checkpointer = StepCheckpointer(
+                    self.checkpoints,
+                    resume if resume is not None else TaskCheckpoint(task_id=task_id, task=task, task_type=self.task_type),
+                )
+            pending_restore = resume
+
+            # Per-task thinking state over the session engine (optional, gated by WEASZEL_THINKING_MODE)
+            if self.thinking_engine is not None:
+                thinking_controller = ThinkingController(
+                    self.thinking_engine,
+                    task=task,
+                    task_type=self.task_type,
+                    failure_class_of=lambda: retry.tracker.last_failure_class,
+                )
+                # Pre-step thinking runs in the background and is attached right before the step's LLM call
+                self.llm.before_invoke.append(thinking_controller.before_llm_call)
+
+            self.popup_dismisser.reset()
 
             async def _on_step_start(a):
-                # Compose multiple hooks
-                await self.retry_controller.on_step_start(a)
+                nonlocal pending_restore
+                if pending_restore is not None:
+                    # First hook after the browser is up: cookies, last good URL, localStorage.
+                    cp, pending_restore = pending_restore, None
+                    try:
+                        await restore_browser_state(a.browser_session, cp)
+                    except Exception as e:
+                        console.print(f"[yellow]⚠️  Could not restore browser state: {e}[/yellow]")
+                # Compose multiple hooks. Popups go first so the DOM snapshot is already clean.
+                await self.popup_dismisser.on_step_start(a)
+                await retry.on_step_start(a)
                 if thinking_controller is not None:
                     await thinking_controller.on_step_start(a)
 
             async def _on_step_end(a):
-                await self.retry_controller.on_step_end(a)
+                await retry.on_step_end(a)
                 if thinking_controller is not None:
                     await thinking_controller.on_step_end(a)
+                if checkpointer is not None:
+                    await checkpointer.on_step_end(
+                        a, retry_state=retry.snapshot(), totals=self._token_totals()
+                    )
             
             # Run agent with retry hooks
             with span("agent.run", task_id=task_id, speed_mode=self.speed_mode):
@@ -347,6 +485,14 @@ class BrowserAgent:
             # Display cost
             self._display_cost(num_steps=num_steps)
 
+            self._record_site_outcome(history, task_id=task_id, num_steps=num_steps)
+            task_success = bool(history.is_done() and history.is_successful())
+            if checkpointer is not None:
+                done = bool(history.is_done())
+                checkpointer.finish(ok=done, error="" if done else "stopped before completion")
+                if not done:
+                    console.print(f"[dim]💾 Progress saved. Continue later with: resume {task_id}[/dim]")
+
             # Emit step metadata if available
             try:
                 if hasattr(history, "history") and history.history:
@@ -371,14 +517,39 @@ class BrowserAgent:
                 
         except Exception as e:
             console.print(f"[bold red]❌ Error during execution:[/bold red] {str(e)}")
+            if checkpointer is not None and checkpointer.cp.step > 0:
+                checkpointer.finish(ok=False, error=str(e))
+                console.print(f"[dim]💾 Progress saved at step {checkpointer.cp.step}. Continue with: resume {task_id}[/dim]")
             return f"Error: {str(e)}"
         finally:
+            if thinking_controller is not None:
+                try:
+                    await thinking_controller.aclose()
+                except Exception:
+                    pass
+                if thinking_controller.before_llm_call in self.llm.before_invoke:
+                    self.llm.before_invoke.remove(thinking_controller.before_llm_call)
+            await self._settle_memory(task_id, success=task_success)
             emit("task.end", task_id=task_id)
             current_step.reset(token_step)
             current_task_id.reset(token_task)
             if self._owns_browser and not self.persist_browser:
                 await self.browser.stop()
 
+    async def _settle_memory(self, task_id: str | None, *, success: bool) -> None:
+        """Credit memory items injected during the task, then consolidate between tasks (off-loop)."""
+        try:
+            if task_id:
+                await asyncio.to_thread(self.memory_store.record_task_outcome, task_id, success=success)
+            report = await asyncio.to_thread(self.memory_consolidator.maybe_run)
+            if report is not None and (report.merged or report.dropped):
+                console.print(
+                    f"[dim]🧹 Memory consolidated: {report.before} → {report.after} items "
+                    f"({report.merged} merged, {report.dropped} dropped)[/dim]"
+                )
+        except Exception as e:
+            emit("memory.consolidate_error", task_id=task_id, error=str(e)[:200])
+
     async def stop(self) -> None:
         """Stop the owned browser session (used when persist_browser=True)."""
         if self._owns_browser:
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+async def evaluate_js(browser_session: Any, expression: str, *, await_promise: bool = False) -> Any:
+    """
+    Evaluate a JS expression in the focused page via CDP and return its JSON value.
+
+    Browser-Use sessions are CDP-native, so this avoids a Playwright round-trip.
+    Returns None when the expression produced no serializable value.
+    """
+    cdp_session = await browser_session.get_or_create_cdp_session()
+    res = await cdp_session.cdp_client.send.Runtime.evaluate(
+        params={"expression": expression, "returnByValue": True, "awaitPromise": await_promise},
+        session_id=cdp_session.session_id,
+    )
+    if res.get("exceptionDetails"):
+        raise RuntimeError(str(res["exceptionDetails"].get("text", "JS evaluation failed")))
+    return (res.get("result") or {}).get("value")
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any
+from urllib.parse import urlparse
+
+from cdp_eval import evaluate_js
+
+
+def _enabled() -> bool:
+    return os.environ.get("WEASZEL_CHECKPOINT", "1").lower() not in ("0", "off", "false", "no")
+
+
+def _ttl_s() -> float:
+    """Unfinished checkpoints older than WEASZEL_CHECKPOINT_TTL_DAYS (default 7) are deleted."""
+    try:
+        return float(os.environ.get("WEASZEL_CHECKPOINT_TTL_DAYS", "7")) * 86400
+    except ValueError:
+        return 7 * 86400
+
+
+# Task ids are generated as uuid4().hex[:12]; anything path-like is rejected before it reaches the filesystem
+_TASK_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _origin(url: str) -> str:
+    p = urlparse(url)
+    return f"{p.scheme}://{p.netloc}" if p.scheme in ("http", "https") and p.netloc else ""
+
+
+# Only the current origin's localStorage is captured (that is what we navigate back to).
+_LOCAL_STORAGE_JS = r"""
+(() => {
+  try {
+    const out = {};
+    for (let i = 0; i < localStorage.length && i < 200; i++) {
+      const k = localStorage.key(i);
+      const v = localStorage.getItem(k);
+      if (v !== null && v.length < 20000) out[k] = v;
+    }
+    return { origin: location.origin, items: out };
+  } catch (e) { return null; }
+})()
+"""
+
+
+@dataclass
+class TaskCheckpoint:
+    """Everything needed to continue a browser task from its last completed step."""
+
+    task_id: str
+    task: str
+    task_type: str
+    step: int = 0
+    url: str = ""
+    status: str = "running"  # running | failed | done
+    error: str = ""
+    # Browser-Use AgentState (history items, n_steps, ...) as JSON
+    agent_state: dict[str, Any] = field(default_factory=dict)
+    retry_state: dict[str, Any] = field(default_factory=dict)
+    totals: dict[str, int] = field(default_factory=dict)
+    # Origins the task visited; cookies/localStorage are only captured for these
+    origins: list[str] = field(default_factory=list)
+    cookies: list[dict[str, Any]] = field(default_factory=list)
+    local_storage: dict[str, Any] = field(default_factory=dict)
+    updated: float = 0.0
+
+    def restore_agent_state(self) -> Any | None:
+        """Rebuild a Browser-Use AgentState for `Agent(injected_agent_state=...)` (None if incompatible)."""
+        if not self.agent_state:
+            return None
+        try:
+            from browser_use.agent.views import AgentState
+
+            state = AgentState.model_validate(self.agent_state)
+            state.stopped = False
+            state.paused = False
+            state.consecutive_failures = 0
+            return state
+        except Exception:
+            return None
+
+
+class CheckpointStore:
+    """
+    One gzip'd JSON file per task under logs/checkpoints/<task_id>.json.gz, rewritten
+    after every step. Writes go through a temp file + rename so a crash mid-write
+    leaves the previous checkpoint intact. Files hold session cookies, so they are
+    owner-only (0600) and expire after WEASZEL_CHECKPOINT_TTL_DAYS.
+    """
+
+    def __init__(self, root: str | None = None):
+        self.root = root or os.path.abspath("logs/checkpoints")
+
+    def _path(self, task_id: str) -> str:
+        if not _TASK_ID_RE.match(task_id or ""):
+            raise ValueError(f"invalid task id: {task_id!r}")
+        return os.path.join(self.root, f"{task_id}.json.gz")
+
+    def exists(self, task_id: str) -> bool:
+        try:
+            return os.path.isfile(self._path(task_id))
+        except ValueError:
+            return False
+
+    def save(self, cp: TaskCheckpoint) -> None:
+        os.makedirs(self.root, mode=0o700, exist_ok=True)
+        cp.updated = time.time()
+        path = self._path(cp.task_id)
+        tmp = path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.fchmod(fd, 0o600)  # a leftover tmp file keeps its old mode otherwise
+        with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8", compresslevel=5) as f:
+            json.dump(asdict(cp), f, ensure_ascii=False, separators=(",", ":"), default=str)
+        os.replace(tmp, path)
+
+    def prune(self) -> int:
+        """Delete checkpoints not written for longer than the TTL; returns how many went."""
+        cutoff = time.time() - _ttl_s()
+        removed = 0
+        try:
+            names = [n for n in os.listdir(self.root) if n.endswith((".json.gz", ".json.gz.tmp"))]
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def load(self, task_id: str) -> TaskCheckpoint | None:
+        try:
+            with gzip.open(self._path(task_id), "rt", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return None
+        known = {f.name for f in fields(TaskCheckpoint)}
+        try:
+            return TaskCheckpoint(**{k: v for k, v in raw.items() if k in known})
+        except TypeError:
+            return None
+
+    def latest(self) -> TaskCheckpoint | None:
+        """Most recently updated checkpoint that did not finish (expired ones are pruned first)."""
+        self.prune()
+        try:
+            names = [n for n in os.listdir(self.root) if n.endswith(".json.gz")]
+        except OSError:
+            return None
+        names.sort(key=lambda n: os.path.getmtime(os.path.join(self.root, n)), reverse=True)
+        for name in names:
+            cp = self.load(name[: -len(".json.gz")])
+            if cp is not None and cp.status != "done":
+                return cp
+        return None
+
+    def delete(self, task_id: str) -> None:
+        try:
+            os.remove(self._path(task_id))
+        except (OSError, ValueError):
+            pass
+
+
+async def capture_browser_state(
+    browser_session: Any, origins: list[str]
+) -> tuple[list[dict[str, Any]], dict[str, Any]]:
+    """
+    Cookies that apply to the task's origins and the current origin's localStorage, via CDP.
+    Nothing from sites the task never visited (other logins in the profile) is written out.
+    """
+    cookies: list[dict[str, Any]] = []
+    storage: dict[str, Any] = {}
+    if not origins:
+        return cookies, storage
+    try:
+        cdp_session = await browser_session.get_or_create_cdp_session()
+        res = await cdp_session.cdp_client.send.Network.getCookies(
+            params={"urls": [o + "/" for o in origins]}, session_id=cdp_session.session_id
+        )
+        cookies = list(res.get("cookies") or [])
+    except Exception:
+        pass
+    try:
+        storage = await evaluate_js(browser_session, _LOCAL_STORAGE_JS) or {}
+        if storage.get("origin") not in origins:
+            storage = {}
+    except Exception:
+        storage = {}
+    return cookies, storage
+
+
+_COOKIE_PARAM_KEYS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+
+async def restore_browser_state(browser_session: Any, cp: TaskCheckpoint) -> None:
+    """Put cookies back, open the last good URL and re-seed its localStorage."""
+    from browser_use.browser.events import NavigateToUrlEvent
+
+    if cp.cookies:
+        try:
+            cdp_session = await browser_session.get_or_create_cdp_session()
+            params = [{k: c[k] for k in _COOKIE_PARAM_KEYS if k in c} for c in cp.cookies]
+            await cdp_session.cdp_client.send.Network.setCookies(
+                params={"cookies": params}, session_id=cdp_session.session_id
+            )
+        except Exception:
+            pass
+    if not cp.url.startswith("http"):
+        return
+    event = browser_session.event_bus.dispatch(NavigateToUrlEvent(url=cp.url, new_tab=False))
+    await event
+    await event.event_result(raise_if_any=False, raise_if_none=False)
+    items = (cp.local_storage or {}).get("items") or {}
+    if items:
+        try:
+            await evaluate_js(
+                browser_session,
+                f"(() => {{ const d = {json.dumps(items)}; for (const k in d) localStorage.setItem(k, d[k]); }})()",
+            )
+        except Exception:
+            pass
+
+
+class StepCheckpointer:
+    """Step hook that snapshots agent + browser + retry state after each completed step."""
+
+    def __init__(self, store: CheckpointStore, cp: TaskCheckpoint):
+        self.store = store
+        self.cp = cp
+
+    async def on_step_end(self, agent: Any, *, retry_state: dict[str, Any], totals: dict[str, int]) -> None:
+        if not _enabled():
+            return
+        cp = self.cp
+        cp.status = "running"
+        cp.error = ""
+        cp.step = int(getattr(agent.state, "n_steps", cp.step) or cp.step)
+        bs = getattr(agent.browser_session, "_cached_browser_state_summary", None)
+        url = str(getattr(bs, "url", "") or "")
+        if url.startswith("http"):
+            cp.url = url
+            origin = _origin(url)
+            if origin and origin not in cp.origins:
+                cp.origins.append(origin)
+        try:
+            cp.agent_state = agent.state.model_dump(mode="json")
+        except Exception:
+            pass
+        cp.retry_state = retry_state
+        cp.totals = totals
+        cp.cookies, cp.local_storage = await capture_browser_state(agent.browser_session, cp.origins)
+        try:
+            await asyncio.to_thread(self.store.save, cp)
+        except Exception:
+            pass
+
+    def finish(self, *, ok: bool, error: str = "") -> None:
+        if not _enabled():
+            return
+        if ok:
+            # Completed tasks have nothing to resume.
+            self.store.delete(self.cp.task_id)
+            return
+        self.cp.status = "failed"
+        self.cp.error = error[:500]
+        try:
+            self.store.save(self.cp)
+        except Exception:
+            pass
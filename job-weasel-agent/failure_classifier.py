@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Literal
+
+
+FailureClass = Literal[
+    "element_not_found",
+    "navigation_timeout",
+    "blocked",
+    "stale_dom",
+    "validation_error",
+    "llm_parse",
+    "rate_limit",
+    "unknown",
+]
+
+
+@dataclass(frozen=True)
+class StepFailure:
+    cls: FailureClass
+    evidence: str
+
+
+@dataclass(frozen=True)
+class EscalationThresholds:
+    """Consecutive failures of one class (on the same goal) before each escalation."""
+
+    replan: int
+    switch_site: int
+
+
+# Deterministic recovery runs on every failure; these only decide when to spend an LLM
+# replan or abandon the site. Site-independent problems never trigger a site switch.
+THRESHOLDS: dict[str, EscalationThresholds] = {
+    "element_not_found": EscalationThresholds(replan=3, switch_site=8),
+    "stale_dom": EscalationThresholds(replan=4, switch_site=10),
+    "navigation_timeout": EscalationThresholds(replan=99, switch_site=3),
+    "blocked": EscalationThresholds(replan=99, switch_site=1),
+    "validation_error": EscalationThresholds(replan=3, switch_site=99),
+    "llm_parse": EscalationThresholds(replan=99, switch_site=99),
+    "rate_limit": EscalationThresholds(replan=99, switch_site=99),
+    "unknown": EscalationThresholds(replan=5, switch_site=10),
+}
+
+# Checked in order; the first match wins.
+_ERROR_PATTERNS: list[tuple[FailureClass, re.Pattern[str]]] = [
+    ("rate_limit", re.compile(r"\b429\b|rate.?limit|resource.?exhausted|quota|too many requests", re.I)),
+    ("llm_parse", re.compile(
+        r"could not parse|failed to parse|invalid (json|model output)|validation errors? for \w*output|"
+        r"jsondecodeerror|expecting value|unterminated string",
+        re.I,
+    )),
+    ("blocked", re.compile(r"captcha|access denied|\b403\b|forbidden|bot (check|detection)", re.I)),
+    ("stale_dom", re.compile(
+        r"stale|detached|no node (found )?with given id|node is not|not attached|element is not (attached|present)",
+        re.I,
+    )),
+    ("navigation_timeout", re.compile(r"time(d)?\s?out|net::err_|navigation (failed|timeout)|page (did not|didn't) load", re.I)),
+    ("element_not_found", re.compile(
+        r"element (with index \d+ )?(does not exist|not found|not available)|index \d+ (does not exist|not found)|"
+        r"no (such )?element|could not find (the )?element|not (visible|clickable|interactable)",
+        re.I,
+    )),
+]
+
+_NEGATED = re.compile(r"\b(no|without|zero|0|not any)\s+(errors?|failures?|issues?)\b", re.I)
+_EVAL_FAILURE = re.compile(
+    r"\b(fail(ed|ure)?|unsuccessful|unable to|could not|couldn't|did not work|didn't work|error)\b", re.I
+)
+_EVAL_VALIDATION = re.compile(
+    r"required field|is required|please (enter|fill|select)|invalid (email|phone|format|value)|validation", re.I
+)
+
+
+def _eval_says_failed(eval_text: str) -> bool:
+    text = _NEGATED.sub(" ", eval_text or "")
+    # Browser-Use often prefixes evaluations with an explicit verdict.
+    if re.match(r"^\s*(success|successful|succeeded)\b", text, re.I):
+        return False
+    return bool(_EVAL_FAILURE.search(text))
+
+
+def _network_failure(net_failed: list[dict[str, Any]]) -> StepFailure | None:
+    """Failed fetch/XHR calls of the page: 429 → rate_limit, 5xx → navigation_timeout."""
+    for status, cls in ((429, "rate_limit"), (500, "navigation_timeout")):
+        for r in net_failed:
+            code = int(r.get("status") or 0)
+            if code == status or (status == 500 and code >= 500):
+                return StepFailure(cls=cls, evidence=f"HTTP {code} {str(r.get('url') or '')[:150]}")
+    return None
+
+
+def classify_step(
+    *,
+    errors: list[str],
+    eval_text: str,
+    page: dict[str, Any] | None = None,
+    bot_wall: bool = False,
+) -> StepFailure | None:
+    """
+    Map one step's outcome to a failure class (None = step did not fail).
+
+    Signals, strongest first: bot-wall verdict, action error text, page state
+    (invalid form fields, document never finished loading), failed fetch/XHR responses
+    and uncaught page errors (`net_failed` / `console_errors` from bot_wall.SIGNALS_JS),
+    then the model's own evaluation text with negations ("no errors found") removed.
+    Network and console signals only pick the class of a step that already failed;
+    sites log errors all the time, so they never turn a success into a failure.
+    """
+    if bot_wall:
+        return StepFailure(cls="blocked", evidence="bot wall detected")
+
+    page = page or {}
+    error_text = " | ".join(e for e in errors if e)
+    if error_text:
+        for cls, pattern in _ERROR_PATTERNS:
+            if pattern.search(error_text):
+                return StepFailure(cls=cls, evidence=error_text[:200])
+
+    eval_failed = _eval_says_failed(eval_text)
+    if not error_text and not eval_failed:
+        return None
+
+    if int(page.get("invalid_fields") or 0) > 0 or _EVAL_VALIDATION.search(eval_text or ""):
+        alerts = "; ".join(str(a) for a in (page.get("alerts") or [])[:3])
+        return StepFailure(cls="validation_error", evidence=(alerts or eval_text or error_text)[:200])
+    if page.get("ready_state") == "loading":
+        return StepFailure(cls="navigation_timeout", evidence="document still loading")
+    net = _network_failure(page.get("net_failed") or [])
+    if net is not None:
+        return net
+    console_text = " | ".join(str(e) for e in page.get("console_errors") or [] if e)
+    if console_text:
+        for cls, pattern in _ERROR_PATTERNS:
+            if pattern.search(console_text):
+                return StepFailure(cls=cls, evidence=f"console: {console_text[:190]}")
+    if eval_failed and not error_text:
+        for cls, pattern in _ERROR_PATTERNS:
+            if pattern.search(eval_text):
+                return StepFailure(cls=cls, evidence=eval_text[:200])
+    return StepFailure(cls="unknown", evidence=(error_text or eval_text)[:200])
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from browser_use import Controller
+from browser_use.agent.views import ActionResult
+from browser_use.browser import BrowserSession
+
+from cdp_eval import evaluate_js
+from perf_context import current_step, current_task_id
+from perf_logger import emit
+from user_profile import UserProfile
+
+
+# Collect fillable fields and tag them with a stable index attribute so the fill pass
+# can address them without re-walking the DOM. Tags from earlier collections are cleared
+# first: after a re-render a stale (possibly hidden) field could otherwise match the index.
+_COLLECT_JS = r"""
+(() => {
+  document.querySelectorAll('[data-weaszel-fill]').forEach((el) => el.removeAttribute('data-weaszel-fill'));
+  const SKIP = new Set(['hidden', 'submit', 'button', 'image', 'reset', 'checkbox', 'radio', 'password']);
+  const text = (el) => (el && el.textContent || '').replace(/\s+/g, ' ').trim().slice(0, 120);
+  const visible = (el) => {
+    const r = el.getBoundingClientRect();
+    const s = getComputedStyle(el);
+    return r.width > 0 && r.height > 0 && s.visibility !== 'hidden' && s.display !== 'none';
+  };
+  const labelFor = (el) => {
+    if (el.labels && el.labels.length) return text(el.labels[0]);
+    const by = el.getAttribute('aria-labelledby');
+    if (by) return by.split(/\s+/).map(id => text(document.getElementById(id))).join(' ').trim();
+    const wrap = el.closest('label');
+    return wrap ? text(wrap) : '';
+  };
+  const out = [];
+  document.querySelectorAll('input, select, textarea').forEach((el) => {
+    const type = (el.getAttribute('type') || el.tagName).toLowerCase();
+    if (SKIP.has(type) || el.disabled || el.readOnly || !visible(el)) return;
+    const idx = out.length;
+    el.setAttribute('data-weaszel-fill', String(idx));
+    out.push({
+      idx, type, tag: el.tagName.toLowerCase(),
+      name: el.getAttribute('name') || '', id: el.id || '',
+      autocomplete: el.getAttribute('autocomplete') || '',
+      aria_label: el.getAttribute('aria-label') || '',
+      placeholder: el.getAttribute('placeholder') || '',
+      label: labelFor(el),
+      value: type === 'file' ? '' : (el.value || ''),
+    });
+  });
+  return out;
+})()
+"""
+
+# Fill values using the native setter so React/Vue controlled inputs see the change.
+_FILL_JS = r"""
+((values) => {
+  const filled = [], failed = [];
+  for (const [idx, value] of Object.entries(values)) {
+    const el = document.querySelector(`[data-weaszel-fill="${idx}"]`);
+    if (!el) { failed.push(Number(idx)); continue; }
+    try {
+      if (el.tagName === 'SELECT') {
+        const want = String(value).toLowerCase();
+        const opt = Array.from(el.options).find(o => o.text.toLowerCase().includes(want) || o.value.toLowerCase() === want);
+        if (!opt) { failed.push(Number(idx)); continue; }
+        el.value = opt.value;
+      } else {
+        const proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+        Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+      }
+      el.dispatchEvent(new Event('input', { bubbles: true }));
+      el.dispatchEvent(new Event('change', { bubbles: true }));
+      el.dispatchEvent(new Event('blur', { bubbles: true }));
+      filled.push(Number(idx));
+    } catch (e) {
+      failed.push(Number(idx));
+    }
+  }
+  return { filled, failed };
+})(__VALUES__)
+"""
+
+# HTML autocomplete tokens are the most reliable signal when present.
+_AUTOCOMPLETE_KEYS: dict[str, str] = {
+    "name": "full_name",
+    "given-name": "first_name",
+    "family-name": "last_name",
+    "email": "email",
+    "tel": "phone",
+    "tel-national": "phone",
+    "address-level2": "city",
+    "street-address": "location",
+    "url": "website",
+}
+
+# Ordered: more specific patterns first ("first name" before "name").
+_KEYWORD_KEYS: list[tuple[re.Pattern[str], str | None]] = [
+    (re.compile(r"first[\s_-]*name|given[\s_-]*name|fname"), "first_name"),
+    (re.compile(r"last[\s_-]*name|family[\s_-]*name|surname|lname"), "last_name"),
+    (re.compile(r"e-?mail"), "email"),
+    (re.compile(r"phone|mobile|(?<![a-z])tel(?![a-z])|telephone"), "phone"),
+    (re.compile(r"linkedin"), "linkedin"),
+    (re.compile(r"github"), "github"),
+    (re.compile(r"website|portfolio|personal[\s_-]*site|\burl\b"), "website"),
+    (re.compile(r"authori[sz]ed|authori[sz]ation|sponsorship|visa"), "work_authorization"),
+    # Names/addresses of *other* entities must not receive the user's own values.
+    (re.compile(r"company|employer|school|university|referr?al|reference"), None),
+    (re.compile(r"\bcity\b"), "city"),
+    (re.compile(r"location|address"), "location"),
+    (re.compile(r"full[\s_-]*name|^name$|your name|\bname\b"), "full_name"),
+]
+
+
+@dataclass
+class FieldMatch:
+    idx: int
+    key: str | None
+    descriptor: str
+
+
+def _describe(field: dict[str, Any]) -> str:
+    for k in ("label", "aria_label", "placeholder", "name", "id"):
+        v = str(field.get(k) or "").strip()
+        if v:
+            return v[:60]
+    return f"{field.get('tag', 'field')}#{field.get('idx')}"
+
+
+def match_field(field: dict[str, Any]) -> str | None:
+    """Map a collected form field to a profile key (or None if unknown)."""
+    if field.get("type") == "file":
+        return "resume_path"
+    for token in str(field.get("autocomplete") or "").lower().split():
+        if token in _AUTOCOMPLETE_KEYS:
+            return _AUTOCOMPLETE_KEYS[token]
+    if field.get("type") == "email":
+        return "email"
+    if field.get("type") == "tel":
+        return "phone"
+    haystack = " ".join(
+        str(field.get(k) or "") for k in ("label", "aria_label", "name", "id", "placeholder")
+    ).lower()
+    for pattern, key in _KEYWORD_KEYS:
+        if pattern.search(haystack):
+            return key
+    return None
+
+
+def plan_fill(
+    fields: list[dict[str, Any]], values: dict[str, str], overwrite: bool = False
+) -> tuple[dict[int, str], list[FieldMatch]]:
+    """
+    Decide what to fill. Returns ({idx: value}, unmapped) where unmapped lists fields
+    the model still has to handle itself (unknown field or no profile value).
+    """
+    to_fill: dict[int, str] = {}
+    unmapped: list[FieldMatch] = []
+    for f in fields:
+        key = match_field(f)
+        match = FieldMatch(idx=int(f["idx"]), key=key, descriptor=_describe(f))
+        if key == "resume_path":
+            # File inputs can't be set from JS; the model uses upload_file for these.
+            unmapped.append(match)
+            continue
+        if key is None or key not in values:
+            unmapped.append(match)
+            continue
+        if f.get("value") and not overwrite:
+            continue
+        to_fill[match.idx] = values[key]
+    return to_fill, unmapped
+
+
+def register_form_actions(controller: Controller, profile_loader: Callable[[], UserProfile | None]) -> None:
+    """Register the bulk profile form-filling action on a Browser-Use Controller."""
+
+    @controller.action(
+        "Fill ALL visible fields of the current form from the user's profile in one action "
+        "(name, email, phone, links, location, work authorization). Use this first on application/sign-up "
+        "forms, then handle only the fields it reports as unmapped."
+    )
+    async def fill_form_from_profile(browser_session: BrowserSession, overwrite: bool = False) -> ActionResult:
+        profile = profile_loader()
+        if profile is None:
+            return ActionResult(error="No user profile available (user_data.md missing or empty).")
+
+        fields = await evaluate_js(browser_session, _COLLECT_JS) or []
+        if not fields:
+            return ActionResult(error="No fillable form fields are visible on this page.")
+
+        to_fill, unmapped = plan_fill(fields, profile.field_values(), overwrite=overwrite)
+        filled: list[int] = []
+        failed: list[int] = []
+        if to_fill:
+            result = await evaluate_js(
+                browser_session,
+                _FILL_JS.replace("__VALUES__", json.dumps({str(k): v for k, v in to_fill.items()})),
+            ) or {}
+            filled = list(result.get("filled") or [])
+            failed = list(result.get("failed") or [])
+
+        by_idx = {int(f["idx"]): _describe(f) for f in fields}
+        lines = [f"Filled {len(filled)} field(s) from profile: " + ", ".join(by_idx[i] for i in filled[:20])]
+        if failed:
+            lines.append("Could not fill: " + ", ".join(by_idx[i] for i in failed[:20]))
+        if unmapped:
+            lines.append("Unmapped fields (fill these yourself): " + ", ".join(m.descriptor for m in unmapped[:20]))
+        if any(m.key == "resume_path" for m in unmapped) and profile.resume_path:
+            lines.append(f"Resume upload field present; resume path: {profile.resume_path}")
+        summary = "\n".join(lines)
+
+        emit(
+            "form.fill_from_profile",
+            task_id=current_task_id.get(),
+            step=current_step.get(),
+            fields=len(fields),
+            filled=len(filled),
+            failed=len(failed),
+            unmapped=len(unmapped),
+        )
+        return ActionResult(extracted_content=summary, long_term_memory=summary)
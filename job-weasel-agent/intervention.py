@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import select
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from perf_context import current_task_id
+from perf_logger import emit
+
+
+def unattended() -> bool:
+    """Batch mode: never wait for a human (explicit flag, or stdin is not a terminal)."""
+    if os.environ.get("WEASZEL_UNATTENDED", "0").lower() in ("1", "true", "yes", "on"):
+        return True
+    try:
+        return not sys.stdin.isatty()
+    except (AttributeError, ValueError):
+        return True
+
+
+def default_timeout_s() -> float | None:
+    """WEASZEL_INTERVENTION_TIMEOUT seconds before the default answer is taken (unset/0 = wait)."""
+    raw = os.environ.get("WEASZEL_INTERVENTION_TIMEOUT", "").strip()
+    try:
+        value = float(raw) if raw else 0.0
+    except ValueError:
+        value = 0.0
+    return value if value > 0 else None
+
+
+@dataclass
+class InterventionRequest:
+    id: int
+    task_id: str | None
+    prompt: str
+    choices: list[str] | None
+    default: str
+    created: float = field(default_factory=time.time)
+    _resolve: Callable[[str], None] | None = field(default=None, repr=False)
+
+
+class InterventionChannel:
+    """
+    Questions for the human, answered without blocking the event loop.
+
+    - Async callers await `ask()`; only that task waits, other coroutines keep running.
+    - Terminal answers come from a reader thread that is alive only while a question is
+      pending and never blocks in a read (select() on POSIX, msvcrt polling on Windows),
+      so it can't steal the next line typed at the main prompt.
+    - Other front-ends (e.g. a server API) answer through `pending()` + `submit()`.
+    - Unattended runs / timeouts resolve to the request's default and emit
+      intervention.auto so batch logs show every decision that was made without a human.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: dict[int, InterventionRequest] = {}
+        self._ids = itertools.count(1)
+        self._reader: threading.Thread | None = None
+        self._win_buf = ""
+
+    # --- answering ------------------------------------------------------------
+
+    def pending(self) -> list[InterventionRequest]:
+        with self._lock:
+            return sorted(self._pending.values(), key=lambda r: r.id)
+
+    def submit(self, request_id: int, answer: str) -> bool:
+        """Answer a pending request (returns False if it was already resolved)."""
+        with self._lock:
+            req = self._pending.get(request_id)
+        if req is None:
+            return False
+        if req.choices and answer.strip() not in req.choices:
+            return False
+        self._finish(req, answer.strip(), source="human")
+        return True
+
+    def _finish(self, req: InterventionRequest, answer: str, source: str) -> None:
+        with self._lock:
+            if self._pending.pop(req.id, None) is None:
+                return
+        emit(
+            "intervention.auto" if source != "human" else "intervention.answer",
+            task_id=req.task_id,
+            answer=answer,
+            source=source,
+            wait_s=round(time.time() - req.created, 2),
+        )
+        if req._resolve is not None:
+            req._resolve(answer)
+
+    def _ensure_reader(self) -> None:
+        # The reader clears self._reader under the same lock when it decides to exit, so a
+        # question registered while it is winding down always gets a fresh reader.
+        with self._lock:
+            if self._reader is not None:
+                return
+            self._reader = threading.Thread(target=self._read_terminal, name="weaszel-intervention", daemon=True)
+            self._reader.start()
+
+    def _poll_line(self, timeout_s: float) -> str | None:
+        """One line from the terminal if it is complete within `timeout_s` ("" at EOF), else None."""
+        if os.name == "nt":
+            import msvcrt
+
+            deadline = time.monotonic() + timeout_s
+            while time.monotonic() < deadline:
+                while msvcrt.kbhit():
+                    ch = msvcrt.getwche()
+                    if ch in ("\r", "\n"):
+                        line, self._win_buf = self._win_buf, ""
+                        sys.stdout.write("\n")
+                        return line + "\n"
+                    self._win_buf = self._win_buf[:-1] if ch == "\b" else self._win_buf + ch
+                time.sleep(0.02)
+            return None
+        ready, _, _ = select.select([sys.stdin], [], [], timeout_s)
+        return sys.stdin.readline() if ready else None
+
+    def _read_terminal(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._reader = None
+                    return
+            try:
+                line = self._poll_line(0.2)
+            except (OSError, ValueError):
+                line = ""  # stdin went away: stop like at EOF
+            if line is None:
+                continue
+            if not line:
+                with self._lock:
+                    self._reader = None
+                return
+            # The oldest open question gets the answer.
+            for req in self.pending():
+                if self.submit(req.id, line):
+                    break
+            else:
+                if self.pending():
+                    sys.stdout.write(f"Please answer one of: {', '.join(self.pending()[0].choices or [])}\n> ")
+                    sys.stdout.flush()
+
+    # --- asking ------------------------------------------------------------------
+
+    def _register(self, prompt: str, choices: list[str] | None, default: str) -> InterventionRequest:
+        req = InterventionRequest(
+            id=next(self._ids), task_id=current_task_id.get(), prompt=prompt, choices=choices, default=default
+        )
+        with self._lock:
+            self._pending[req.id] = req
+        emit("intervention.request", task_id=req.task_id, prompt=prompt[:200], choices=choices, default=default)
+        return req
+
+    def _show(self, req: InterventionRequest, timeout_s: float | None) -> None:
+        suffix = f" [{'/'.join(req.choices)}]" if req.choices else ""
+        hint = f" (auto: {req.default or 'empty'} in {timeout_s:g}s)" if timeout_s else ""
+        sys.stdout.write(f"\n{req.prompt}{suffix}{hint}\n> ")
+        sys.stdout.flush()
+
+    async def ask(
+        self,
+        prompt: str,
+        *,
+        choices: list[str] | None = None,
+        default: str = "",
+        timeout_s: float | None = None,
+    ) -> str:
+        req = self._register(prompt, choices, default)
+        if unattended():
+            self._finish(req, default, source="unattended")
+            return default
+
+        timeout_s = timeout_s if timeout_s is not None else default_timeout_s()
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future[str] = loop.create_future()
+
+        def _resolve(answer: str) -> None:
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(answer))
+
+        req._resolve = _resolve
+        self._show(req, timeout_s)
+        self._ensure_reader()
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            self._finish(req, default, source="timeout")
+            return default
+        finally:
+            with self._lock:
+                self._pending.pop(req.id, None)
+
+    def ask_sync(
+        self,
+        prompt: str,
+        *,
+        choices: list[str] | None = None,
+        default: str = "",
+        timeout_s: float | None = None,
+    ) -> str:
+        """Blocking variant for sync code paths (legacy agent); same timeout/unattended rules."""
+        req = self._register(prompt, choices, default)
+        if unattended():
+            self._finish(req, default, source="unattended")
+            return default
+
+        timeout_s = timeout_s if timeout_s is not None else default_timeout_s()
+        done = threading.Event()
+        result: dict[str, Any] = {}
+
+        def _resolve(answer: str) -> None:
+            result["answer"] = answer
+            done.set()
+
+        req._resolve = _resolve
+        self._show(req, timeout_s)
+        self._ensure_reader()
+        if not done.wait(timeout=timeout_s):
+            self._finish(req, default, source="timeout")
+            return default
+        return str(result.get("answer", default))
+
+
+_channel: InterventionChannel | None = None
+_channel_lock = threading.Lock()
+
+
+def get_channel() -> InterventionChannel:
+    global _channel
+    with _channel_lock:
+        if _channel is None:
+            _channel = InterventionChannel()
+        return _channel
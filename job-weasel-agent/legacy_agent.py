@@ -29,6 +29,8 @@ from rich.console import Console
 from rich.table import Table
 
 from computers import EnvState, Computer
+from llm_scheduler import Priority, get_scheduler
+from intervention import get_channel
 
 MAX_RECENT_TURN_WITH_SCREENSHOTS = 3
 PREDEFINED_COMPUTER_USE_FUNCTIONS = [
@@ -217,10 +219,16 @@ class BrowserAgent:
     ) -> types.GenerateContentResponse:
         for attempt in range(max_retries):
             try:
-                response = self._client.models.generate_content(
-                    model=self._model_name,
-                    contents=self._contents,
-                    config=self._generate_content_config,
+                # 429s are paced/backed off centrally (shared with any other task on this key);
+                # this loop only retries the remaining transient errors.
+                response = get_scheduler().run_sync(
+                    self._model_name,
+                    lambda: self._client.models.generate_content(
+                        model=self._model_name,
+                        contents=self._contents,
+                        config=self._generate_content_config,
+                    ),
+                    priority=Priority.FOREGROUND,
                 )
                 return response  # Return response on success
             except Exception as e:
@@ -287,7 +295,10 @@ class BrowserAgent:
             termcolor.cprint("\n🛑 PAUSED: Please check the browser window.", "yellow")
             termcolor.cprint("1. Solve any Captchas manually.", "yellow")
             termcolor.cprint("2. If the page is blank/stuck, refresh it.", "yellow")
-            input(termcolor.colored("Press [Enter] when you are ready to continue...", "green", attrs=["bold"]))
+            get_channel().ask_sync(
+                termcolor.colored("Press [Enter] when you are ready to continue...", "green", attrs=["bold"]),
+                default="",
+            )
             
             # Refresh Screenshot
             print("📸 Refreshing view...")
@@ -460,7 +471,8 @@ class BrowserAgent:
             padding=(1, 2)
         ))
         
-        decision = input("\n> ")
+        # Unattended runs / timeout: refuse rather than continue past a safety check.
+        decision = get_channel().ask_sync("", default="no")
         if decision.lower() in ("n", "no"):
             console.print("[red]❌ Stopped by user[/red]")
             return "TERMINATE"
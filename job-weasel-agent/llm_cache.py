@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from perf_context import current_step, current_task_id
+from perf_logger import emit
+
+
+def _off(value: str) -> bool:
+    return value.lower() in ("0", "off", "false", "no")
+
+
+def _serialize_message(m: Any) -> Any:
+    dump = getattr(m, "model_dump", None)
+    if callable(dump):
+        try:
+            return dump(mode="json", exclude_none=True)
+        except Exception:
+            pass
+    return {"role": getattr(m, "role", None), "content": str(getattr(m, "content", m))}
+
+
+def _schema_id(output_format: Any) -> str:
+    if output_format is None:
+        return ""
+    schema = getattr(output_format, "model_json_schema", None)
+    if callable(schema):
+        try:
+            return json.dumps(schema(), sort_keys=True, default=str)
+        except Exception:
+            pass
+    return f"{getattr(output_format, '__module__', '')}.{getattr(output_format, '__qualname__', repr(output_format))}"
+
+
+def request_key(model: str, messages: list[Any], kwargs: dict[str, Any], temperature: Any) -> str | None:
+    """
+    sha256 of (model, serialized messages, output schema, other kwargs), or None when the
+    request isn't deterministic (temperature unknown or not 0) and must not be cached.
+    """
+    if temperature is None or float(temperature) != 0.0:
+        return None
+    payload = {
+        "model": model,
+        "messages": [_serialize_message(m) for m in messages],
+        "schema": _schema_id(kwargs.get("output_format")),
+        "kwargs": {k: repr(v) for k, v in sorted(kwargs.items()) if k != "output_format"},
+    }
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _copy(result: Any) -> Any:
+    # Callers mutate completions (e.g. trimming alternatives); never hand out the cached object
+    model_copy = getattr(result, "model_copy", None)
+    if callable(model_copy):
+        return model_copy(deep=True)
+    return copy.deepcopy(result)
+
+
+def _encode(result: Any) -> str | None:
+    completion = getattr(result, "completion", None)
+    if isinstance(completion, str):
+        return json.dumps({"type": "str", "data": completion})
+    dump = getattr(completion, "model_dump", None)
+    if callable(dump):
+        return json.dumps({"type": "model", "data": dump(mode="json")}, ensure_ascii=False)
+    return None
+
+
+def _decode(payload: str, output_format: Any) -> Any | None:
+    from browser_use.llm.views import ChatInvokeCompletion
+
+    raw = json.loads(payload)
+    if raw.get("type") == "str":
+        completion = raw["data"]
+    elif output_format is not None and hasattr(output_format, "model_validate"):
+        completion = output_format.model_validate(raw["data"])
+    else:
+        return None
+    return ChatInvokeCompletion(completion=completion, usage=None)
+
+
+class ResponseCache:
+    """
+    Exact-match cache of LLM responses for deterministic (temperature 0) requests.
+
+    - In memory: LRU of result objects (WEASZEL_LLM_CACHE_MAX entries) with a TTL
+      (WEASZEL_LLM_CACHE_TTL_S, default 1h).
+    - On disk (WEASZEL_LLM_CACHE_DISK=1): logs/llm_cache.sqlite3, capped at
+      WEASZEL_LLM_CACHE_DISK_MAX rows, oldest evicted first. Only completions that round-trip
+      (plain text or the requested output schema) are written.
+    - In flight: concurrent identical requests on the same event loop share one call.
+
+    WEASZEL_LLM_CACHE=0 disables it; WEASZEL_LLM_CACHE_SITES limits it to some call sites.
+    Every lookup emits llm.cache with running hit/miss counts for the site.
+    """
+
+    DEFAULT_SITES = "agent,planner,thinking,reflection,replan,router"
+
+    def __init__(self, path: str | None = None, max_entries: int | None = None, ttl_s: float | None = None):
+        self.enabled = not _off(os.environ.get("WEASZEL_LLM_CACHE", "1"))
+        self.sites = {s.strip() for s in os.environ.get("WEASZEL_LLM_CACHE_SITES", self.DEFAULT_SITES).split(",") if s.strip()}
+        try:
+            self.max_entries = max_entries or int(os.environ.get("WEASZEL_LLM_CACHE_MAX", "256"))
+            self.ttl_s = ttl_s if ttl_s is not None else float(os.environ.get("WEASZEL_LLM_CACHE_TTL_S", "3600"))
+            self.disk_max = int(os.environ.get("WEASZEL_LLM_CACHE_DISK_MAX", "2000"))
+        except ValueError:
+            self.max_entries, self.ttl_s, self.disk_max = 256, 3600.0, 2000
+        self._items: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._stats: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if self.enabled and not _off(os.environ.get("WEASZEL_LLM_CACHE_DISK", "0")):
+            self._open_disk(path or os.path.abspath("logs/llm_cache.sqlite3"))
+
+    def _open_disk(self, path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, ts REAL NOT NULL, model TEXT, payload TEXT NOT NULL)"
+            )
+            self._db.execute("DELETE FROM responses WHERE ts < ?", (time.time() - self.ttl_s,))
+            self._db.commit()
+        except sqlite3.Error:
+            self._db = None
+
+    def applies_to(self, site: str) -> bool:
+        return self.enabled and site in self.sites
+
+    def _record(self, site: str, outcome: str) -> None:
+        counts = self._stats.setdefault(site, [0, 0, 0])
+        counts[("hit", "miss", "coalesced").index(outcome)] += 1
+        hits, misses, coalesced = counts
+        emit(
+            "llm.cache",
+            task_id=current_task_id.get(),
+            step=current_step.get(),
+            site=site,
+            outcome=outcome,
+            hits=hits,
+            misses=misses,
+            coalesced=coalesced,
+            hit_rate=round((hits + coalesced) / (hits + misses + coalesced), 3),
+        )
+
+    def get(self, key: str, output_format: Any = None) -> Any | None:
+        now = time.time()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and now - entry[0] > self.ttl_s:
+                self._items.pop(key, None)
+                entry = None
+            if entry is not None:
+                self._items.move_to_end(key)
+                return _copy(entry[1])
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT ts, payload FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+        if row is None or now - row[0] > self.ttl_s:
+            return None
+        try:
+            result = _decode(row[1], output_format)
+        except Exception:
+            return None
+        if result is not None:
+            self._remember(key, result, row[0])
+        return result
+
+    def _remember(self, key: str, result: Any, ts: float) -> None:
+        with self._lock:
+            self._items[key] = (ts, _copy(result))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def put(self, key: str, result: Any, model: str = "") -> None:
+        now = time.time()
+        self._remember(key, result, now)
+        if self._db is None:
+            return
+        payload = _encode(result)
+        if payload is None:
+            return
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, ts, model, payload) VALUES (?, ?, ?, ?)",
+                    (key, now, model, payload),
+                )
+                self._db.execute(
+                    "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY ts DESC LIMIT ?)",
+                    (self.disk_max,),
+                )
+                self._db.commit()
+            except sqlite3.Error:
+                pass
+
+    async def get_or_call(self, key: str, site: str, output_format: Any, call: Any, *, model: str = "") -> tuple[Any, bool]:
+        """
+        Cached result, or the result of `call()` (stored afterwards). Returns (result, from_cache);
+        a waiter that shared someone else's in-flight call counts as from_cache.
+        """
+        cached = self.get(key, output_format)
+        if cached is not None:
+            self._record(site, "hit")
+            return cached, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.get_loop() is asyncio.get_running_loop():
+            try:
+                result = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The owner was cancelled (not us): fall through and make our own call
+                if not inflight.cancelled():
+                    raise
+            else:
+                self._record(site, "coalesced")
+                return _copy(result), True
+
+        self._record(site, "miss")
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting; don't warn about a never-retrieved exception
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                self._inflight.pop(key, None)
+        self.put(key, result, model=model)
+        future.set_result(result)
+        return result, False
+
+    def get_or_call_sync(self, key: str, site: str, call: Any, *, model: str = "") -> tuple[Any, bool]:
+        """Blocking variant of get_or_call() for sync clients (no in-flight coalescing)."""
+        cached = self.get(key)
+        if cached is not None:
+            self._record(site, "hit")
+            return cached, True
+        self._record(site, "miss")
+        result = call()
+        self.put(key, result, model=model)
+        return result, False
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                site: {
+                    "hits": h,
+                    "misses": m,
+                    "coalesced": c,
+                    "hit_rate": round((h + c) / (h + m + c), 3) if h + m + c else 0.0,
+                }
+                for site, (h, m, c) in self._stats.items()
+            }
+
+
+_cache: ResponseCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide cache shared by every TimedLLM."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
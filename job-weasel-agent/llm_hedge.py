@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import copy
+import dataclasses
+import math
+import os
+import threading
+from collections import deque
+from typing import Any
+
+from perf_context import current_step, current_task_id
+from perf_logger import emit
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)))
+    except ValueError:
+        return default
+
+
+class HedgePolicy:
+    """
+    When to send a second copy of a slow LLM request, and to which model.
+
+    Off unless WEASZEL_HEDGE=1. For the sites in WEASZEL_HEDGE_SITES (default agent,planner),
+    a call still running after the WEASZEL_HEDGE_PERCENTILE (default p90) of that model's
+    recent latencies (last 50 successful calls, at least 10 needed, never below
+    WEASZEL_HEDGE_MIN_DELAY_S) gets a hedge: the same request to WEASZEL_HEDGE_MODEL (default:
+    the same model). Each task may fire at most WEASZEL_HEDGE_MAX_PER_TASK hedges, which caps
+    the extra spend. Every hedge emits llm.hedge with running fired/won counts per model.
+    """
+
+    WINDOW = 50
+    MIN_SAMPLES = 10
+
+    def __init__(self):
+        self.enabled = os.environ.get("WEASZEL_HEDGE", "0").lower() in ("1", "true", "yes", "on")
+        self.sites = {s.strip() for s in os.environ.get("WEASZEL_HEDGE_SITES", "agent,planner").split(",") if s.strip()}
+        self.percentile = min(99.0, max(50.0, _env_float("WEASZEL_HEDGE_PERCENTILE", 90.0)))
+        self.min_delay_s = _env_float("WEASZEL_HEDGE_MIN_DELAY_S", 1.0)
+        self.max_per_task = int(_env_float("WEASZEL_HEDGE_MAX_PER_TASK", 5))
+        self.alt_model = os.environ.get("WEASZEL_HEDGE_MODEL", "").strip()
+        self._latencies: dict[str, deque[float]] = {}
+        self._per_task: dict[str, int] = {}
+        self._stats: dict[str, list[int]] = {}
+        self._alt_llms: dict[int, Any] = {}
+        self._lock = threading.Lock()
+
+    def applies_to(self, site: str) -> bool:
+        return self.enabled and site in self.sites
+
+    def observe(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.WINDOW)).append(seconds)
+
+    def delay_s(self, model: str) -> float | None:
+        """How long to wait before hedging, or None while there aren't enough samples."""
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+        idx = min(len(samples) - 1, math.ceil(self.percentile / 100.0 * len(samples)) - 1)
+        return max(self.min_delay_s, samples[idx])
+
+    def try_acquire(self, task_id: str | None) -> bool:
+        """Reserve one hedge from the task's allowance."""
+        key = task_id or ""
+        with self._lock:
+            used = self._per_task.get(key, 0)
+            if used >= self.max_per_task:
+                return False
+            self._per_task[key] = used + 1
+            return True
+
+    def alternate(self, llm: Any) -> Any:
+        """The model the hedge goes to: a copy of `llm` pointed at WEASZEL_HEDGE_MODEL, or `llm` itself."""
+        if not self.alt_model or self.alt_model == str(getattr(llm, "model", "")):
+            return llm
+        with self._lock:
+            alt = self._alt_llms.get(id(llm))
+            if alt is None:
+                if dataclasses.is_dataclass(llm):
+                    alt = dataclasses.replace(llm, model=self.alt_model)
+                else:
+                    alt = copy.copy(llm)
+                    alt.model = self.alt_model
+                self._alt_llms[id(llm)] = alt
+            return alt
+
+    def record(self, model: str, *, site: str, won: bool, delay_s: float, hedge_model: str) -> None:
+        with self._lock:
+            counts = self._stats.setdefault(model, [0, 0])
+            counts[0] += 1
+            counts[1] += int(won)
+            fired, wins = counts
+        emit(
+            "llm.hedge",
+            task_id=current_task_id.get(),
+            step=current_step.get(),
+            model=model,
+            hedge_model=hedge_model,
+            site=site,
+            delay_ms=round(delay_s * 1000.0, 1),
+            won=won,
+            fired=fired,
+            wins=wins,
+            win_rate=round(wins / fired, 3),
+        )
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                model: {"fired": f, "won": w, "win_rate": round(w / f, 3) if f else 0.0}
+                for model, (f, w) in self._stats.items()
+            }
+
+
+_policy: HedgePolicy | None = None
+_policy_lock = threading.Lock()
+
+
+def get_hedge_policy() -> HedgePolicy:
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = HedgePolicy()
+        return _policy
@@ -0,0 +1,433 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import dataclasses
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterator
+
+from llm_cache import get_response_cache, request_key
+from llm_hedge import get_hedge_policy
+from llm_scheduler import Priority, current_llm_priority, estimate_tokens, get_scheduler
+from perf_context import current_step, current_task_id
+from perf_logger import emit, span
+
+
+# Call sites: agent | planner | thinking | reflection | replan. A wrapper has a default site;
+# code that reuses a wrapper for something else (e.g. the agent LLM for replanning) overrides it.
+current_llm_site: contextvars.ContextVar[str | None] = contextvars.ContextVar("weaszel_llm_site", default=None)
+
+
+@contextlib.contextmanager
+def llm_site(site: str) -> Iterator[None]:
+    token = current_llm_site.set(site)
+    try:
+        yield
+    finally:
+        current_llm_site.reset(token)
+
+
+@dataclass
+class LLMCall:
+    """One ainvoke() travelling through the middleware stack."""
+
+    llm: Any
+    model: str
+    provider: str
+    site: str
+    priority: int
+    messages: list[Any]
+    args: tuple[Any, ...] = ()
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    # Scratch space layers use to talk to each other (e.g. cache_hit, hedged)
+    meta: dict[str, Any] = field(default_factory=dict)
+
+    def send(self) -> Awaitable[Any]:
+        """The raw provider call (what the innermost layer awaits)."""
+        return self.llm.ainvoke(self.messages, *self.args, **self.kwargs)
+
+
+Handler = Callable[[LLMCall], Awaitable[Any]]
+
+
+class Middleware:
+    """A layer: gets the call and the rest of the stack, returns the result."""
+
+    name = "base"
+
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
+        return await call_next(call)
+
+
+class HooksMiddleware(Middleware):
+    """`before_invoke` hooks (messages, kwargs) -> messages: late context such as pre-step thinking."""
+
+    name = "hooks"
+
+    def __init__(self, hooks: list[Callable[[list[Any], dict[str, Any]], Awaitable[list[Any]]]]):
+        self.hooks = hooks
+
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
+        for hook in list(self.hooks):
+            call.messages = await hook(call.messages, call.kwargs)
+        return await call_next(call)
+
+
+class TimingMiddleware(Middleware):
+    name = "timing"
+
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
+        with span(
+            "llm.ainvoke",
+            provider=call.provider,
+            model=call.model,
+            site=call.site,
+            task_id=current_task_id.get(),
+            step=current_step.get(),
+        ):
+            return await call_next(call)
+
+
+class UsageLedger:
+    """Token totals per task and per call site (process-wide)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_task: dict[str, int] = {}
+        self.by_site: dict[str, int] = {}
+
+    def add(self, task_id: str | None, site: str, tokens: int) -> None:
+        with self._lock:
+            if task_id:
+                self.by_task[task_id] = self.by_task.get(task_id, 0) + tokens
+            self.by_site[site] = self.by_site.get(site, 0) + tokens
+
+    def task_total(self, task_id: str | None) -> int:
+        with self._lock:
+            return self.by_task.get(task_id or "", 0)
+
+
+_ledger = UsageLedger()
+
+
+def get_ledger() -> UsageLedger:
+    return _ledger
+
+
+class UsageMiddleware(Middleware):
+    """Emits llm.usage and books tokens in the ledger (not for cache hits: nothing was billed)."""
+
+    name = "usage"
+
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
+        result = await call_next(call)
+        usage = getattr(result, "usage", None)
+        if usage is None or call.meta.get("cache_hit"):
+            return result
+        total = getattr(usage, "total_tokens", None) or (
+            (getattr(usage, "prompt_tokens", 0) or 0) + (getattr(usage, "completion_tokens", 0) or 0)
+        )
+        _ledger.add(current_task_id.get(), call.site, int(total or 0))
+        emit(
+            "llm.usage",
+            provider=call.provider,
+            model=call.model,
+            site=call.site,
+            task_id=current_task_id.get(),
+            step=current_step.get(),
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+            total_tokens=getattr(usage, "total_tokens", None),
+            prompt_image_tokens=getattr(usage, "prompt_image_tokens", None),
+            prompt_cached_tokens=getattr(usage, "prompt_cached_tokens", None),
+        )
+        return result
+
+
+class LLMBudgetExceeded(RuntimeError):
+    pass
+
+
+class BudgetMiddleware(Middleware):
+    """
+    Per-task token cap (WEASZEL_TASK_TOKEN_BUDGET, 0 = off). Once a task is over budget, optional
+    calls (thinking, reflection) are refused; the agent's own steps are never blocked here.
+    """
+
+    name = "budget"
+    OPTIONAL_SITES = ("thinking", "reflection")
+
+    def __init__(self, max_tokens: int | None = None):
+        if max_tokens is None:
+            try:
+                max_tokens = int(os.environ.get("WEASZEL_TASK_TOKEN_BUDGET", "0"))
+            except ValueError:
+                max_tokens = 0
+        self.max_tokens = max_tokens
+
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
+        task_id = current_task_id.get()
+        if self.max_tokens > 0 and call.site in self.OPTIONAL_SITES:
+            used = _ledger.task_total(task_id)
+            if used >= self.max_tokens:
+                emit("llm.budget_refused", task_id=task_id, site=call.site, used=used, budget=self.max_tokens)
+                raise LLMBudgetExceeded(f"task token budget exhausted ({used}/{self.max_tokens})")
+        return await call_next(call)
+
+
+class CacheMiddleware(Middleware):
+    """Exact-match response cache + in-flight coalescing (llm_cache.ResponseCache) for temperature-0 calls."""
+
+    name = "cache"
+
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
+        cache = get_response_cache()
+        if not cache.applies_to(call.site):
+            return await call_next(call)
+        key = request_key(call.model, call.messages, call.kwargs, getattr(call.llm, "temperature", None))
+        if key is None:
+            return await call_next(call)
+        result, hit = await cache.get_or_call(
+            key, call.site, call.kwargs.get("output_format"), lambda: call_next(call), model=call.model
+        )
+        call.meta["cache_hit"] = hit
+        return result
+
+
+def _is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    code = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    return code in (500, 502, 503, 504)
+
+
+class RetryMiddleware(Middleware):
+    """
+    Retries transient failures (timeouts, 5xx) WEASZEL_LLM_RETRIES times (default 0: the provider
+    clients already retry internally; 429s are handled by the scheduler).
+    """
+
+    name = "retry"
+
+    def __init__(self, retries: int | None = None, backoff_s: float = 0.5):
+        if retries is None:
+            try:
+                retries = int(os.environ.get("WEASZEL_LLM_RETRIES", "0"))
+            except ValueError:
+                retries = 0
+        self.retries = max(0, retries)
+        self.backoff_s = backoff_s
+
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return await call_next(call)
+            except Exception as e:
+                if attempt >= self.retries or not _is_transient(e):
+                    raise
+                attempt += 1
+                emit("llm.retry", model=call.model, site=call.site, attempt=attempt, error=str(e)[:200])
+                await asyncio.sleep(self.backoff_s * (2 ** (attempt - 1)))
+
+
+class HedgeMiddleware(Middleware):
+    """
+    Tail-latency hedging (llm_hedge.HedgePolicy): if the call outlives the model's recent
+    latency percentile, send the same request again (optionally to an alternate model) and
+    keep whichever answers first; the other one is cancelled and awaited so its rate-limit
+    slot is released before the call returns.
+    """
+
+    name = "hedge"
+
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
+        policy = get_hedge_policy()
+        if not policy.applies_to(call.site):
+            return await call_next(call)
+
+        t0 = time.perf_counter()
+        primary = asyncio.ensure_future(call_next(call))
+        pending: set[asyncio.Future] = {primary}
+        try:
+            delay = policy.delay_s(call.model)
+            if delay is not None:
+                await asyncio.wait(pending, timeout=delay)
+            if primary.done() or delay is None or not policy.try_acquire(current_task_id.get()):
+                result = await primary
+                policy.observe(call.model, time.perf_counter() - t0)
+                return result
+
+            alt_llm = policy.alternate(call.llm)
+            # Own messages/kwargs/meta: layers below may mutate them while both copies are in flight
+            hedge_call = dataclasses.replace(
+                call,
+                llm=alt_llm,
+                model=str(getattr(alt_llm, "model", call.model)),
+                messages=list(call.messages),
+                kwargs=dict(call.kwargs),
+                meta=dict(call.meta),
+            )
+            hedge_t0 = time.perf_counter()
+            hedge = asyncio.ensure_future(call_next(hedge_call))
+            pending.add(hedge)
+            call.meta["hedged"] = True
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        if not pending:
+                            raise task.exception()
+                        continue
+                    won = task is hedge
+                    policy.observe(
+                        hedge_call.model if won else call.model,
+                        time.perf_counter() - (hedge_t0 if won else t0),
+                    )
+                    policy.record(call.model, site=call.site, won=won, delay_s=delay, hedge_model=hedge_call.model)
+                    if won:
+                        call.meta.update(hedge_call.meta)
+                    call.meta["hedge_won"] = won
+                    return task.result()
+            raise RuntimeError("hedged LLM call finished without a result")
+        finally:
+            for task in pending:
+                task.cancel()
+            # Let the losers unwind (and hand their scheduler slots back) before returning
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+
+class RateLimitMiddleware(Middleware):
+    """Admission through the process-wide LLMScheduler (RPM/TPM buckets, 429 backoff)."""
+
+    name = "ratelimit"
+
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
+        return await get_scheduler().run(
+            call.model,
+            lambda: call_next(call),
+            priority=call.priority,
+            est_tokens=estimate_tokens(call.messages),
+        )
+
+
+# Layer factories by name, outermost first in DEFAULT_LAYERS.
+LAYERS: dict[str, Callable[[Any], Middleware]] = {
+    "hooks": lambda owner: HooksMiddleware(owner.before_invoke),
+    "timing": lambda owner: TimingMiddleware(),
+    "usage": lambda owner: UsageMiddleware(),
+    "budget": lambda owner: BudgetMiddleware(),
+    "cache": lambda owner: CacheMiddleware(),
+    "retry": lambda owner: RetryMiddleware(),
+    "hedge": lambda owner: HedgeMiddleware(),
+    "ratelimit": lambda owner: RateLimitMiddleware(),
+}
+
+DEFAULT_LAYERS = ("hooks", "timing", "usage", "budget", "cache", "retry", "hedge", "ratelimit")
+
+
+def layers_for(site: str) -> tuple[str, ...]:
+    """WEASZEL_LLM_LAYERS_<SITE> (e.g. WEASZEL_LLM_LAYERS_PLANNER="timing,usage,ratelimit") overrides the defaults."""
+    raw = os.environ.get(f"WEASZEL_LLM_LAYERS_{site.upper()}", "").strip()
+    if not raw:
+        return DEFAULT_LAYERS
+    return tuple(n.strip() for n in raw.split(",") if n.strip() in LAYERS)
+
+
+def _profiling() -> bool:
+    return os.environ.get("WEASZEL_PROFILE", "0").lower() in ("1", "true", "yes", "on")
+
+
+class LLMPipeline:
+    """
+    Composable middleware stack in front of a Browser-Use chat model.
+
+    Layers run outermost first; the innermost awaits the provider. With profiling on, each
+    call emits llm.middleware with the time spent inside every layer itself (its own work,
+    excluding the layers below it), so per-layer overhead shows up in perf.jsonl.
+    """
+
+    def __init__(self, llm: Any, layers: list[Middleware], *, site: str, priority: int):
+        self._llm = llm
+        self.layers = layers
+        self.site = site
+        self.priority = priority
+
+    def use(self, layer: Middleware, *, after: str | None = None) -> None:
+        """Add a layer below `after` (or outermost); no-op if a layer with that name is already in."""
+        if any(existing.name == layer.name for existing in self.layers):
+            return
+        names = [existing.name for existing in self.layers]
+        self.layers.insert(names.index(after) + 1 if after in names else 0, layer)
+
+    @property
+    def provider(self) -> str:
+        return getattr(self._llm, "provider", "unknown")
+
+    @property
+    def model(self) -> str:
+        return str(getattr(self._llm, "model", getattr(self._llm, "name", "unknown")))
+
+    async def ainvoke(self, messages: list[Any], *args: Any, **kwargs: Any) -> Any:
+        priority = current_llm_priority.get()
+        call = LLMCall(
+            llm=self._llm,
+            model=self.model,
+            provider=self.provider,
+            site=current_llm_site.get() or self.site,
+            priority=self.priority if priority is None else priority,
+            messages=messages,
+            args=args,
+            kwargs=kwargs,
+        )
+        if not _profiling():
+            return await self._dispatch(0, call, None)
+        inclusive: dict[str, float] = {}
+        try:
+            return await self._dispatch(0, call, inclusive)
+        finally:
+            # Exclusive time: a layer's inclusive time minus the inclusive time of the one below it
+            chain = [layer.name for layer in self.layers] + ["provider"]
+            own = {
+                n: round((inclusive[n] - inclusive.get(chain[i + 1], 0.0)) * 1000.0, 3)
+                for i, n in enumerate(chain[:-1])
+                if n in inclusive
+            }
+            emit(
+                "llm.middleware",
+                model=call.model,
+                site=call.site,
+                task_id=current_task_id.get(),
+                step=current_step.get(),
+                layer_ms=own,
+                provider_ms=round(inclusive.get("provider", 0.0) * 1000.0, 1),
+                **{k: v for k, v in call.meta.items() if isinstance(v, (bool, int, float, str))},
+            )
+
+    async def _dispatch(self, i: int, call: LLMCall, inclusive: dict[str, float] | None) -> Any:
+        name = self.layers[i].name if i < len(self.layers) else "provider"
+        t0 = time.perf_counter()
+        try:
+            if i >= len(self.layers):
+                return await call.send()
+            return await self.layers[i](call, lambda c: self._dispatch(i + 1, c, inclusive))
+        finally:
+            if inclusive is not None:
+                # Layers that call downstream more than once (retries, hedges) accumulate
+                inclusive[name] = inclusive.get(name, 0.0) + (time.perf_counter() - t0)
+
+
+def priority_site(priority: int) -> str:
+    """Default call site for wrappers that only declare a scheduler priority."""
+    return {
+        Priority.FOREGROUND: "agent",
+        Priority.PLANNER: "planner",
+        Priority.THINKING: "thinking",
+        Priority.REFLECTION: "reflection",
+    }.get(priority, "agent")
@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from perf_context import current_step, current_task_id
+from perf_logger import emit
+
+T = TypeVar("T")
+
+
+class Priority:
+    """Lower value = served first when the API budget is tight."""
+
+    FOREGROUND = 0  # agent step (the user is waiting on it)
+    PLANNER = 1  # query planning, replanning
+    THINKING = 2  # pre-step guidance
+    REFLECTION = 3  # post-step memory extraction (can always wait)
+
+
+# Callers that share one LLM wrapper (e.g. the agent LLM reused for replanning) can
+# lower/raise the priority of calls made inside a scope.
+current_llm_priority: contextvars.ContextVar[int | None] = contextvars.ContextVar("weaszel_llm_priority", default=None)
+
+
+@contextlib.contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    token = current_llm_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_llm_priority.reset(token)
+
+
+def _enabled() -> bool:
+    return os.environ.get("WEASZEL_LLM_SCHEDULER", "1").lower() not in ("0", "off", "false", "no")
+
+
+_RATE_LIMIT_RE = re.compile(r"\b429\b|rate.?limit|resource.?exhausted|quota|too many requests", re.I)
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    if getattr(exc, "status_code", None) == 429 or getattr(exc, "code", None) == 429:
+        return True
+    if type(exc).__name__ in ("ModelRateLimitError", "ResourceExhausted", "RateLimitError"):
+        return True
+    return bool(_RATE_LIMIT_RE.search(str(exc)))
+
+
+def estimate_tokens(messages: Any) -> int:
+    """Rough prompt size (chars/4, ~258 tokens per image) for the TPM bucket; corrected from usage afterwards."""
+    if not isinstance(messages, (list, tuple)):
+        return max(1, len(str(messages)) // 4)
+    chars = 0
+    images = 0
+    for m in messages:
+        content = getattr(m, "content", m)
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content or []:
+            if getattr(part, "type", "") == "image_url":
+                images += 1
+            else:
+                chars += len(str(getattr(part, "text", "") or ""))
+    return max(1, chars // 4 + images * 258)
+
+
+class TokenBucket:
+    """Continuous-refill bucket: `capacity` tokens per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate_s = float(per_minute) / 60.0
+        self._t = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._t) * self.rate_s)
+        self._t = now
+
+    def available(self, amount: float, now: float) -> bool:
+        self._refill(now)
+        # A single request larger than the whole bucket is admitted once the bucket is full.
+        return self.tokens >= min(amount, self.capacity)
+
+    def take(self, amount: float) -> None:
+        self.tokens -= amount
+
+    def adjust(self, delta: float) -> None:
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+@dataclass
+class ModelLimits:
+    rpm: float
+    tpm: float
+    max_concurrency: int
+
+
+@dataclass(order=True)
+class _Ticket:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    enqueued: float = field(compare=False)
+
+
+class _ModelLane:
+    """Admission state for one model: buckets, adaptive concurrency limit, 429 cooldown, waiting queue."""
+
+    SUCCESSES_PER_STEP_UP = 10
+
+    def __init__(self, limits: ModelLimits):
+        self.limits = limits
+        self.rpm = TokenBucket(limits.rpm)
+        self.tpm = TokenBucket(limits.tpm)
+        self.concurrency_limit = limits.max_concurrency
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.rate_limit_streak = 0
+        self._successes = 0
+        self.waiting: list[_Ticket] = []
+
+    def can_admit(self, ticket: _Ticket, now: float) -> bool:
+        return (
+            bool(self.waiting)
+            and self.waiting[0] is ticket
+            and now >= self.cooldown_until
+            and self.in_flight < self.concurrency_limit
+            and self.rpm.available(1, now)
+            and self.tpm.available(ticket.tokens, now)
+        )
+
+    def on_success(self) -> None:
+        self.rate_limit_streak = 0
+        self._successes += 1
+        # Additive increase back towards the configured ceiling.
+        if self._successes >= self.SUCCESSES_PER_STEP_UP and self.concurrency_limit < self.limits.max_concurrency:
+            self.concurrency_limit += 1
+            self._successes = 0
+
+    def on_rate_limit(self, now: float, base_delay_s: float, max_delay_s: float) -> float:
+        # Multiplicative decrease + a shared cooldown so queued callers don't stampede.
+        self.concurrency_limit = max(1, self.concurrency_limit // 2)
+        self._successes = 0
+        self.rate_limit_streak += 1
+        delay = min(max_delay_s, base_delay_s * (2 ** (self.rate_limit_streak - 1)))
+        delay = delay * (0.5 + random.random())  # jitter
+        self.cooldown_until = max(self.cooldown_until, now + delay)
+        return delay
+
+
+class LLMScheduler:
+    """
+    Central admission control for every LLM call in the process.
+
+    - Per-model RPM/TPM token buckets (WEASZEL_LLM_RPM / WEASZEL_LLM_TPM, per-model overrides in
+      WEASZEL_LLM_LIMITS as JSON: {"gemini-2.5-pro": {"rpm": 5, "tpm": 250000, "concurrency": 1}})
+    - Priority queue per model: foreground agent steps go before planning, thinking, reflection
+    - 429 → halve the model's concurrency limit, shared jittered cooldown, retry (WEASZEL_LLM_MAX_RETRIES)
+    - Emits llm.sched (wait_ms, queue_depth, concurrency_limit) per admitted call
+
+    Waiters poll a lock-protected heap instead of using asyncio primitives, so one scheduler
+    can serve several event loops (the planner runs its own asyncio.run) and sync callers.
+    """
+
+    POLL_S = 0.02
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lanes: dict[str, _ModelLane] = {}
+        self._seq = itertools.count()
+        self.max_retries = int(os.environ.get("WEASZEL_LLM_MAX_RETRIES", "4"))
+        self.base_delay_s = float(os.environ.get("WEASZEL_LLM_BACKOFF_S", "2"))
+        self.max_delay_s = float(os.environ.get("WEASZEL_LLM_BACKOFF_MAX_S", "60"))
+        self._overrides = self._load_overrides()
+        self.metrics: dict[str, float] = {"calls": 0, "rate_limited": 0, "wait_ms_total": 0.0, "max_queue_depth": 0}
+
+    @staticmethod
+    def _load_overrides() -> dict[str, dict[str, float]]:
+        try:
+            raw = json.loads(os.environ.get("WEASZEL_LLM_LIMITS", "") or "{}")
+            return raw if isinstance(raw, dict) else {}
+        except ValueError:
+            return {}
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            o = self._overrides.get(model, {})
+            lane = _ModelLane(
+                ModelLimits(
+                    rpm=float(o.get("rpm", os.environ.get("WEASZEL_LLM_RPM", "60"))),
+                    tpm=float(o.get("tpm", os.environ.get("WEASZEL_LLM_TPM", "1000000"))),
+                    max_concurrency=int(o.get("concurrency", os.environ.get("WEASZEL_LLM_CONCURRENCY", "4"))),
+                )
+            )
+            self._lanes[model] = lane
+        return lane
+
+    # --- admission ---------------------------------------------------------
+
+    def _enqueue(self, model: str, priority: int, tokens: int) -> _Ticket:
+        with self._lock:
+            lane = self._lane(model)
+            ticket = _Ticket(priority=priority, seq=next(self._seq), tokens=tokens, enqueued=time.monotonic())
+            heapq.heappush(lane.waiting, ticket)
+            self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], len(lane.waiting))
+            return ticket
+
+    def _try_admit(self, model: str, ticket: _Ticket) -> bool:
+        with self._lock:
+            lane = self._lane(model)
+            now = time.monotonic()
+            if not lane.can_admit(ticket, now):
+                return False
+            heapq.heappop(lane.waiting)
+            lane.in_flight += 1
+            lane.rpm.take(1)
+            lane.tpm.take(ticket.tokens)
+            wait_ms = (now - ticket.enqueued) * 1000.0
+            self.metrics["calls"] += 1
+            self.metrics["wait_ms_total"] += wait_ms
+            queue_depth = len(lane.waiting)
+            limit = lane.concurrency_limit
+        emit(
+            "llm.sched",
+            model=model,
+            priority=ticket.priority,
+            wait_ms=round(wait_ms, 1),
+            queue_depth=queue_depth,
+            concurrency_limit=limit,
+            est_tokens=ticket.tokens,
+            task_id=current_task_id.get(),
+            step=current_step.get(),
+        )
+        return True
+
+    def _cancel(self, model: str, ticket: _Ticket) -> None:
+        with self._lock:
+            lane = self._lane(model)
+            try:
+                lane.waiting.remove(ticket)
+                heapq.heapify(lane.waiting)
+            except ValueError:
+                pass
+
+    def _release(self, model: str, *, est_tokens: int, used_tokens: int | None, rate_limited: bool) -> float:
+        with self._lock:
+            lane = self._lane(model)
+            lane.in_flight = max(0, lane.in_flight - 1)
+            if used_tokens:
+                lane.tpm.adjust(used_tokens - est_tokens)
+            if rate_limited:
+                self.metrics["rate_limited"] += 1
+                return lane.on_rate_limit(time.monotonic(), self.base_delay_s, self.max_delay_s)
+            lane.on_success()
+            return 0.0
+
+    # --- public API ----------------------------------------------------------
+
+    async def run(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        *,
+        priority: int = Priority.FOREGROUND,
+        est_tokens: int = 1,
+    ) -> T:
+        """Run an async LLM call under admission control, retrying on 429."""
+        if not _enabled():
+            return await call()
+        attempt = 0
+        while True:
+            ticket = self._enqueue(model, priority, est_tokens)
+            try:
+                while not self._try_admit(model, ticket):
+                    await asyncio.sleep(self.POLL_S)
+            except BaseException:
+                self._cancel(model, ticket)
+                raise
+            released = False
+            try:
+                result = await call()
+            except Exception as e:
+                limited = is_rate_limit_error(e)
+                delay = self._release(model, est_tokens=est_tokens, used_tokens=None, rate_limited=limited)
+                released = True
+                if not limited or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                emit("llm.rate_limited", model=model, attempt=attempt, backoff_s=round(delay, 2), priority=priority)
+                continue
+            else:
+                self._release(model, est_tokens=est_tokens, used_tokens=_usage_tokens(result), rate_limited=False)
+                released = True
+            finally:
+                # Cancellation (hedge loser, task shutdown) must hand the slot back too, or the lane deadlocks
+                if not released:
+                    self._release(model, est_tokens=est_tokens, used_tokens=None, rate_limited=False)
+            return result
+
+    def run_sync(
+        self,
+        model: str,
+        call: Callable[[], T],
+        *,
+        priority: int = Priority.FOREGROUND,
+        est_tokens: int = 1,
+    ) -> T:
+        """Blocking variant for sync clients (legacy agent, google-genai generate_content)."""
+        if not _enabled():
+            return call()
+        attempt = 0
+        while True:
+            ticket = self._enqueue(model, priority, est_tokens)
+            try:
+                while not self._try_admit(model, ticket):
+                    time.sleep(self.POLL_S)
+            except BaseException:
+                self._cancel(model, ticket)
+                raise
+            released = False
+            try:
+                result = call()
+            except Exception as e:
+                limited = is_rate_limit_error(e)
+                delay = self._release(model, est_tokens=est_tokens, used_tokens=None, rate_limited=limited)
+                released = True
+                if not limited or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                emit("llm.rate_limited", model=model, attempt=attempt, backoff_s=round(delay, 2), priority=priority)
+                continue
+            else:
+                self._release(model, est_tokens=est_tokens, used_tokens=_usage_tokens(result), rate_limited=False)
+                released = True
+            finally:
+                # Cancellation (hedge loser, task shutdown) must hand the slot back too, or the lane deadlocks
+                if not released:
+                    self._release(model, est_tokens=est_tokens, used_tokens=None, rate_limited=False)
+            return result
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                **self.metrics,
+                "lanes": {
+                    m: {
+                        "queue_depth": len(l.waiting),
+                        "in_flight": l.in_flight,
+                        "concurrency_limit": l.concurrency_limit,
+                        "cooldown_s": round(max(0.0, l.cooldown_until - time.monotonic()), 2),
+                    }
+                    for m, l in self._lanes.items()
+                },
+            }
+
+
+def _usage_tokens(result: Any) -> int | None:
+    usage = getattr(result, "usage", None) or getattr(result, "usage_metadata", None)
+    if usage is None:
+        return None
+    total = getattr(usage, "total_tokens", None) or getattr(usage, "total_token_count", None)
+    return int(total) if total else None
+
+
+_scheduler: LLMScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Process-wide scheduler (all tasks share one API key, so they share one budget)."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
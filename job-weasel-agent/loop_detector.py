@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True)
+class StepFingerprint:
+    """What the agent saw (url + DOM hash) and what it did (normalized actions) in one step."""
+
+    url: str
+    dom_hash: str
+    actions: tuple[str, ...]
+
+    @property
+    def is_scroll_only(self) -> bool:
+        return bool(self.actions) and all(a.startswith("scroll") for a in self.actions)
+
+
+@dataclass(frozen=True)
+class LoopEvent:
+    kind: str  # repeat | oscillation | scroll_thrash
+    period: int
+    repeats: int
+    detail: str
+
+
+def action_signature(action: Any) -> str:
+    """Normalize a Browser-Use ActionModel into `name:{params}` (stable across steps)."""
+    try:
+        data = action.model_dump(exclude_unset=True, exclude_none=True)
+    except Exception:
+        return str(action)[:120]
+    if not isinstance(data, dict) or not data:
+        return "noop"
+    name, params = next(iter(data.items()))
+    if name == "scroll" and isinstance(params, dict):
+        return f"scroll:{'down' if params.get('down', True) else 'up'}"
+    return f"{name}:{json.dumps(params, sort_keys=True, default=str)[:200]}"
+
+
+def fingerprint_from_agent(agent: Any) -> StepFingerprint | None:
+    """Best-effort fingerprint of the step that just finished."""
+    bs = getattr(agent.browser_session, "_cached_browser_state_summary", None)
+    if bs is None:
+        return None
+    url = str(getattr(bs, "url", "") or "")
+    selector_map = getattr(getattr(bs, "dom_state", None), "selector_map", None) or {}
+    page_info = getattr(bs, "page_info", None)
+    dom_key = "|".join(
+        [
+            str(getattr(bs, "title", "") or ""),
+            str(len(selector_map)),
+            str(getattr(page_info, "pixels_above", "") if page_info is not None else ""),
+        ]
+    )
+    dom_hash = hashlib.sha1(dom_key.encode("utf-8")).hexdigest()[:12]
+
+    last_output = getattr(agent.state, "last_model_output", None)
+    actions = tuple(action_signature(a) for a in (getattr(last_output, "action", None) or []))
+    return StepFingerprint(url=url, dom_hash=dom_hash, actions=actions)
+
+
+class LoopDetector:
+    """
+    Sliding-window cycle detection over step fingerprints.
+
+    Detects:
+    - repeat: the same (url, dom, actions) N times in a row
+    - oscillation: a cycle of period 2..window/2 repeated twice (A→B→A→B)
+    - scroll_thrash: scroll-only steps on one URL that keep flipping direction
+    The window is cleared after each event so one loop fires once.
+    """
+
+    def __init__(self, window: int = 12, min_repeats: int = 3):
+        self.window: deque[StepFingerprint] = deque(maxlen=window)
+        self.min_repeats = min_repeats
+        self.loops_detected = 0
+
+    def reset(self) -> None:
+        self.window.clear()
+        self.loops_detected = 0
+
+    def observe(self, fp: StepFingerprint) -> LoopEvent | None:
+        self.window.append(fp)
+        event = self._detect()
+        if event is not None:
+            self.loops_detected += 1
+            self.window.clear()
+        return event
+
+    def _detect(self) -> LoopEvent | None:
+        seq = list(self.window)
+        n = len(seq)
+
+        tail = seq[-self.min_repeats :]
+        if n >= self.min_repeats and all(x == tail[0] for x in tail):
+            return LoopEvent(kind="repeat", period=1, repeats=self.min_repeats, detail=f"{tail[0].url} {tail[0].actions[:2]}")
+
+        for p in range(2, n // 2 + 1):
+            if seq[-p:] == seq[-2 * p : -p] and len({x.url + x.dom_hash for x in seq[-p:]}) > 1:
+                urls = " → ".join(x.url for x in seq[-p:])
+                return LoopEvent(kind="oscillation", period=p, repeats=2, detail=urls[:300])
+
+        scrolls = seq[-4:]
+        if len(scrolls) == 4 and all(x.is_scroll_only and x.url == scrolls[0].url for x in scrolls):
+            directions = ["down" if "scroll:down" in x.actions else "up" for x in scrolls]
+            flips = sum(1 for a, b in zip(directions, directions[1:]) if a != b)
+            if flips >= 2:
+                return LoopEvent(kind="scroll_thrash", period=2, repeats=flips, detail=scrolls[0].url)
+        return None
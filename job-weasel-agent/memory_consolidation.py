@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from memory_store import MemoryRecord, MemoryStore, tokenize
+from perf_logger import emit
+
+
+def shingles(text: str, n: int = 2) -> frozenset[str]:
+    """Word n-gram shingles (unigrams for very short texts)."""
+    toks = tokenize(text)
+    if len(toks) < n:
+        return frozenset(toks)
+    return frozenset(" ".join(toks[i : i + n]) for i in range(len(toks) - n + 1))
+
+
+def jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def value_score(rec: MemoryRecord, now: float, half_life_s: float) -> float:
+    """Occurrences and retrieval success, decayed by how long ago the item was last seen."""
+    recency = 0.5 ** ((now - rec.last_seen) / half_life_s)
+    # Smoothed success rate when injected; unknown (never retrieved) counts as neutral.
+    hit_rate = (rec.helped + 1) / (rec.retrieved + 2)
+    return rec.count * recency * (0.5 + hit_rate)
+
+
+@dataclass
+class ConsolidationReport:
+    before: int
+    merged: int
+    dropped: int
+    after: int
+    duration_ms: float
+
+
+class MemoryConsolidator:
+    """
+    Keeps the memory store small and high-signal between tasks.
+
+    - Clusters items of the same kind/domain/task_type by word-shingle Jaccard similarity
+      (candidates found through a shingle inverted index, not all pairs) and merges each
+      cluster into its most valuable member, summing counts and retrieval stats.
+    - Drops stale low-value items: seen once, never helped, older than WEASZEL_MEMORY_STALE_DAYS;
+      or retrieved often with a poor success rate.
+    - Caps the store at WEASZEL_MEMORY_MAX_ITEMS by value.
+    Runs at most every WEASZEL_MEMORY_CONSOLIDATE_EVERY tasks (see maybe_run).
+    """
+
+    def __init__(self, store: MemoryStore, similarity: float = 0.5):
+        self.store = store
+        self.similarity = similarity
+        self.stale_s = float(os.environ.get("WEASZEL_MEMORY_STALE_DAYS", "30")) * 86400
+        self.max_items = int(os.environ.get("WEASZEL_MEMORY_MAX_ITEMS", "5000"))
+        self.every_n_tasks = max(1, int(os.environ.get("WEASZEL_MEMORY_CONSOLIDATE_EVERY", "3")))
+        self._tasks_since = 0
+
+    def maybe_run(self) -> ConsolidationReport | None:
+        self._tasks_since += 1
+        if self._tasks_since < self.every_n_tasks:
+            return None
+        self._tasks_since = 0
+        return self.run()
+
+    def _clusters(self, records: list[MemoryRecord]) -> list[list[MemoryRecord]]:
+        groups: dict[tuple[str, str, str], list[MemoryRecord]] = defaultdict(list)
+        for r in records:
+            groups[(r.kind, r.domain, r.task_type)].append(r)
+
+        clusters: list[list[MemoryRecord]] = []
+        for members in groups.values():
+            sh = {r.id: shingles(r.text) for r in members}
+            by_shingle: dict[str, list[int]] = defaultdict(list)
+            for r in members:
+                for s in sh[r.id]:
+                    by_shingle[s].append(r.id)
+            by_id = {r.id: r for r in members}
+            parent = {r.id: r.id for r in members}
+
+            def find(x: int) -> int:
+                while parent[x] != x:
+                    parent[x] = parent[parent[x]]
+                    x = parent[x]
+                return x
+
+            for r in members:
+                candidates = {j for s in sh[r.id] for j in by_shingle[s] if j > r.id}
+                for j in candidates:
+                    if jaccard(sh[r.id], sh[j]) >= self.similarity:
+                        parent[find(j)] = find(r.id)
+
+            grouped: dict[int, list[MemoryRecord]] = defaultdict(list)
+            for r in members:
+                grouped[find(r.id)].append(by_id[r.id])
+            clusters.extend(c for c in grouped.values() if len(c) > 1)
+        return clusters
+
+    def run(self) -> ConsolidationReport:
+        t0 = time.perf_counter()
+        now = time.time()
+        half_life = self.store.RECENCY_HALF_LIFE_S
+        records = self.store.all_records()
+        before = len(records)
+
+        merged = 0
+        for cluster in self._clusters(records):
+            cluster.sort(key=lambda r: (value_score(r, now, half_life), r.last_seen), reverse=True)
+            keep, rest = cluster[0], cluster[1:]
+            self.store.merge(keep, rest)
+            merged += len(rest)
+
+        records = self.store.all_records()
+        drop: list[int] = []
+        for r in records:
+            stale = r.count <= 1 and r.helped == 0 and now - r.last_seen > self.stale_s
+            unhelpful = r.retrieved >= 5 and r.helped / r.retrieved < 0.1
+            if stale or unhelpful:
+                drop.append(r.id)
+        kept = [r for r in records if r.id not in set(drop)]
+        if len(kept) > self.max_items:
+            kept.sort(key=lambda r: value_score(r, now, half_life))
+            drop.extend(r.id for r in kept[: len(kept) - self.max_items])
+        self.store.delete(drop)
+
+        report = ConsolidationReport(
+            before=before,
+            merged=merged,
+            dropped=len(drop),
+            after=len(self.store),
+            duration_ms=round((time.perf_counter() - t0) * 1000.0, 1),
+        )
+        emit("memory.consolidated", **report.__dict__)
+        return report
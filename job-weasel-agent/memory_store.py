@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+from prompt_budget import count_tokens
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be before by for from has have if in is it its of on or so that the their then this to "
+    "was were when which will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS and len(t) > 1]
+
+
+def approx_tokens(text: str) -> int:
+    # Same estimate the prompt budgeter uses, so memory's share adds up with the other sections
+    return count_tokens(text)
+
+
+@dataclass
+class MemoryRecord:
+    id: int
+    ts: float
+    kind: str
+    text: str
+    domain: str = ""
+    task_type: str = ""
+    failure_class: str = ""
+    count: int = 1
+    last_seen: float = 0.0
+    meta: dict[str, Any] | None = None
+    # How often the item was injected into a prompt, and how often that task then succeeded
+    retrieved: int = 0
+    helped: int = 0
+
+    def render(self) -> str:
+        seen = f" x{self.count}" if self.count > 1 else ""
+        return f"- ({self.kind}{seen}) {self.text}"
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    domain TEXT NOT NULL DEFAULT '',
+    task_type TEXT NOT NULL DEFAULT '',
+    failure_class TEXT NOT NULL DEFAULT '',
+    count INTEGER NOT NULL DEFAULT 1,
+    last_seen REAL NOT NULL,
+    meta TEXT NOT NULL DEFAULT '{}'
+);
+CREATE UNIQUE INDEX IF NOT EXISTS items_norm ON items(norm, kind, domain, task_type);
+"""
+
+# Columns added after the first release of the table (applied with ALTER TABLE on open)
+_MIGRATIONS = {
+    "retrieved": "ALTER TABLE items ADD COLUMN retrieved INTEGER NOT NULL DEFAULT 0",
+    "helped": "ALTER TABLE items ADD COLUMN helped INTEGER NOT NULL DEFAULT 0",
+}
+
+
+class MemoryStore:
+    """
+    Persistent agent memory in SQLite (logs/memory.sqlite3), retrieved by relevance.
+
+    - add() is a single upsert (exact duplicates bump `count`/`last_seen`), never a file rewrite.
+    - Items are tagged with domain, task_type and failure_class.
+    - search()/render_for_prompt() rank with BM25 over an in-process inverted index plus tag
+      and recency boosts, and pack the top-k items into a token budget.
+    Thousands of items stay cheap: the index is built once per process and updated on add.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    TAG_BOOST = {"domain": 1.5, "task_type": 0.75, "failure_class": 1.0}
+    RECENCY_HALF_LIFE_S = 14 * 86400
+
+    def __init__(self, path: str | None = None, legacy_json: str | None = None):
+        self.path = path or os.path.abspath(os.environ.get("WEASZEL_MEMORY_DB", "logs/memory.sqlite3"))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(items)")}
+        for column, ddl in _MIGRATIONS.items():
+            if column not in columns:
+                self._db.execute(ddl)
+        self._db.commit()
+        self._retrieved_by_task: dict[str, set[int]] = {}
+        self._records: dict[int, MemoryRecord] = {}
+        self._tf: dict[int, Counter[str]] = {}
+        self._df: Counter[str] = Counter()
+        self._total_len = 0
+        self._load_index()
+        if not self._records and legacy_json:
+            self.import_legacy_json(legacy_json)
+
+    # --- index ---------------------------------------------------------------
+
+    @staticmethod
+    def _row_to_record(row: sqlite3.Row) -> MemoryRecord:
+        try:
+            meta = json.loads(row["meta"] or "{}")
+        except ValueError:
+            meta = {}
+        return MemoryRecord(
+            id=int(row["id"]),
+            ts=float(row["ts"]),
+            kind=row["kind"],
+            text=row["text"],
+            domain=row["domain"],
+            task_type=row["task_type"],
+            failure_class=row["failure_class"],
+            count=int(row["count"]),
+            last_seen=float(row["last_seen"]),
+            meta=meta,
+            retrieved=int(row["retrieved"]),
+            helped=int(row["helped"]),
+        )
+
+    def _index(self, rec: MemoryRecord) -> None:
+        if rec.id in self._tf:
+            self._unindex(rec.id)
+        tf = Counter(tokenize(f"{rec.text} {rec.kind}"))
+        self._records[rec.id] = rec
+        self._tf[rec.id] = tf
+        self._df.update(tf.keys())
+        self._total_len += sum(tf.values())
+
+    def _unindex(self, item_id: int) -> None:
+        tf = self._tf.pop(item_id, None)
+        self._records.pop(item_id, None)
+        if tf is None:
+            return
+        self._df.subtract(tf.keys())
+        self._total_len -= sum(tf.values())
+
+    def _load_index(self) -> None:
+        with self._lock:
+            for row in self._db.execute("SELECT * FROM items"):
+                self._index(self._row_to_record(row))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # --- writes ----------------------------------------------------------------
+
+    @staticmethod
+    def _norm(text: str) -> str:
+        return " ".join(tokenize(text))
+
+    def add(
+        self,
+        kind: str,
+        text: str,
+        *,
+        domain: str = "",
+        task_type: str = "",
+        failure_class: str = "",
+        **meta: Any,
+    ) -> int | None:
+        text = (text or "").strip()
+        if not text:
+            return None
+        now = time.time()
+        norm = self._norm(text) or text.lower()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO items (ts, kind, text, norm, domain, task_type, failure_class, count, last_seen, meta) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?) "
+                "ON CONFLICT(norm, kind, domain, task_type) DO UPDATE SET "
+                "count = count + 1, last_seen = excluded.last_seen, failure_class = excluded.failure_class",
+                (now, kind, text, norm, domain or "", task_type or "", failure_class or "", now, json.dumps(meta)),
+            )
+            self._db.commit()
+            row = self._db.execute(
+                "SELECT * FROM items WHERE norm = ? AND kind = ? AND domain = ? AND task_type = ?",
+                (norm, kind, domain or "", task_type or ""),
+            ).fetchone()
+            rec = self._row_to_record(row)
+            self._index(rec)
+            return rec.id
+
+    def import_legacy_json(self, path: str) -> int:
+        """One-time migration from the old logs/working_memory.json window."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                rows = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if isinstance(rows, dict):
+            rows = rows.get("items", [])
+        n = 0
+        for row in rows or []:
+            if not isinstance(row, dict):
+                continue
+            text = row.get("text") or json.dumps(row.get("data") or {}, ensure_ascii=False)
+            if self.add(str(row.get("kind", "note")), str(text)) is not None:
+                n += 1
+        return n
+
+    # --- retrieval ---------------------------------------------------------------
+
+    def _bm25(self, query_tokens: list[str], item_id: int, avg_len: float, n_docs: int) -> float:
+        tf = self._tf[item_id]
+        doc_len = sum(tf.values()) or 1
+        score = 0.0
+        for term in query_tokens:
+            f = tf.get(term)
+            if not f:
+                continue
+            df = self._df.get(term, 0)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            score += idf * (f * (self.K1 + 1)) / (f + self.K1 * (1 - self.B + self.B * doc_len / avg_len))
+        return score
+
+    def search(
+        self,
+        query: str,
+        *,
+        domain: str = "",
+        task_type: str = "",
+        failure_class: str = "",
+        k: int = 8,
+        token_budget: int = 300,
+    ) -> list[MemoryRecord]:
+        """Top-k relevant items that fit in `token_budget` (approximate tokens)."""
+        with self._lock:
+            n_docs = len(self._records)
+            if n_docs == 0:
+                return []
+            avg_len = max(1.0, self._total_len / n_docs)
+            q = list(dict.fromkeys(tokenize(query)))
+            now = time.time()
+            scored: list[tuple[float, MemoryRecord]] = []
+            for item_id, rec in self._records.items():
+                score = self._bm25(q, item_id, avg_len, n_docs) if q else 0.0
+                tag_hit = False
+                for tag, boost in self.TAG_BOOST.items():
+                    want = {"domain": domain, "task_type": task_type, "failure_class": failure_class}[tag]
+                    if want and getattr(rec, tag) == want:
+                        score += boost
+                        tag_hit = True
+                if score <= 0 and not tag_hit:
+                    continue
+                recency = 0.5 ** ((now - rec.last_seen) / self.RECENCY_HALF_LIFE_S)
+                score *= (1.0 + 0.25 * recency) * (1.0 + 0.1 * math.log1p(rec.count))
+                scored.append((score, rec))
+            scored.sort(key=lambda x: x[0], reverse=True)
+
+            out: list[MemoryRecord] = []
+            used = 0
+            for _, rec in scored:
+                cost = approx_tokens(rec.render())
+                if used + cost > token_budget:
+                    continue
+                out.append(rec)
+                used += cost
+                if len(out) >= k:
+                    break
+            return out
+
+    def recent(self, n: int = 12) -> list[MemoryRecord]:
+        with self._lock:
+            return sorted(self._records.values(), key=lambda r: r.last_seen)[-n:]
+
+    def render_for_prompt(
+        self,
+        query: str,
+        *,
+        domain: str = "",
+        task_type: str = "",
+        failure_class: str = "",
+        k: int = 8,
+        token_budget: int = 300,
+        task_id: str | None = None,
+    ) -> str:
+        items = self.search(
+            query, domain=domain, task_type=task_type, failure_class=failure_class, k=k, token_budget=token_budget
+        )
+        if not items:
+            return ""
+        if task_id:
+            self._retrieved_by_task.setdefault(task_id, set()).update(r.id for r in items)
+        return "\n".join(["<working_memory>", *(r.render() for r in items), "</working_memory>"])
+
+    def record_task_outcome(self, task_id: str | None, *, success: bool) -> None:
+        """Credit the items injected during a task: retrieved += 1, helped += success."""
+        ids = self._retrieved_by_task.pop(task_id or "", set())
+        if not ids:
+            return
+        with self._lock:
+            self._db.executemany(
+                "UPDATE items SET retrieved = retrieved + 1, helped = helped + ? WHERE id = ?",
+                [(1 if success else 0, i) for i in ids],
+            )
+            self._db.commit()
+            for i in ids:
+                rec = self._records.get(i)
+                if rec is not None:
+                    rec.retrieved += 1
+                    rec.helped += 1 if success else 0
+
+    def all_records(self) -> list[MemoryRecord]:
+        with self._lock:
+            return list(self._records.values())
+
+    def merge(self, keep: MemoryRecord, absorbed: list[MemoryRecord]) -> None:
+        """Fold near-duplicates into `keep` (summing counts and stats) and delete them."""
+        if not absorbed:
+            return
+        with self._lock:
+            keep.count += sum(r.count for r in absorbed)
+            keep.retrieved += sum(r.retrieved for r in absorbed)
+            keep.helped += sum(r.helped for r in absorbed)
+            keep.last_seen = max([keep.last_seen, *(r.last_seen for r in absorbed)])
+            keep.ts = min([keep.ts, *(r.ts for r in absorbed)])
+            self._db.execute(
+                "UPDATE items SET count = ?, retrieved = ?, helped = ?, last_seen = ?, ts = ? WHERE id = ?",
+                (keep.count, keep.retrieved, keep.helped, keep.last_seen, keep.ts, keep.id),
+            )
+            self._db.executemany("DELETE FROM items WHERE id = ?", [(r.id,) for r in absorbed])
+            self._db.commit()
+            for r in absorbed:
+                self._unindex(r.id)
+            self._index(keep)
+
+    def delete(self, ids: list[int]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            self._db.executemany("DELETE FROM items WHERE id = ?", [(i,) for i in ids])
+            self._db.commit()
+            for i in ids:
+                self._unindex(i)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
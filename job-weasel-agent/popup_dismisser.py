@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urlparse
+
+from browser_use.agent.service import Agent
+
+from cdp_eval import evaluate_js
+from perf_context import current_step, current_task_id
+from perf_logger import emit
+
+
+def _enabled() -> bool:
+    return os.environ.get("WEASZEL_POPUP_DISMISS", "1").lower() not in ("0", "off", "false", "no")
+
+
+@dataclass(frozen=True)
+class PopupRule:
+    """Ordered selectors for one consent manager (CMP). Reject/necessary-only buttons come first."""
+
+    name: str
+    selectors: tuple[str, ...]
+    shadow_host: str | None = None
+
+
+# Curated rules for the consent managers we hit most often.
+CMP_RULES: tuple[PopupRule, ...] = (
+    PopupRule("onetrust", ("#onetrust-reject-all-handler", "#onetrust-accept-btn-handler")),
+    PopupRule(
+        "quantcast",
+        (".qc-cmp2-summary-buttons button[mode='secondary']", ".qc-cmp2-summary-buttons button[mode='primary']"),
+    ),
+    PopupRule("didomi", ("#didomi-notice-disagree-button", "#didomi-notice-agree-button")),
+    PopupRule(
+        "cookiebot",
+        ("#CybotCookiebotDialogBodyButtonDecline", "#CybotCookiebotDialogBodyLevelButtonLevelOptinAllowAll"),
+    ),
+    PopupRule("trustarc", ("#truste-consent-required", "#truste-consent-button")),
+    PopupRule("osano", (".osano-cm-denyAll", ".osano-cm-accept-all")),
+    PopupRule(
+        "usercentrics",
+        ("[data-testid='uc-deny-all-button']", "[data-testid='uc-accept-all-button']"),
+        shadow_host="#usercentrics-root",
+    ),
+    PopupRule("google_consent", ("button[aria-label='Reject all']", "button[aria-label='Accept all']")),
+)
+
+# Generic fallback: only buttons inside containers whose id/class/aria-label mark them as cookie
+# consent banners or marketing overlays. Dialogs that match neither are never touched (the agent
+# may have opened that dialog itself, e.g. an application modal).
+CONSENT_CONTAINER_PATTERN = r"cookie|consent|gdpr"
+OVERLAY_CONTAINER_PATTERN = r"newsletter|subscribe|notification|promo|signup-modal"
+# Button labels in order of preference. Only consent banners may ever be accepted (as a last
+# resort); newsletter/notification/signup overlays are only closed, never agreed to or submitted.
+REJECT_BUTTON_PATTERN = r"^(reject all|decline( all)?|only (necessary|essential)|necessary only)$"
+CLOSE_BUTTON_PATTERN = r"^(no,? thanks|not now|maybe later|dismiss|close|×|✕|x)$"
+ACCEPT_BUTTON_PATTERN = r"^(accept( all)?( cookies)?|i agree|agree|allow all|got it|ok(ay)?)$"
+BUTTON_PATTERNS: dict[str, tuple[str, ...]] = {
+    "consent": (REJECT_BUTTON_PATTERN, CLOSE_BUTTON_PATTERN, ACCEPT_BUTTON_PATTERN),
+    "overlay": (CLOSE_BUTTON_PATTERN,),
+}
+
+_DISMISS_JS = r"""
+((cfg) => {
+  const url = location.href;
+  if (cfg.skip_url === url) return { url, skipped: true, clicked: [] };
+  const clicked = [];
+  const visible = (el) => {
+    if (!el) return false;
+    const r = el.getBoundingClientRect();
+    const s = getComputedStyle(el);
+    return r.width > 0 && r.height > 0 && s.visibility !== 'hidden' && s.display !== 'none';
+  };
+  const cssPath = (el) => {
+    if (el.id) return '#' + CSS.escape(el.id);
+    const cls = Array.from(el.classList).slice(0, 2).map(c => '.' + CSS.escape(c)).join('');
+    const parent = el.parentElement;
+    const pid = parent && parent.id ? '#' + CSS.escape(parent.id) + ' > ' : '';
+    return pid + el.tagName.toLowerCase() + cls;
+  };
+  const consentRe = new RegExp(cfg.consent_pattern, 'i');
+  const overlayRe = new RegExp(cfg.overlay_pattern, 'i');
+  const buttonRes = Object.fromEntries(Object.entries(cfg.button_patterns)
+    .map(([kind, pats]) => [kind, pats.map(p => new RegExp(p, 'i'))]));
+  const kindOf = (c) => {
+    const sig = (c.id || '') + ' ' + String(c.className || '') + ' ' + (c.getAttribute('aria-label') || '');
+    return consentRe.test(sig) ? 'consent' : (overlayRe.test(sig) ? 'overlay' : null);
+  };
+  const label = (b) => (b.innerText || b.getAttribute('aria-label') || '').trim();
+  const allowed = (b, kind) => buttonRes[kind].some(re => re.test(label(b)));
+  // Most preferred visible button of this container (reject > close > accept for consent)
+  const pickButton = (c, kind) => {
+    const buttons = Array.from(c.querySelectorAll('button, [role=button], a')).filter(visible);
+    for (const re of buttonRes[kind]) {
+      const b = buttons.find(b => re.test(label(b)));
+      if (b) return b;
+    }
+    return null;
+  };
+  // Learned selectors only fire inside a visible container that is still the same kind of
+  // overlay, and only on a button whose label is still allowed for that kind.
+  const tryLearned = (entry) => {
+    let c = null, b = null;
+    try { c = document.querySelector(entry.container); } catch (e) { return false; }
+    if (!visible(c)) return false;
+    const kind = kindOf(c);
+    if (!kind) return false;
+    try { b = c.querySelector(entry.button); } catch (e) { return false; }
+    if (!visible(b) || !allowed(b, kind)) return false;
+    b.click();
+    clicked.push({ rule: 'learned', container: entry.container, selector: entry.button });
+    return true;
+  };
+  const tryClick = (root, sel, rule) => {
+    let el = null;
+    try { el = root.querySelector(sel); } catch (e) { return false; }
+    if (!visible(el)) return false;
+    el.click();
+    clicked.push({ rule, selector: sel });
+    return true;
+  };
+  for (const entry of (cfg.learned[location.hostname] || [])) { if (tryLearned(entry)) break; }
+  for (const rule of cfg.rules) {
+    let root = document;
+    if (rule.shadow_host) {
+      const host = document.querySelector(rule.shadow_host);
+      if (!host || !host.shadowRoot) continue;
+      root = host.shadowRoot;
+    }
+    for (const sel of rule.selectors) { if (tryClick(root, sel, rule.name)) break; }
+  }
+  if (!clicked.length) {
+    const containers = Array.from(document.querySelectorAll(
+      '[role=dialog], [aria-modal=true], [class*=cookie i], [id*=cookie i], [class*=consent i], [id*=consent i], ' +
+      '[class*=newsletter i], [class*=modal i], [class*=popup i]'
+    )).filter(c => visible(c) && kindOf(c));
+    for (const c of containers.slice(0, 5)) {
+      const btn = pickButton(c, kindOf(c));
+      if (btn) { btn.click(); clicked.push({ rule: 'generic', container: cssPath(c), selector: cssPath(btn) }); break; }
+    }
+  }
+  return { url, skipped: false, clicked };
+})(__CFG__)
+"""
+
+
+@dataclass
+class DomainPopupStats:
+    dismissals: int = 0
+    # {"container": ..., "button": ...}: the button is only clicked inside a matching overlay container
+    learned_selectors: list[dict[str, str]] = field(default_factory=list)
+    by_rule: dict[str, int] = field(default_factory=dict)
+
+
+class PopupDismisser:
+    """
+    Local rule engine that clears consent banners and newsletter/notification overlays
+    before Browser-Use snapshots the DOM, so the model never spends a step on them.
+
+    Runs from the step-start hook (which fires before state capture). Each URL is checked
+    on arrival and once more on the following step to catch delayed overlays.
+    Container + button selectors that worked via the generic fallback are learned per domain;
+    a learned button is only clicked while its container still matches the overlay patterns.
+    Only cookie-consent banners can ever be accepted; other overlays are only closed.
+    """
+
+    MAX_LEARNED_PER_DOMAIN = 4
+    CHECKS_PER_URL = 2
+
+    def __init__(self, stats_path: str | None = None):
+        self.stats_path = stats_path or os.path.abspath("logs/popup_rules.json")
+        self.stats: dict[str, DomainPopupStats] = self._load()
+        self._last_url: str | None = None
+        self._checks_on_url = 0
+
+    def _load(self) -> dict[str, DomainPopupStats]:
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            return {
+                d: DomainPopupStats(
+                    dismissals=int(v.get("dismissals", 0)),
+                    # Bare selectors from older files were clicked document-wide; drop them
+                    learned_selectors=[
+                        {"container": str(x["container"]), "button": str(x["button"])}
+                        for x in v.get("learned_selectors", [])
+                        if isinstance(x, dict) and x.get("container") and x.get("button")
+                    ],
+                    by_rule={str(k): int(n) for k, n in (v.get("by_rule") or {}).items()},
+                )
+                for d, v in raw.items()
+            }
+        except (OSError, ValueError, AttributeError, TypeError):
+            return {}
+
+    def _payload(self) -> dict[str, Any]:
+        return {
+            d: {"dismissals": s.dismissals, "learned_selectors": list(s.learned_selectors), "by_rule": dict(s.by_rule)}
+            for d, s in self.stats.items()
+        }
+
+    def _save(self, payload: dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+        tmp = self.stats_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.stats_path)
+
+    def reset(self) -> None:
+        """Forget per-task URL tracking (stats are kept)."""
+        self._last_url = None
+        self._checks_on_url = 0
+
+    def _config(self) -> dict[str, Any]:
+        learned = {d: s.learned_selectors for d, s in self.stats.items() if s.learned_selectors}
+        skip_url = self._last_url if self._checks_on_url >= self.CHECKS_PER_URL else None
+        return {
+            "skip_url": skip_url,
+            "learned": learned,
+            "rules": [{"name": r.name, "selectors": list(r.selectors), "shadow_host": r.shadow_host} for r in CMP_RULES],
+            "consent_pattern": CONSENT_CONTAINER_PATTERN,
+            "overlay_pattern": OVERLAY_CONTAINER_PATTERN,
+            "button_patterns": {kind: list(p) for kind, p in BUTTON_PATTERNS.items()},
+        }
+
+    def _record(self, domain: str, clicked: list[dict[str, str]]) -> None:
+        stats = self.stats.setdefault(domain, DomainPopupStats())
+        for c in clicked:
+            rule = str(c.get("rule") or "unknown")
+            stats.dismissals += 1
+            stats.by_rule[rule] = stats.by_rule.get(rule, 0) + 1
+            entry = {"container": str(c.get("container") or ""), "button": str(c.get("selector") or "")}
+            if rule == "generic" and all(entry.values()) and entry not in stats.learned_selectors:
+                stats.learned_selectors = (stats.learned_selectors + [entry])[-self.MAX_LEARNED_PER_DOMAIN :]
+
+    async def on_step_start(self, agent: Agent) -> None:
+        if not _enabled():
+            return
+        try:
+            cfg = self._config()
+            result = await evaluate_js(agent.browser_session, _DISMISS_JS.replace("__CFG__", json.dumps(cfg))) or {}
+        except Exception:
+            return
+
+        url = str(result.get("url") or "")
+        if url != self._last_url:
+            self._last_url = url
+            self._checks_on_url = 0
+        if result.get("skipped"):
+            return
+        self._checks_on_url += 1
+
+        clicked = list(result.get("clicked") or [])
+        if not clicked:
+            return
+        domain = urlparse(url).hostname or "unknown"
+        self._record(domain, clicked)
+        try:
+            await asyncio.to_thread(self._save, self._payload())
+        except OSError:
+            pass
+        emit(
+            "popup.dismissed",
+            task_id=current_task_id.get(),
+            step=current_step.get(),
+            domain=domain,
+            rules=[c.get("rule") for c in clicked],
+            total_for_domain=self.stats[domain].dismissals,
+        )
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+
+from perf_context import current_step, current_task_id
+from perf_logger import emit
+
+
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|\S")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Local approximation of a BPE token count (no tokenizer download, no API call).
+    Words cost 1 token plus 1 per 6 extra letters, digits group by 3, every other symbol is 1.
+    Within ~10-15% of Gemini/OpenAI counts on English prose and markup.
+    """
+    n = 0
+    for piece in _PIECE_RE.findall(text or ""):
+        c = piece[0]
+        if c.isascii() and c.isalpha():
+            n += 1 + (len(piece) - 1) // 6
+        elif c.isdigit():
+            n += (len(piece) + 2) // 3
+        else:
+            n += 1
+    return n
+
+
+# Lower number = more important (trimmed last), same ordering as llm_scheduler.Priority.
+DEFAULT_PRIORITIES: dict[str, int] = {
+    "weaszel_done_policy": 0,
+    "weaszel_thinking": 1,
+    "user_profile_reference": 2,
+    "working_memory": 3,
+    "quick_think": 4,
+    "steering": 5,
+}
+
+
+def _priorities() -> dict[str, int]:
+    """DEFAULT_PRIORITIES overridden by WEASZEL_PROMPT_PRIORITIES, e.g. "steering=1,working_memory=4"."""
+    out = dict(DEFAULT_PRIORITIES)
+    for part in os.environ.get("WEASZEL_PROMPT_PRIORITIES", "").split(","):
+        name, _, value = part.partition("=")
+        try:
+            out[name.strip()] = int(value)
+        except ValueError:
+            continue
+    return out
+
+
+def default_budget() -> int:
+    """WEASZEL_PROMPT_BUDGET tokens of injected context per step (0 = count and log only)."""
+    try:
+        return max(0, int(os.environ.get("WEASZEL_PROMPT_BUDGET", "2500")))
+    except ValueError:
+        return 2500
+
+
+def extract_section(text: str, tag: str) -> str:
+    """The `<tag>...</tag>` block inside `text` (including the tags), or ""."""
+    m = re.search(rf"<{tag}>.*?</{tag}>", text or "", flags=re.S)
+    return m.group(0) if m else ""
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Drop trailing body lines (lists are written most-important-first) until the section fits,
+    keeping the opening/closing tag lines; a single oversized line is cut with an ellipsis.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+    head = [lines.pop(0)] if lines and lines[0].lstrip().startswith("<") else []
+    tail = [lines.pop()] if lines and lines[-1].lstrip().startswith("</") else []
+    frame = count_tokens("\n".join(head + tail))
+    if frame >= max_tokens:
+        return ""
+    while len(lines) > 1 and count_tokens("\n".join(head + lines + tail)) > max_tokens:
+        lines.pop()
+    if lines and count_tokens("\n".join(head + lines + tail)) > max_tokens:
+        room = max_tokens - frame - 1
+        line = lines[0]
+        while line and count_tokens(line) > room:
+            line = line[: int(len(line) * 0.8)]
+        lines = [line.rstrip() + "…"] if line else []
+    if not lines:
+        return ""
+    return "\n".join(head + lines + tail)
+
+
+@dataclass
+class Section:
+    name: str
+    text: str
+    # None = DEFAULT_PRIORITIES / WEASZEL_PROMPT_PRIORITIES (unknown names trim first)
+    priority: int | None = None
+    # Counted against the budget but never trimmed (e.g. already baked into the task string)
+    fixed: bool = False
+    # Custom reducer (text, max_tokens) -> text; defaults to trim_to_tokens
+    shrink: Callable[[str, int], str] | None = None
+
+
+@dataclass
+class BudgetResult:
+    texts: dict[str, str]
+    tokens: dict[str, int]
+    trimmed: list[str] = field(default_factory=list)
+
+    def __getitem__(self, name: str) -> str:
+        return self.texts.get(name, "")
+
+    @property
+    def used(self) -> int:
+        return sum(self.tokens.values())
+
+
+def fit(sections: list[Section], *, where: str, budget: int | None = None) -> BudgetResult:
+    """
+    Fit injected prompt sections into one token budget.
+
+    Sections are trimmed lowest-priority first (ties: later section first), each only as much
+    as needed, so higher-priority sections are untouched while anything else can give way.
+    Emits prompt.budget with per-section counts before/after for the current task/step.
+    """
+    budget = default_budget() if budget is None else budget
+    prios = _priorities()
+    before = {s.name: count_tokens(s.text) for s in sections}
+    texts = {s.name: s.text for s in sections}
+    after = dict(before)
+    trimmed: list[str] = []
+
+    overflow = sum(before.values()) - budget if budget > 0 else 0
+    if overflow > 0:
+        order = sorted(
+            ((i, s) for i, s in enumerate(sections) if not s.fixed and s.text),
+            key=lambda p: (prios.get(p[1].name, 99) if p[1].priority is None else p[1].priority, p[0]),
+            reverse=True,
+        )
+        for _, s in order:
+            if overflow <= 0:
+                break
+            target = max(0, after[s.name] - overflow)
+            new_text = (s.shrink or trim_to_tokens)(s.text, target)
+            new_tokens = count_tokens(new_text)
+            if new_tokens > target and new_tokens >= after[s.name]:
+                continue
+            overflow -= after[s.name] - new_tokens
+            texts[s.name], after[s.name] = new_text, new_tokens
+            trimmed.append(s.name)
+
+    emit(
+        "prompt.budget",
+        task_id=current_task_id.get(),
+        step=current_step.get(),
+        where=where,
+        budget=budget,
+        tokens_in=sum(before.values()),
+        tokens_out=sum(after.values()),
+        sections=before,
+        kept=after,
+        trimmed=trimmed,
+    )
+    return BudgetResult(texts=texts, tokens=after, trimmed=trimmed)
+
+
+def task_sections(task: str) -> list[Section]:
+    """Task-level blocks repeated in every step prompt, as fixed sections for per-step accounting."""
+    out = []
+    for tag in ("weaszel_done_policy", "user_profile_reference"):
+        block = extract_section(task, tag)
+        if block:
+            out.append(Section(tag, block, fixed=True))
+    return out
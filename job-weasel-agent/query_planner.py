@@ -6,10 +6,16 @@ from dataclasses import dataclass
 import re
 from browser_use.llm.google.chat import ChatGoogle
 from browser_use.llm.messages import UserMessage
+from pydantic import BaseModel, Field
 from rich.console import Console
 from rich.prompt import Prompt
 from rich.panel import Panel
 from rich import print as rprint
+from bot_wall import domain_of
+from site_ranking import SiteStrategyStore
+from timed_llm import TimedLLM
+from llm_scheduler import Priority
+from structured_output import ainvoke_structured
 
 console = Console()
 
@@ -22,6 +28,22 @@ class QueryAnalysis:
     clarifying_questions: list[Dict[str, str]]
     confidence: float
 
+
+class ClarifyingQuestion(BaseModel):
+    key: str = Field(description='Short identifier, e.g. "origin_city", "budget", "image_subject"')
+    question: str = Field(description="The question to ask the user")
+    example: str = Field(default="", description="An example answer to help the user")
+
+
+class QueryAnalysisOutput(BaseModel):
+    """Response schema for the analysis call (QueryAnalysis is what the rest of the planner uses)."""
+    task_type: str = Field(description="flight_search, hotel_booking, shopping, job_search, research, image_search, form_filling, ...")
+    is_complete: bool = Field(description="True if the query is actionable as written")
+    missing_info: list[str] = Field(default_factory=list)
+    clarifying_questions: list[ClarifyingQuestion] = Field(default_factory=list)
+    confidence: float = Field(default=0.5, ge=0.0, le=1.0)
+
+
 class QueryPlanner:
     """
     Analyzes user queries and builds enhanced task instructions.
@@ -32,17 +54,30 @@ class QueryPlanner:
     3. Build comprehensive task instructions
     """
     
-    def __init__(self, model_name: str = "gemini-2.5-flash-lite"):
+    # Job boards the job_search fast path knows how to drive (ranked here only: they are not
+    # switch targets in site_alternatives.json because LinkedIn needs a login)
+    JOB_BOARDS = {"https://www.indeed.com": "Indeed", "https://www.linkedin.com/jobs": "LinkedIn Jobs"}
+
+    def __init__(self, model_name: str = "gemini-2.5-flash-lite", site_store: SiteStrategyStore | None = None):
         self.model_name = model_name
+        # Learned per-task-type site ranking; start on the historically fastest reliable site
+        try:
+            self.site_store = site_store if site_store is not None else SiteStrategyStore()
+        except Exception:
+            self.site_store = None
         self.api_key = os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
         
-        # Use the same ChatGoogle client as browser_agent for consistency
-        self.llm = ChatGoogle(
-            model=self.model_name,
-            api_key=self.api_key,
-            temperature=0.0,
+        # Use the same ChatGoogle client as browser_agent for consistency (timed + scheduled)
+        self.llm = TimedLLM(
+            ChatGoogle(
+                model=self.model_name,
+                api_key=self.api_key,
+                temperature=0.0,
+            ),
+            priority=Priority.PLANNER,
+            site="planner",
         )
 
         # Session-level caches to avoid repeated analysis for identical queries
@@ -93,41 +128,21 @@ CRITICAL RULES:
 - For job searches, ask: job title and location ONLY if missing. If the user already said a site (Indeed/LinkedIn), do NOT ask which job board to use.
 
 EXTRA CONTEXT (already known from the query; do NOT ask for these again):
-- job_board: {known_job_board or "unknown"}
-
-Return your analysis as a JSON object with this structure:
-{{
-  "task_type": "string",
-  "is_complete": boolean,
-  "missing_info": ["array", "of", "missing", "info"],
-  "clarifying_questions": [
-    {{"key": "identifier", "question": "Your question?", "example": "Example answer"}},
-    ...
-  ],
-  "confidence": 0.0-1.0
-}}
-
-Respond with ONLY the JSON object, no other text."""
+- job_board: {known_job_board or "unknown"}"""
 
         try:
-            # Use ChatGoogle .ainvoke() which is async
-            response = await self.llm.ainvoke([UserMessage(content=analysis_prompt)])
-            
-            # Parse the JSON response
-            response_text = response.completion.strip()
-            # Remove markdown code blocks if present
-            if response_text.startswith("```json"):
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif response_text.startswith("```"):
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            
-            analysis_data = json.loads(response_text)
+            # Native response schema; one bounded repair call if the model's JSON doesn't parse
+            parsed = await ainvoke_structured(
+                self.llm, [UserMessage(content=analysis_prompt)], QueryAnalysisOutput, name="planner.analysis"
+            )
+            if parsed is None:
+                raise ValueError("analysis output did not match the schema")
             result = QueryAnalysis(
-                task_type=analysis_data.get("task_type", "unknown"),
-                is_complete=analysis_data.get("is_complete", False),
-                missing_info=analysis_data.get("missing_info", []),
-                clarifying_questions=analysis_data.get("clarifying_questions", []),
-                confidence=analysis_data.get("confidence", 0.5)
+                task_type=parsed.task_type or "unknown",
+                is_complete=parsed.is_complete,
+                missing_info=parsed.missing_info,
+                clarifying_questions=[q.model_dump() for q in parsed.clarifying_questions],
+                confidence=parsed.confidence,
             )
 
             # Post-filter: remove clarifying questions that are already answered by the query.
@@ -271,6 +286,29 @@ Return ONLY the enhanced task instruction, no preamble or explanation."""
             console.print(f"[yellow]Warning: Task enhancement failed ({e}). Using original query.[/yellow]")
             return original_query
     
+    def _preferred_job_board(self) -> str:
+        if self.site_store is not None:
+            return self.JOB_BOARDS[self.site_store.rank("job_search", list(self.JOB_BOARDS))[0]]
+        return "Indeed"
+
+    def _site_hint(self, query: str, task_type: str) -> str:
+        """Suggest the best-ranked site when the user did not name one."""
+        if self.site_store is None:
+            return ""
+        alternatives = self.site_store.alternatives(task_type)
+        if not alternatives:
+            return ""
+        q_lc = (query or "").lower()
+        if re.search(r"https?://|\.(com|org|net|io)\b", q_lc) or any(
+            domain_of(u).split(".")[0] in q_lc for u in alternatives
+        ):
+            return ""
+        # No history yet: let the agent pick rather than pinning it to the first configured site
+        if not self.site_store.has_evidence(task_type, alternatives):
+            return ""
+        best = self.site_store.rank(task_type, alternatives)[0]
+        return f"\n\nStart on {best} (fastest reliable site for this kind of task so far)."
+
     async def _plan_async(self, query: str) -> tuple[str, str]:
         """
         Async version of plan - runs all async operations in one event loop.
@@ -302,7 +340,7 @@ Return ONLY the enhanced task instruction, no preamble or explanation."""
                 q_lc = q.lower()
                 on_indeed = "indeed" in q_lc
                 on_linkedin = "linkedin" in q_lc
-                site = "Indeed" if on_indeed else ("LinkedIn Jobs" if on_linkedin else "Indeed")
+                site = "Indeed" if on_indeed else ("LinkedIn Jobs" if on_linkedin else self._preferred_job_board())
 
                 enhanced = (
                     f"Go to {site}.\n"
@@ -339,7 +377,7 @@ Return ONLY the enhanced task instruction, no preamble or explanation."""
                 return (enhanced + done_guard + f"\n<original_user_request>\n{q}\n</original_user_request>", analysis.task_type)
 
             console.print("[dim]✓ Query looks good! Proceeding...[/dim]\n")
-            return (query + done_guard, analysis.task_type)
+            return (query + self._site_hint(query, analysis.task_type) + done_guard, analysis.task_type)
         
         # Ask clarifying questions (this is sync, so it's fine)
         clarifications = self.ask_clarifications(analysis)
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import os
+
+from perf_context import current_task_id
+from perf_logger import emit
+from thinking_engine import StepOutcome, ThinkingEngine
+
+
+class ReflectionQueue:
+    """
+    Coalesces post-step reflections off the step loop.
+
+    Outcomes selected by ThinkingEngine.should_reflect are buffered and summarized in one
+    LLM call when WEASZEL_REFLECT_BATCH outcomes have queued up (default 4), when the
+    oldest has waited WEASZEL_REFLECT_FLUSH_S seconds (default 30), or at task end.
+    At most one flush runs at a time; outcomes arriving meanwhile go into the next batch.
+    """
+
+    def __init__(self, engine: ThinkingEngine, task: str, task_type: str = ""):
+        self.engine = engine
+        self.task = task
+        self.task_type = task_type
+        self.batch_size = max(1, int(os.environ.get("WEASZEL_REFLECT_BATCH", "4")))
+        self.flush_s = float(os.environ.get("WEASZEL_REFLECT_FLUSH_S", "30"))
+        self._buffer: list[StepOutcome] = []
+        self._timer: asyncio.Task[None] | None = None
+        self._flushing: asyncio.Task[None] | None = None
+
+    def submit(self, outcome: StepOutcome) -> None:
+        if not self.engine.should_reflect(step=outcome.step, had_error=outcome.had_error):
+            return
+        self._buffer.append(outcome)
+        if len(self._buffer) >= self.batch_size:
+            self._start_flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_s)
+        self._start_flush()
+
+    def _start_flush(self) -> None:
+        if self._flushing is not None and not self._flushing.done():
+            return  # picked up by the running flush's follow-up
+        if self._timer is not None and not self._timer.done() and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        self._flushing = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        while self._buffer:
+            batch, self._buffer = self._buffer[: self.batch_size * 2], self._buffer[self.batch_size * 2 :]
+            try:
+                await self.engine.reflect_batch(task=self.task, outcomes=batch, task_type=self.task_type)
+            except Exception as e:
+                emit("thinking.reflect_failed", task_id=current_task_id.get(), error=str(e)[:200], batch_size=len(batch))
+            # Below a full batch, wait for the timer or task end instead of flushing stragglers now.
+            if len(self._buffer) < self.batch_size:
+                break
+        if self._buffer and (self._timer is None or self._timer.done()):
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def close(self) -> None:
+        """Flush whatever is left (task end)."""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        self._timer = None
+        if self._flushing is not None:
+            try:
+                await self._flushing
+            except Exception:
+                pass
+        if self._buffer:
+            self._flushing = asyncio.create_task(self._flush_all())
+            await self._flushing
+
+    async def _flush_all(self) -> None:
+        batch, self._buffer = self._buffer, []
+        try:
+            await self.engine.reflect_batch(task=self.task, outcomes=batch, task_type=self.task_type)
+        except Exception as e:
+            emit("thinking.reflect_failed", task_id=current_task_id.get(), error=str(e)[:200], batch_size=len(batch))
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+
+class ReplanAlternative(BaseModel):
+    approach: str = Field(description="One concrete alternative approach, max 2 sentences")
+    first_action: str = Field(description="The very next browser action to take for this approach")
+    confidence: float = Field(ge=0.0, le=1.0)
+
+
+class ReplanOutput(BaseModel):
+    diagnosis: str = Field(description="What is most likely blocking progress, max 2 sentences")
+    alternatives: list[ReplanAlternative] = Field(default_factory=list, description="Up to 3 alternatives")
+    chosen: int = Field(default=0, description="Index of the alternative to try first")
+
+    def chosen_alternative(self) -> ReplanAlternative | None:
+        if not self.alternatives:
+            return None
+        return self.alternatives[self.chosen if 0 <= self.chosen < len(self.alternatives) else 0]
+
+    def render_for_history(self) -> str:
+        lines = [f"Diagnosis: {self.diagnosis.strip()}"]
+        best = self.chosen_alternative()
+        if best is not None:
+            lines.append(f"Try next: {best.approach.strip()}")
+            lines.append(f"First action: {best.first_action.strip()}")
+        fallbacks = [a for a in self.alternatives if a is not best]
+        if fallbacks:
+            lines.append("If that fails: " + " | ".join(a.approach.strip() for a in fallbacks))
+        return "\n".join(lines)
+
+
+def downscale_screenshot(b64_png: str, max_width: int = 768, quality: int = 60) -> tuple[str, str]:
+    """
+    Downscale a base64 screenshot to a small JPEG to keep replan image tokens low.
+    Returns (base64, media_type). Falls back to the original PNG if Pillow is unavailable.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return b64_png, "image/png"
+    try:
+        img = Image.open(io.BytesIO(base64.b64decode(b64_png)))
+        if img.width > max_width:
+            img = img.resize((max_width, int(img.height * max_width / img.width)))
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, format="JPEG", quality=quality)
+        return base64.b64encode(buf.getvalue()).decode("ascii"), "image/jpeg"
+    except Exception:
+        return b64_png, "image/png"
+
+
+def dom_summary(state_summary: Any, max_chars: int = 2500) -> str:
+    """Compact text view of the page: url, title and the head of the interactive element list."""
+    if state_summary is None:
+        return ""
+    parts = [f"url={getattr(state_summary, 'url', '')}", f"title={getattr(state_summary, 'title', '')}"]
+    try:
+        elements = state_summary.dom_state.llm_representation()
+    except Exception:
+        elements = ""
+    if elements:
+        parts.append(elements[:max_chars])
+    return "\n".join(parts)
+
+
+class ReplanCache:
+    """
+    Replan results keyed by (domain, goal, failure class), so a recurring failure
+    reuses the earlier analysis instead of paying for another vision call.
+    Small LRU persisted to logs/replan_cache.json; put()/invalidate() only touch memory,
+    flush() writes pending changes off the event loop. Advice whose next step failed
+    again is invalidated by the retry controller so it isn't replayed for the whole TTL.
+    """
+
+    def __init__(self, path: str | None = None, max_entries: int = 200, ttl_s: float = 7 * 24 * 3600):
+        self.path = path or os.path.abspath("logs/replan_cache.json")
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._items: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._dirty = False
+        self._load()
+
+    @staticmethod
+    def key(domain: str, goal: str, failure_class: str) -> str:
+        return f"{domain}|{failure_class}|{goal.strip().lower()[:200]}"
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            for k, v in raw.items():
+                self._items[k] = v
+        except (OSError, ValueError, AttributeError):
+            self._items = OrderedDict()
+
+    def _save(self, payload: dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    async def flush(self) -> None:
+        """Persist pending puts/invalidations (no-op when nothing changed)."""
+        if not self._dirty:
+            return
+        self._dirty = False
+        payload = dict(self._items)
+        try:
+            await asyncio.to_thread(self._save, payload)
+        except OSError:
+            self._dirty = True
+
+    def get(self, key: str) -> ReplanOutput | None:
+        entry = self._items.get(key)
+        if entry is None:
+            return None
+        if time.time() - float(entry.get("ts", 0)) > self.ttl_s:
+            self._items.pop(key, None)
+            return None
+        self._items.move_to_end(key)
+        try:
+            return ReplanOutput.model_validate(entry["output"])
+        except Exception:
+            return None
+
+    def put(self, key: str, output: ReplanOutput) -> None:
+        self._items[key] = {"ts": time.time(), "output": output.model_dump()}
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+        self._dirty = True
+
+    def invalidate(self, key: str) -> bool:
+        """Drop advice that didn't work; returns whether there was an entry."""
+        if self._items.pop(key, None) is None:
+            return False
+        self._dirty = True
+        return True
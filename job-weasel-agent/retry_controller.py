@@ -1,5 +1,7 @@
 import os
 import asyncio
+import base64
+import random
 import time
 from typing import Dict, Optional, Any
 from dataclasses import dataclass, field
@@ -8,12 +10,34 @@ from browser_use.llm.google.chat import ChatGoogle
 from browser_use.agent.service import Agent
 from browser_use.browser.events import NavigateToUrlEvent
 from rich.console import Console
-from rich.prompt import Prompt
 from rich.panel import Panel
 from perf_context import current_step, current_task_id
+from bot_wall import SIGNALS_JS, BotWall, SiteBlockStats, classify_bot_wall, domain_of
+from cdp_eval import evaluate_js
+from loop_detector import LoopDetector, LoopEvent, fingerprint_from_agent
+from failure_classifier import THRESHOLDS, StepFailure, classify_step
+from replan import ReplanCache, ReplanOutput, dom_summary, downscale_screenshot
+from site_ranking import SiteStrategyStore
+from llm_middleware import llm_site
+from llm_scheduler import Priority, llm_priority
+from intervention import get_channel
 
 console = Console()
 
+# Stop a stuck page load; report whether the user has edited any form field on the page.
+_STOP_LOAD_JS = r"""
+(() => {
+  const dirty = Array.from(document.querySelectorAll('input, textarea, select')).some((el) => {
+    if (el.disabled || el.type === 'hidden') return false;
+    if (el.type === 'checkbox' || el.type === 'radio') return el.checked !== el.defaultChecked;
+    if (el.tagName === 'SELECT') return Array.from(el.options).some(o => o.selected !== o.defaultSelected);
+    return el.type !== 'file' ? el.value !== el.defaultValue : el.files && el.files.length > 0;
+  });
+  if (document.readyState !== 'complete') window.stop();
+  return { dirty, url: location.href };
+})()
+"""
+
 @dataclass
 class FailureTracker:
     """Track failures for escalating retry strategies"""
@@ -22,16 +46,30 @@ class FailureTracker:
     current_goal: str = ""
     last_successful_goal: str = ""
     consecutive_same_goal_failures: int = 0
+    # Consecutive failures per failure class on the current goal (drives per-class escalation)
+    failures_by_class: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    last_failure_class: str = ""
+
+    def reset_goal_failures(self, failure_class: str | None = None) -> None:
+        """Give the goal a fresh start after an escalation: one class, or every class when None."""
+        self.consecutive_same_goal_failures = 0
+        if failure_class is None:
+            self.failures_by_class.clear()
+        else:
+            self.failures_by_class.pop(failure_class, None)
     
 class RetryController:
     """
     Intelligent retry controller with escalating strategies:
-    - 5 failures on same step → Screenshot + replan
-    - 10 failures on same step → Switch website
+    - CAPTCHA / bot wall detected → Switch website immediately (or ask user if no alternative)
+    - Loop detected (repeat / A→B→A→B / scroll thrash) → hint, then replan, then switch website
+    - Every classified failure → cheap deterministic recovery (re-snapshot, wait, reload, backoff)
+    - Per-class thresholds (see failure_classifier.THRESHOLDS) → Screenshot + replan / Switch website
     - 15 total failures → Ask user for help
     """
     
-    # Task-type specific website alternatives
+    # Task-type specific website alternatives (fallback when site_alternatives.json is missing;
+    # order comes from SiteStrategyStore.rank, not from this list)
     WEBSITE_ALTERNATIVES = {
         "flight_search": [
             "https://www.google.com/travel/flights",
@@ -51,7 +89,15 @@ class RetryController:
         ],
     }
     
-    def __init__(self, llm: ChatGoogle, browser_session, task_type: str = "general"):
+    def __init__(
+        self,
+        llm: ChatGoogle,
+        browser_session,
+        task_type: str = "general",
+        block_stats: SiteBlockStats | None = None,
+        replan_cache: ReplanCache | None = None,
+        site_store: SiteStrategyStore | None = None,
+    ):
         self.llm = llm
         self.browser_session = browser_session
         self.task_type = task_type
@@ -59,7 +105,54 @@ class RetryController:
         self.current_website_index = 0
         self.replanning_active = False
         self._step_start_t: dict[int, float] = {}
+        self.block_stats = block_stats if block_stats is not None else SiteBlockStats()
+        self._visited_domains: set[str] = set()
+        self._blocked_domains: set[str] = set()
+        self._current_domain: str = ""
+        self.loop_detector = LoopDetector()
+        self._last_signals: dict[str, Any] = {}
+        self.replan_cache = replan_cache if replan_cache is not None else ReplanCache()
+        # Cache key of the replan whose advice the next classified step tests
+        self._replan_key: str | None = None
+        self._agent: Agent | None = None
+        self.site_store = (
+            site_store
+            if site_store is not None
+            else SiteStrategyStore(block_stats=self.block_stats, defaults=self.WEBSITE_ALTERNATIVES)
+        )
         
+    def snapshot(self) -> dict[str, Any]:
+        """JSON-safe retry state for checkpoints."""
+        t = self.tracker
+        return {
+            "failures_by_goal": dict(t.failures_by_goal),
+            "total_failures": t.total_failures,
+            "current_goal": t.current_goal,
+            "last_successful_goal": t.last_successful_goal,
+            "consecutive_same_goal_failures": t.consecutive_same_goal_failures,
+            "failures_by_class": dict(t.failures_by_class),
+            "last_failure_class": t.last_failure_class,
+            "current_website_index": self.current_website_index,
+            "visited_domains": sorted(self._visited_domains),
+            "blocked_domains": sorted(self._blocked_domains),
+        }
+
+    def restore(self, state: dict[str, Any]) -> None:
+        """Inverse of snapshot() (used when resuming a checkpointed task)."""
+        if not state:
+            return
+        t = self.tracker
+        t.failures_by_goal.update(state.get("failures_by_goal") or {})
+        t.failures_by_class.update(state.get("failures_by_class") or {})
+        t.total_failures = int(state.get("total_failures", 0))
+        t.current_goal = str(state.get("current_goal", ""))
+        t.last_successful_goal = str(state.get("last_successful_goal", ""))
+        t.consecutive_same_goal_failures = int(state.get("consecutive_same_goal_failures", 0))
+        t.last_failure_class = str(state.get("last_failure_class", ""))
+        self.current_website_index = int(state.get("current_website_index", 0))
+        self._visited_domains.update(state.get("visited_domains") or [])
+        self._blocked_domains.update(state.get("blocked_domains") or [])
+
     def _normalize_goal(self, goal: str) -> str:
         """Normalize goal string for comparison"""
         # Remove common variations and focus on core action
@@ -74,6 +167,7 @@ class RetryController:
         Called before each agent step (Browser-Use hook signature).
         Monitor for repeated failures and trigger escalation.
         """
+        self._agent = agent
         step_num = getattr(agent.state, "n_steps", 0)
         current_step.set(step_num)
         self._step_start_t[step_num] = time.perf_counter()
@@ -87,6 +181,7 @@ class RetryController:
                 self.tracker.last_successful_goal = self.tracker.current_goal
                 self.tracker.current_goal = current_goal
                 self.tracker.consecutive_same_goal_failures = 0
+                self.tracker.failures_by_class.clear()
             
     async def on_step_end(self, agent: Agent):
         """
@@ -117,102 +212,399 @@ class RetryController:
             except Exception:
                 pass
 
-        # Determine if step failed via executed action results or eval text
-        failed = self._check_if_failed(agent)
+        # Bot walls are checked first: retrying a CAPTCHA page only burns steps.
+        wall = await self._check_bot_wall()
+        if wall is not None:
+            await self._handle_bot_wall(wall)
+            return
+
+        # "Successful" steps can still be going in circles
+        fp = fingerprint_from_agent(agent)
+        loop = self.loop_detector.observe(fp) if fp is not None else None
+        if loop is not None:
+            await self._intervene_loop(agent, loop)
+            return
+
+        # Classify the step outcome (None = success)
+        failure = self._classify_failure(agent)
+        await self._judge_replan(failure)
         
-        if failed:
+        if failure is not None:
             self.tracker.total_failures += 1
             self.tracker.consecutive_same_goal_failures += 1
             self.tracker.failures_by_goal[self.tracker.current_goal] += 1
+            self.tracker.failures_by_class[failure.cls] += 1
+            self.tracker.last_failure_class = failure.cls
             
-            console.print(f"[dim]⚠️  Failure #{self.tracker.consecutive_same_goal_failures} on: {self.tracker.current_goal}[/dim]")
+            console.print(
+                f"[dim]⚠️  Failure #{self.tracker.consecutive_same_goal_failures} ({failure.cls}) on: "
+                f"{self.tracker.current_goal}[/dim]"
+            )
+            try:
+                from perf_logger import emit
+                emit(
+                    "step.failure",
+                    task_id=current_task_id.get(),
+                    step=step_num,
+                    failure_class=failure.cls,
+                    class_count=self.tracker.failures_by_class[failure.cls],
+                    evidence=failure.evidence,
+                )
+            except Exception:
+                pass
             
             # Check escalation thresholds
             if self.should_ask_user():
                 await self._ask_user_intervention()
                 return
             
-            if self.should_switch_website():
+            if self.should_switch_website(failure.cls):
                 await self._switch_website()
                 return
                 
-            if self.should_replan():
-                await self._replan_with_screenshot()
+            if self.should_replan(failure.cls):
+                await self._replan_with_screenshot(agent)
                 return
+
+            # Below the LLM thresholds: try the cheap fix for this class first
+            await self._recover(agent, failure)
     
-    def _check_if_failed(self, agent: Agent) -> bool:
+    async def _check_bot_wall(self) -> BotWall | None:
+        """Inspect the current page for CAPTCHA / challenge signatures (one CDP evaluate)."""
+        try:
+            signals = await evaluate_js(self.browser_session, SIGNALS_JS)
+        except Exception:
+            return None
+        if not signals:
+            return None
+
+        self._last_signals = signals
+        domain = domain_of(str(signals.get("url") or ""))
+        wall = classify_bot_wall(signals)
+        self._current_domain = domain
+        if domain and domain not in self._visited_domains:
+            # One visit per domain per task; a wall on arrival counts as a block for that visit.
+            self._visited_domains.add(domain)
+            self.block_stats.record(domain, blocked=wall is not None)
+        elif wall is not None and domain not in self._blocked_domains:
+            self.block_stats.record(domain, blocked=True)
+        await self.block_stats.flush()
+        return wall
+
+    async def _handle_bot_wall(self, wall: BotWall) -> None:
+        domain = domain_of(wall.url)
+        self._blocked_domains.add(domain)
+        console.print(f"\n[bold yellow]🛡️  Bot wall detected on {domain or wall.url} ({wall.kind}: {wall.detail})[/bold yellow]")
+        try:
+            from perf_logger import emit
+            emit(
+                "botwall.detected",
+                task_id=current_task_id.get(),
+                step=current_step.get(),
+                domain=domain,
+                kind=wall.kind,
+                detail=wall.detail,
+                block_rate=self.block_stats.block_rate(domain),
+            )
+        except Exception:
+            pass
+
+        if self._alternatives():
+            await self._switch_website()
+        else:
+            await self._ask_user_intervention(
+                reason=f"The site is showing a {wall.kind.replace('_', ' ')} check ({wall.detail}). "
+                "Please solve it in the browser window, then choose an option."
+            )
+
+    _LOOP_HINTS = {
+        "repeat": "You have repeated the same action on the same page {n} times with no change. "
+        "That action is not working: choose a different element, approach, or page.",
+        "oscillation": "You are navigating back and forth between the same pages ({detail}). "
+        "Stop cycling: decide what information is missing and go directly for it.",
+        "scroll_thrash": "You are scrolling up and down on the same page. Use search/find on the page "
+        "or extract the content instead of scrolling again.",
+    }
+
+    def _inject_hint(self, agent: Agent, text: str, tag: str = "weaszel_hint") -> None:
+        """Add a one-off system note to Browser-Use history so the next step sees it."""
+        try:
+            from browser_use.agent.message_manager.views import HistoryItem
+            agent.message_manager.state.agent_history_items.append(
+                HistoryItem(system_message=f"<{tag}>\n{text}\n</{tag}>")
+            )
+        except Exception:
+            pass
+
+    async def _intervene_loop(self, agent: Agent, loop: LoopEvent) -> None:
+        """Escalate per loop seen in this task: hint → forced replan → switch website."""
+        n = self.loop_detector.loops_detected
+        has_alternatives = bool(self._alternatives())
+        if n <= 1:
+            intervention = "hint"
+        elif n == 2 or not has_alternatives:
+            intervention = "replan"
+        else:
+            intervention = "switch_site"
+
+        console.print(f"[dim]🔁 Loop detected ({loop.kind}, period={loop.period}) → {intervention}[/dim]")
+        try:
+            from perf_logger import emit
+            emit(
+                "loop.detected",
+                task_id=current_task_id.get(),
+                step=current_step.get(),
+                kind=loop.kind,
+                period=loop.period,
+                repeats=loop.repeats,
+                detail=loop.detail,
+                intervention=intervention,
+                loops_in_task=n,
+            )
+        except Exception:
+            pass
+
+        if intervention == "hint":
+            self._inject_hint(
+                agent,
+                self._LOOP_HINTS[loop.kind].format(n=loop.repeats, detail=loop.detail),
+                tag="weaszel_loop_warning",
+            )
+        elif intervention == "replan":
+            self.replanning_active = False
+            await self._replan_with_screenshot(agent)
+        else:
+            await self._switch_website()
+
+    def _classify_failure(self, agent: Agent) -> StepFailure | None:
         """
-        Determine if a step failed.
+        Classify the step outcome into the failure taxonomy.
 
-        Primary signal: any ActionResult.error produced by tool execution.
-        Secondary signal: evaluation text containing failure keywords.
+        Signals: ActionResult.error texts, page state from the per-step signals
+        evaluate (invalid fields, load state), and the model's evaluation text.
         """
         last_result = getattr(agent.state, "last_result", None) or []
-        for r in last_result:
-            if getattr(r, "error", None):
-                return True
+        errors = [str(r.error) for r in last_result if getattr(r, "error", None)]
 
         last_output = getattr(agent.state, "last_model_output", None)
         eval_text = getattr(last_output, "evaluation_previous_goal", "") if last_output is not None else ""
-        failure_keywords = ["failure", "failed", "error", "unsuccessful", "unable to"]
-        
-        return any(keyword in eval_text.lower() for keyword in failure_keywords)
-    
-    def should_replan(self) -> bool:
-        """Trigger replanning after 5 consecutive failures on same goal"""
-        return self.tracker.consecutive_same_goal_failures >= 5 and not self.replanning_active
+        if last_output is None and getattr(agent.state, "consecutive_failures", 0):
+            # Browser-Use records LLM/parse failures as a missing model output + error result
+            errors = errors or ["invalid model output"]
+
+        return classify_step(errors=errors, eval_text=eval_text or "", page=self._last_signals)
+
+    def _check_if_failed(self, agent: Agent) -> bool:
+        """Determine if a step failed (any failure class)."""
+        return self._classify_failure(agent) is not None
+
+    async def _recover(self, agent: Agent, failure: StepFailure) -> None:
+        """
+        Deterministic, LLM-free recovery for a classified failure.
+        Browser-Use re-captures DOM state at the start of every step, so "re-snapshot"
+        means letting the page settle before that capture.
+        """
+        action = "none"
+        try:
+            if failure.cls in ("element_not_found", "stale_dom"):
+                action = "wait_settle"
+                await self._wait_for_ready(timeout_s=2.0)
+                self._inject_hint(
+                    agent,
+                    "The previous element reference was not usable. Element indices may have changed: "
+                    "re-read the current page state before choosing an element; scroll if it is off-screen.",
+                )
+            elif failure.cls == "navigation_timeout":
+                action = await self._recover_navigation()
+            elif failure.cls == "rate_limit":
+                n = self.tracker.failures_by_class[failure.cls]
+                delay = min(30.0, 2.0 ** n) + random.uniform(0, 1.0)
+                action = f"backoff_{delay:.1f}s"
+                await asyncio.sleep(delay)
+            elif failure.cls == "validation_error":
+                action = "hint"
+                self._inject_hint(
+                    agent,
+                    f"The form reports validation errors ({failure.evidence}). Fix the flagged fields "
+                    "before submitting again.",
+                )
+        except Exception:
+            pass
+        try:
+            from perf_logger import emit
+            emit(
+                "step.recovery",
+                task_id=current_task_id.get(),
+                step=current_step.get(),
+                failure_class=failure.cls,
+                action=action,
+            )
+        except Exception:
+            pass
+
+    async def _recover_navigation(self) -> str:
+        """
+        Stop a stuck load and, if the page still doesn't settle, navigate to its URL again.
+        Never location.reload(): that can re-POST a submission. Pages with user-edited form
+        fields are left alone after the stop so a half-filled application isn't thrown away.
+        """
+        state = await evaluate_js(self.browser_session, _STOP_LOAD_JS) or {}
+        await self._wait_for_ready(timeout_s=5.0)
+        if state.get("dirty"):
+            return "stop_keep_form"
+        try:
+            ready = await evaluate_js(self.browser_session, "document.readyState")
+        except Exception:
+            ready = None
+        url = str(state.get("url") or "")
+        if ready == "complete" or not url.startswith("http"):
+            return "stop"
+        # A fresh GET of the committed URL (what the address bar shows), never a form re-submit
+        event = self.browser_session.event_bus.dispatch(NavigateToUrlEvent(url=url, new_tab=False))
+        await event
+        await event.event_result(raise_if_any=False, raise_if_none=False)
+        await self._wait_for_ready(timeout_s=5.0)
+        return "renavigate"
+
+    async def _wait_for_ready(self, timeout_s: float) -> None:
+        deadline = time.perf_counter() + timeout_s
+        while time.perf_counter() < deadline:
+            try:
+                if await evaluate_js(self.browser_session, "document.readyState") == "complete":
+                    return
+            except Exception:
+                return
+            await asyncio.sleep(0.2)
+
+    def _thresholds(self, failure_class: str | None):
+        return THRESHOLDS.get(failure_class or self.tracker.last_failure_class or "unknown", THRESHOLDS["unknown"])
+
+    def should_replan(self, failure_class: str | None = None) -> bool:
+        """Trigger replanning once this failure class hits its per-class threshold on the same goal"""
+        cls = failure_class or self.tracker.last_failure_class or "unknown"
+        return self.tracker.failures_by_class[cls] >= self._thresholds(cls).replan and not self.replanning_active
     
-    def should_switch_website(self) -> bool:
-        """Switch website after 10 consecutive failures on same goal"""
-        return self.tracker.consecutive_same_goal_failures >= 10
+    def should_switch_website(self, failure_class: str | None = None) -> bool:
+        """Switch website once this failure class hits its per-class threshold on the same goal"""
+        cls = failure_class or self.tracker.last_failure_class or "unknown"
+        return self.tracker.failures_by_class[cls] >= self._thresholds(cls).switch_site
     
     def should_ask_user(self) -> bool:
         """Ask user for help after 15 total failures"""
         return self.tracker.total_failures >= 15
     
-    async def _replan_with_screenshot(self):
+    async def _judge_replan(self, failure: StepFailure | None) -> None:
+        """The step after a replan failed again: that advice doesn't work here, stop replaying it."""
+        key, self._replan_key = self._replan_key, None
+        if key is None or failure is None:
+            return
+        if self.replan_cache.invalidate(key):
+            try:
+                from perf_logger import emit
+                emit(
+                    "replan.invalidated",
+                    task_id=current_task_id.get(),
+                    step=current_step.get(),
+                    failure_class=failure.cls,
+                    domain=self._current_domain,
+                )
+            except Exception:
+                pass
+            await self.replan_cache.flush()
+
+    async def _replan_with_screenshot(self, agent: Agent | None = None):
         """
-        Take screenshot, analyze with vision, and suggest alternative approaches.
+        Analyze a downscaled screenshot + compact DOM summary, get structured alternatives,
+        and inject the chosen one into Browser-Use history so the next step acts on it.
+        Results are cached per (domain, goal, failure class).
         """
         console.print("\n[bold yellow]🤔 Hmm mode activated - Let me think about this differently...[/bold yellow]\n")
         
+        failure_class = self.tracker.last_failure_class or "loop"
+        cache_key = ReplanCache.key(self._current_domain, self.tracker.current_goal, failure_class)
         try:
-            # Take screenshot
-            screenshot_path = await self.browser_session.save_screenshot()
-            
-            # Analyze with vision
-            replan_prompt = f'''I'm trying to: {self.tracker.current_goal}
+            plan = self.replan_cache.get(cache_key)
+            cached = plan is not None
+            if plan is None:
+                plan = await self._request_replan(failure_class)
+                self.replan_cache.put(cache_key, plan)
+                await self.replan_cache.flush()
+            self._replan_key = cache_key
 
-I've failed 5 times in a row. Looking at this screenshot, what am I missing?
-
-Analyze:
-1. Are there dropdowns, modals, or UI elements I need to interact with first?
-2. Do I need to wait for something to load?
-3. Are there pre-conditions I haven't met (login, selections, etc.)?
-4. Am I clicking the wrong element?
-
-Provide 3 specific alternative approaches I should try next.'''
-            
-            # Get alternative suggestions using ainvoke
-            from browser_use.llm.messages import UserMessage
-            response = await self.llm.ainvoke([UserMessage(content=replan_prompt)])
-            suggestions = response.completion
-            
+            suggestions = plan.render_for_history()
             console.print(Panel(
                 f"[bold cyan]Alternative Approaches:[/bold cyan]\n\n{suggestions}",
-                title="🧠 Replanning",
+                title="🧠 Replanning" + (" (cached)" if cached else ""),
                 border_style="cyan"
             ))
+            if agent is not None:
+                self._inject_hint(agent, suggestions, tag="weaszel_replan")
+            try:
+                from perf_logger import emit
+                emit(
+                    "replan",
+                    task_id=current_task_id.get(),
+                    step=current_step.get(),
+                    failure_class=failure_class,
+                    domain=self._current_domain,
+                    cached=cached,
+                    alternatives=len(plan.alternatives),
+                )
+            except Exception:
+                pass
             
             # Mark that we've replanned to avoid loop
             self.replanning_active = True
             
-            # Reset consecutive failures to give it another chance
-            self.tracker.consecutive_same_goal_failures = 0
+            # Reset this class's failures to give it another chance (escalation reads failures_by_class)
+            self.tracker.reset_goal_failures(failure_class)
             
         except Exception as e:
             console.print(f"[yellow]⚠️  Replanning failed: {e}[/yellow]")
+
+    async def _request_replan(self, failure_class: str) -> ReplanOutput:
+        from browser_use.llm.messages import ContentPartImageParam, ContentPartTextParam, ImageURL, UserMessage
+
+        state = getattr(self.browser_session, "_cached_browser_state_summary", None)
+        screenshot_b64 = getattr(state, "screenshot", None) if state is not None else None
+        if not screenshot_b64:
+            raw = await self.browser_session.take_screenshot()
+            screenshot_b64 = base64.b64encode(raw).decode("ascii") if isinstance(raw, bytes) else raw
+
+        replan_prompt = f'''I'm trying to: {self.tracker.current_goal}
+
+I keep failing (failure type: {failure_class}, {self.tracker.failures_by_class.get(failure_class, 0)} times on this goal).
+Look at the screenshot and the page summary below. What am I missing?
+
+Consider:
+1. Dropdowns, modals, or UI elements I need to interact with first?
+2. Something still loading?
+3. Unmet pre-conditions (login, selections, etc.)?
+4. Am I targeting the wrong element?
+
+<page_summary>
+{dom_summary(state)}
+</page_summary>
+
+Return a short diagnosis and up to 3 concrete alternatives (approach + very next action); set "chosen" to the best one.'''
+
+        parts: list = [ContentPartTextParam(text=replan_prompt)]
+        if screenshot_b64:
+            image_b64, media_type = downscale_screenshot(screenshot_b64)
+            parts.append(
+                ContentPartImageParam(
+                    image_url=ImageURL(url=f"data:{media_type};base64,{image_b64}", media_type=media_type, detail="low")
+                )
+            )
+        with llm_priority(Priority.PLANNER), llm_site("replan"):
+            response = await self.llm.ainvoke([UserMessage(content=parts)], output_format=ReplanOutput)
+        plan = response.completion
+        plan.alternatives = plan.alternatives[:3]
+        return plan
     
+    def _alternatives(self) -> list[str]:
+        return self.site_store.alternatives(self.task_type) or self.WEBSITE_ALTERNATIVES.get(self.task_type, [])
+
     async def _switch_website(self):
         """
         Switch to alternative website for the same task.
@@ -220,15 +612,31 @@ Provide 3 specific alternative approaches I should try next.'''
         console.print("\n[bold yellow]🔄 Current approach not working. Switching to alternative website...[/bold yellow]\n")
         
         # Get alternative websites for this task type
-        alternatives = self.WEBSITE_ALTERNATIVES.get(self.task_type, [])
+        alternatives = self._alternatives()
         
         if not alternatives:
             console.print("[yellow]No alternative websites available for this task type.[/yellow]")
             return
         
-        # Move to next website
-        self.current_website_index = (self.current_website_index + 1) % len(alternatives)
-        next_website = alternatives[self.current_website_index]
+        # Historically fastest reliable site first (success rate, wall time, block rate);
+        # never bounce back to a site that walled us in this task.
+        ranked = self.site_store.rank(self.task_type, alternatives)
+        candidates = [
+            u for u in ranked
+            if domain_of(u) not in self._blocked_domains
+            and domain_of(u) != self._current_domain
+            and domain_of(u) not in self._visited_domains
+        ]
+        if candidates:
+            next_website = candidates[0]
+        else:
+            # Everything has been tried once: walk the ranked list round-robin.
+            pool = [
+                u for u in ranked
+                if domain_of(u) not in self._blocked_domains and domain_of(u) != self._current_domain
+            ] or ranked
+            self.current_website_index = (self.current_website_index + 1) % len(pool)
+            next_website = pool[self.current_website_index]
         
         console.print(f"[cyan]→ Switching to: {next_website}[/cyan]\n")
         
@@ -239,21 +647,28 @@ Provide 3 specific alternative approaches I should try next.'''
             await event.event_result(raise_if_any=True, raise_if_none=False)
             
             # Reset failure counters for new site
-            self.tracker.consecutive_same_goal_failures = 0
+            self.tracker.reset_goal_failures()
             self.replanning_active = False
             
         except Exception as e:
             console.print(f"[yellow]⚠️  Website switch failed: {e}[/yellow]")
     
-    async def _ask_user_intervention(self):
+    async def _ask_user_intervention(self, reason: str | None = None):
         """
-        Pause execution and ask user for guidance after too many failures.
+        Pause execution and ask user for guidance after too many failures
+        (or immediately when a bot wall has no alternative site).
         """
+        headline = (
+            "[bold red]⏸️  I'm blocked by a bot check.[/bold red]"
+            if reason
+            else f"[bold red]⏸️  I'm stuck after {self.tracker.total_failures} failed attempts.[/bold red]"
+        )
+        detail = reason or "I've tried multiple approaches but keep running into issues."
         console.print("\n")
         console.print(Panel(
-            f"[bold red]⏸️  I'm stuck after {self.tracker.total_failures} failed attempts.[/bold red]\n\n"
+            f"{headline}\n\n"
             f"[yellow]Current goal:[/yellow] {self.tracker.current_goal}\n\n"
-            f"[dim]I've tried multiple approaches but keep running into issues.[/dim]",
+            f"[dim]{detail}[/dim]",
             title="Need Your Help",
             border_style="red"
         ))
@@ -263,22 +678,34 @@ Provide 3 specific alternative approaches I should try next.'''
         console.print("  [cyan]2.[/cyan] Try a different approach (you describe)")
         console.print("  [cyan]3.[/cyan] Stop and show what I found so far")
         
-        choice = Prompt.ask("\n▸ Choice", choices=["1", "2", "3"])
+        # Only this task waits; the event loop (keep-alives, background work, other tasks) keeps running.
+        # Unattended runs / WEASZEL_INTERVENTION_TIMEOUT fall back to WEASZEL_INTERVENTION_DEFAULT (stop).
+        default = os.environ.get("WEASZEL_INTERVENTION_DEFAULT", "3")
+        choice = await get_channel().ask("▸ Choice", choices=["1", "2", "3"], default=default if default in ("1", "3") else "3")
         
         if choice == "1":
             console.print("\n[green]✓ Continuing with 5 more attempts...[/green]\n")
             # Reset counters to give it another chance
             self.tracker.total_failures = 0
-            self.tracker.consecutive_same_goal_failures = 0
+            self.tracker.reset_goal_failures()
             
         elif choice == "2":
-            new_approach = Prompt.ask("\n[cyan]What should I try instead?[/cyan]")
+            new_approach = await get_channel().ask("What should I try instead?", default="")
+            if not new_approach.strip():
+                console.print("\n[green]✓ No suggestion given, continuing...[/green]\n")
+                self.tracker.reset_goal_failures()
+                return
             console.print(f"\n[green]✓ Trying new approach: {new_approach}[/green]\n")
             # Update the goal with user's suggestion
             self.tracker.current_goal = new_approach
-            self.tracker.consecutive_same_goal_failures = 0
+            self.tracker.reset_goal_failures()
+            if self._agent is not None:
+                self._inject_hint(self._agent, f"The user suggests a different approach: {new_approach}", tag="weaszel_user")
             
         elif choice == "3":
             console.print("\n[yellow]⏹️  Stopping execution...[/yellow]\n")
-            # Trigger agent to stop (would need to integrate with agent's stop mechanism)
-            raise KeyboardInterrupt("User requested stop")
+            # Let Browser-Use finish the current step and return what it has (checkpoint stays resumable)
+            if self._agent is not None:
+                self._agent.stop()
+            else:
+                raise KeyboardInterrupt("User requested stop")
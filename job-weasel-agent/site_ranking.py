@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from bot_wall import SiteBlockStats, domain_of
+
+
+def _config_path() -> str:
+    return os.environ.get(
+        "WEASZEL_SITES_CONFIG",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "site_alternatives.json"),
+    )
+
+
+@dataclass
+class SiteStats:
+    """Decayed outcome counters for one (task_type, domain)."""
+
+    attempts: float = 0.0
+    successes: float = 0.0
+    steps: list[int] = field(default_factory=list)
+    wall_s: list[float] = field(default_factory=list)
+    updated: float = 0.0
+
+    RECENT = 30
+
+    def _factor(self, now: float, half_life_s: float) -> float:
+        if not self.updated or half_life_s <= 0:
+            return 1.0
+        return 0.5 ** (max(0.0, now - self.updated) / half_life_s)
+
+    def decay(self, now: float, half_life_s: float) -> None:
+        factor = self._factor(now, half_life_s)
+        self.attempts *= factor
+        self.successes *= factor
+        self.updated = now
+
+    def decayed(self, now: float, half_life_s: float) -> tuple[float, float]:
+        """(attempts, successes) as of `now`, without touching the stored counters."""
+        factor = self._factor(now, half_life_s)
+        return self.attempts * factor, self.successes * factor
+
+    def median_steps(self) -> float | None:
+        return statistics.median(self.steps) if self.steps else None
+
+    def median_wall_s(self) -> float | None:
+        return statistics.median(self.wall_s) if self.wall_s else None
+
+
+class SiteStrategyStore:
+    """
+    Ranks WEBSITE_ALTERNATIVES per task_type from historical outcomes.
+
+    - Candidates come from site_alternatives.json (override: WEASZEL_SITES_CONFIG).
+    - Outcomes (success, steps, wall time) are recorded at task end into
+      logs/site_stats.json with time decay (half-life WEASZEL_SITE_HALF_LIFE_DAYS, default 14).
+    - Block rate comes from SiteBlockStats (bot walls).
+    - Ranking is bandit-style: Thompson-sample a success rate per site and order by
+      expected cost to success (wall time plus a per-step charge for the LLM calls).
+      Counters are decayed to the time of ranking, not only when a new outcome lands.
+      Sites with little data get wide posteriors, so they are still explored;
+      WEASZEL_SITE_EXPLORE (default 0.1) caps how often an under-sampled site may jump
+      to the front. With no evidence for any candidate, the configured order is kept.
+    """
+
+    MIN_TRIALS = 3
+    # Assumed cost for sites we have no timing / step counts for.
+    PRIOR_WALL_S = 90.0
+    PRIOR_STEPS = 15.0
+    # Decayed attempts below this count as no evidence (~3 half-lives after a single run).
+    MIN_EVIDENCE = 0.1
+
+    def __init__(
+        self,
+        stats_path: str | None = None,
+        block_stats: SiteBlockStats | None = None,
+        defaults: dict[str, list[str]] | None = None,
+    ):
+        self.stats_path = stats_path or os.path.abspath("logs/site_stats.json")
+        self.block_stats = block_stats if block_stats is not None else SiteBlockStats()
+        self.half_life_s = float(os.environ.get("WEASZEL_SITE_HALF_LIFE_DAYS", "14")) * 86400
+        self.explore_rate = float(os.environ.get("WEASZEL_SITE_EXPLORE", "0.1"))
+        # Seconds-equivalent charged per agent step (each step is an LLM call)
+        self.step_cost_s = float(os.environ.get("WEASZEL_SITE_STEP_COST_S", "4"))
+        self.config = self._load_config(defaults or {})
+        self.stats: dict[str, dict[str, SiteStats]] = self._load_stats()
+
+    @staticmethod
+    def _load_config(defaults: dict[str, list[str]]) -> dict[str, list[str]]:
+        try:
+            with open(_config_path(), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            return {str(k): [str(u) for u in v] for k, v in raw.items()}
+        except (OSError, ValueError, AttributeError):
+            return {k: list(v) for k, v in defaults.items()}
+
+    def _load_stats(self) -> dict[str, dict[str, SiteStats]]:
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            return {
+                tt: {d: SiteStats(**{k: v for k, v in s.items() if k in SiteStats.__dataclass_fields__}) for d, s in sites.items()}
+                for tt, sites in raw.items()
+            }
+        except (OSError, ValueError, AttributeError, TypeError):
+            return {}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+        payload = {
+            tt: {
+                d: {"attempts": s.attempts, "successes": s.successes, "steps": s.steps, "wall_s": s.wall_s, "updated": s.updated}
+                for d, s in sites.items()
+            }
+            for tt, sites in self.stats.items()
+        }
+        tmp = self.stats_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp, self.stats_path)
+
+    def alternatives(self, task_type: str) -> list[str]:
+        return list(self.config.get(task_type, []))
+
+    def record_outcome(
+        self,
+        task_type: str,
+        url_or_domain: str,
+        *,
+        success: bool,
+        steps: int | None = None,
+        wall_s: float | None = None,
+        save: bool = True,
+    ) -> None:
+        domain = domain_of(url_or_domain) if "://" in url_or_domain else url_or_domain
+        if not task_type or not domain:
+            return
+        s = self.stats.setdefault(task_type, {}).setdefault(domain, SiteStats())
+        s.decay(time.time(), self.half_life_s)
+        s.attempts += 1
+        if success:
+            s.successes += 1
+            # Cost figures only describe runs that actually finished the task.
+            if steps is not None:
+                s.steps = (s.steps + [int(steps)])[-SiteStats.RECENT :]
+            if wall_s is not None:
+                s.wall_s = (s.wall_s + [round(float(wall_s), 2)])[-SiteStats.RECENT :]
+        if save:
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def _counts(self, task_type: str, domain: str, now: float) -> tuple[float, float]:
+        s = self.stats.get(task_type, {}).get(domain)
+        return s.decayed(now, self.half_life_s) if s is not None else (0.0, 0.0)
+
+    def _at_prior(self, task_type: str, domain: str, now: float) -> bool:
+        attempts, _ = self._counts(task_type, domain, now)
+        return attempts < self.MIN_EVIDENCE and not self.block_stats.counts.get(domain)
+
+    def has_evidence(self, task_type: str, urls: list[str] | None = None) -> bool:
+        """Whether any candidate has (decayed) outcomes or bot-wall data behind it."""
+        now = time.time()
+        urls = urls if urls is not None else self.alternatives(task_type)
+        return not all(self._at_prior(task_type, domain_of(u), now) for u in urls)
+
+    def _expected_cost(self, task_type: str, url: str, rng: random.Random, now: float) -> float:
+        domain = domain_of(url)
+        s = self.stats.get(task_type, {}).get(domain) or SiteStats()
+        attempts, successes = self._counts(task_type, domain, now)
+        failures = max(0.0, attempts - successes)
+        p_success = rng.betavariate(successes + 1.0, failures + 1.0)
+        p_success *= 1.0 - self.block_stats.block_rate(domain)
+        wall = s.median_wall_s() or self.PRIOR_WALL_S
+        steps = s.median_steps() or self.PRIOR_STEPS
+        return (wall + steps * self.step_cost_s) / max(p_success, 1e-3)
+
+    def rank(self, task_type: str, urls: list[str] | None = None, seed: int | None = None) -> list[str]:
+        """Order candidate URLs best-first for this task type."""
+        urls = list(urls if urls is not None else self.alternatives(task_type))
+        if len(urls) < 2:
+            return urls
+        # Nothing known about any candidate: a random draw would only reshuffle the curated order
+        if not self.has_evidence(task_type, urls):
+            return urls
+        now = time.time()
+        rng = random.Random(seed)
+        ranked = sorted(urls, key=lambda u: self._expected_cost(task_type, u, rng, now))
+
+        # Under-sampled sites only take the front slot within the exploration budget.
+        head_attempts, _ = self._counts(task_type, domain_of(ranked[0]), now)
+        if head_attempts < self.MIN_TRIALS and rng.random() >= self.explore_rate:
+            proven = [u for u in ranked if self._counts(task_type, domain_of(u), now)[0] >= self.MIN_TRIALS]
+            if proven:
+                ranked.remove(proven[0])
+                ranked.insert(0, proven[0])
+        return ranked
+
+    def best(self, task_type: str) -> str | None:
+        ranked = self.rank(task_type)
+        return ranked[0] if ranked else None
+
+    def summary(self, task_type: str) -> list[dict[str, Any]]:
+        """Deterministic view for reports: success rate, medians, block rate."""
+        out = []
+        now = time.time()
+        for url in self.alternatives(task_type):
+            d = domain_of(url)
+            s = self.stats.get(task_type, {}).get(d) or SiteStats()
+            attempts, successes = self._counts(task_type, d, now)
+            out.append(
+                {
+                    "domain": d,
+                    "attempts": round(attempts, 2),
+                    "success_rate": round((successes + 1) / (attempts + 2), 3),
+                    "median_steps": s.median_steps(),
+                    "median_wall_s": s.median_wall_s(),
+                    "block_rate": round(self.block_stats.block_rate(d), 3),
+                }
+            )
+        return out
+
+    def ingest_perf_log(self, path: str | None = None) -> int:
+        """Replay `site.outcome` events from logs/perf.jsonl (e.g. after deleting site_stats.json)."""
+        path = path or os.path.abspath(os.environ.get("WEASZEL_PROFILE_PATH", "logs/perf.jsonl"))
+        n = 0
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        evt = json.loads(line)
+                    except ValueError:
+                        continue
+                    if evt.get("event") != "site.outcome":
+                        continue
+                    self.record_outcome(
+                        str(evt.get("task_type") or ""),
+                        str(evt.get("domain") or ""),
+                        success=bool(evt.get("success")),
+                        steps=evt.get("steps"),
+                        wall_s=evt.get("wall_s"),
+                        save=False,
+                    )
+                    n += 1
+        except OSError:
+            return 0
+        if n:
+            self._save()
+        return n
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from perf_logger import emit
+from steering_loader import load_steering_principles
+
+
+COMPILER_VERSION = 2
+
+TOPICS = ("safety", "efficiency", "reliability", "prompting")
+
+# Docs that describe agent behaviour (the others are setup/code-map material for humans).
+DEFAULT_DOCS = ("STEERING-PERFORMANCE.md", "STEERING-PROMPTING.md", "STEERING-RESISTANCE.md")
+
+# Even those docs are mostly design notes for developers; only these sections speak to the
+# agent itself (matched against the innermost heading).
+_AGENT_SECTION_RE = re.compile(r"reliability bottlenecks|safety prompting", re.I)
+
+_TOPIC_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "safety": ("confirm", "irreversible", "payment", "checkout", "password", "personal data", "leak", "safety"),
+    "efficiency": ("speed", "fast", "latency", "batch", "cache", "skip", "cheap", "lite", "overhead", "fuse"),
+    "reliability": ("retry", "fallback", "captcha", "bot", "blocked", "fail", "stuck", "error", "timeout", "verify"),
+    "prompting": ("prompt", "schema", "json", "structured", "concrete", "constrain", "question", "template"),
+}
+
+# Matched against the rule text plus its headings.
+_TASK_TYPE_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "shopping": ("shopping", "checkout", "payment", "purchase", "cart", "budget", "price"),
+    "job_search": ("job", "indeed", "linkedin", "top n"),
+    "job_application": ("application", "apply", "resume", "profile", "form submit"),
+    "form_filling": ("form", "password entry", "profile", "identity"),
+    "travel": ("flight", "hotel", "travel", "google flights"),
+}
+
+_FAILURE_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "blocked": ("captcha", "bot wall", "bot-wall", "login wall", "blocked", "switch website", "switch site"),
+    "navigation_timeout": ("timeout", "slow", "did not load", "headless"),
+    "element_not_found": ("selector", "scroll", "not visible", "not found", "what to click"),
+    "validation_error": ("validation", "invalid", "required field"),
+    "llm_parse": ("json", "schema", "structured output", "parse"),
+    "rate_limit": ("rate limit", "quota", "cache", "429", "cheaper"),
+}
+
+_CODE_BLOCK_RE = re.compile(r"```[\s\S]*?```")
+_BULLET_RE = re.compile(r"^(\s*)[-*]\s+(.*)$")
+_MARKUP_RE = re.compile(r"\*\*|`")
+# Code references (file names, identifiers) mark notes for developers, not for the agent
+_CODE_REF_RE = re.compile(r"\w\.py\b|\b[a-z]+_[a-z_]+\b|\.md\b")
+# Work items about building the agent ("Add a ... gate", "Only inject profile if ...")
+_DEV_NOTE_RE = re.compile(
+    r"^(add|implement|remove|make|ensure|expand|standardize|fuse|cache|pick|keep|only inject)\b"
+    r"|\b(inject|prompt|schema|telemetry|config|Browser-Use|Gemini|LLM)\b",
+    re.I,
+)
+# ...except when the note quotes the instruction to give the agent: keep the quote.
+_QUOTED_INSTRUCTION_RE = re.compile(r"instruction:\s*[“\"](.+?)[”\"]")
+
+
+def _repo_root() -> str:
+    return os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def _artifact_path() -> str:
+    return os.path.abspath(os.environ.get("WEASZEL_STEERING_COMPILED", "logs/steering_compiled.json"))
+
+
+def _max_rules() -> int:
+    try:
+        return max(1, int(os.environ.get("WEASZEL_STEERING_MAX_RULES", "8")))
+    except ValueError:
+        return 8
+
+
+def _tags(text: str, table: dict[str, tuple[str, ...]]) -> tuple[str, ...]:
+    # Word-start match so "form" doesn't tag "performance"
+    t = text.lower()
+    return tuple(name for name, words in table.items() if any(re.search(rf"\b{re.escape(w)}", t) for w in words))
+
+
+@dataclass(frozen=True)
+class SteeringRule:
+    id: str
+    text: str
+    topic: str
+    task_types: tuple[str, ...] = ()
+    failure_classes: tuple[str, ...] = ()
+    source: str = "builtin"
+    # Builtin principles apply to every task; doc rules only when their tags match.
+    always: bool = False
+
+    def score(self, task_type: str, failure_class: str) -> float:
+        # A tagged doc rule outranks a generic principle; failure-specific advice ranks highest.
+        s = 1.0 if self.always else 0.0
+        if failure_class and failure_class in self.failure_classes:
+            s += 2.5
+        if task_type and task_type in self.task_types:
+            s += 1.5
+        return s
+
+
+def _rule(text: str, topic: str, source: str, context: str = "", always: bool = False) -> SteeringRule:
+    tagged = f"{context} {text}"
+    rid = hashlib.sha1(f"{source}:{text}".encode("utf-8")).hexdigest()[:10]
+    return SteeringRule(
+        id=rid,
+        text=text,
+        topic=topic,
+        task_types=_tags(tagged, _TASK_TYPE_KEYWORDS),
+        failure_classes=_tags(tagged, _FAILURE_KEYWORDS),
+        source=source,
+        always=always,
+    )
+
+
+def _builtin_rules() -> list[SteeringRule]:
+    principles = load_steering_principles()
+    rules = []
+    for topic in TOPICS:
+        for line in getattr(principles, topic).splitlines():
+            text = line.strip().lstrip("- ").strip()
+            if text:
+                rules.append(_rule(text, topic, "builtin", always=True))
+    return rules
+
+
+def parse_doc(name: str, content: str) -> list[SteeringRule]:
+    """
+    Bullets in agent-facing sections become rules; headings (and a parent bullet for nested
+    ones) are kept as tagging context. Developer work items, code references, pointers to
+    other docs and very short fragments are dropped.
+    """
+    rules: list[SteeringRule] = []
+    headings: list[str] = []
+    parent = ""
+    for raw in _CODE_BLOCK_RE.sub("", content).splitlines():
+        line = raw.rstrip()
+        if line.startswith("#"):
+            level = len(line) - len(line.lstrip("#"))
+            headings = headings[: max(0, level - 2)] + [line.lstrip("#").strip()]
+            parent = ""
+            continue
+        m = _BULLET_RE.match(line)
+        if not m:
+            continue
+        if not headings or not _AGENT_SECTION_RE.search(headings[-1]):
+            continue
+        indent, body = m.groups()
+        text = _MARKUP_RE.sub("", body).strip()
+        if not indent:
+            parent = text
+        quoted = _QUOTED_INSTRUCTION_RE.search(text)
+        if quoted:
+            text = quoted.group(1).strip()
+        elif _DEV_NOTE_RE.search(text):
+            continue
+        if len(text) < 25 or _CODE_REF_RE.search(text):
+            continue
+        if indent and parent and len(text) < 60:
+            text = f"{parent.rstrip(':')}: {text}"
+        context = " ".join(headings)
+        topics = _tags(f"{context} {text}", _TOPIC_KEYWORDS)
+        rules.append(_rule(text, topics[0] if topics else "reliability", name, context=context))
+    return rules
+
+
+@dataclass
+class CompiledSteering:
+    version: int
+    sources: list[dict]
+    rules: list[SteeringRule]
+
+    def select(self, task_type: str = "", failure_class: str = "", max_rules: int | None = None) -> list[SteeringRule]:
+        """Builtin principles plus doc rules tagged for this task type / failure class."""
+        scored = [(r.score(task_type, failure_class), i, r) for i, r in enumerate(self.rules)]
+        scored = [p for p in scored if p[0] > 0]
+        scored.sort(key=lambda p: (-p[0], p[1]))
+        return [r for _, _, r in scored[: max_rules or _max_rules()]]
+
+    def render(self, task_type: str = "", failure_class: str = "", outer: str | None = "steering") -> str:
+        picked = self.select(task_type, failure_class)
+        parts = [f"<{outer}>"] if outer else []
+        for topic in TOPICS:
+            lines = [f"- {r.text}" for r in picked if r.topic == topic]
+            if lines:
+                parts.append(f"<{topic}>\n" + "\n".join(lines) + f"\n</{topic}>")
+        if outer:
+            parts.append(f"</{outer}>")
+        return "\n".join(parts)
+
+
+def _fingerprint(path: str, with_hash: bool) -> dict:
+    st = os.stat(path)
+    fp = {"path": os.path.basename(path), "mtime": st.st_mtime, "size": st.st_size}
+    if with_hash:
+        with open(path, "rb") as f:
+            fp["sha1"] = hashlib.sha1(f.read()).hexdigest()
+    return fp
+
+
+class SteeringCompiler:
+    """
+    Parses the steering docs once into an indexed artifact (logs/steering_compiled.json).
+
+    The artifact is reused while every source keeps its mtime/size; if those changed but the
+    content hash did not (checkout, touch), only the fingerprints are refreshed. Any content
+    or compiler-version change triggers a recompile.
+    """
+
+    def __init__(self, repo_root: str | None = None, docs: tuple[str, ...] | None = None, path: str | None = None):
+        self.repo_root = repo_root or _repo_root()
+        env_docs = os.environ.get("WEASZEL_STEERING_DOCS", "")
+        self.docs = docs or tuple(d.strip() for d in env_docs.split(",") if d.strip()) or DEFAULT_DOCS
+        self.path = path or _artifact_path()
+        self._compiled: CompiledSteering | None = None
+        self._stats: list[tuple[str, float, int]] | None = None
+        self._lock = threading.Lock()
+
+    def _source_paths(self) -> list[str]:
+        return [p for p in (os.path.join(self.repo_root, d) for d in self.docs) if os.path.exists(p)]
+
+    def _stat_key(self) -> list[tuple[str, float, int]]:
+        out = []
+        for p in self._source_paths():
+            st = os.stat(p)
+            out.append((os.path.basename(p), st.st_mtime, st.st_size))
+        return out
+
+    def get(self) -> CompiledSteering:
+        """Current artifact; a few os.stat calls when nothing changed."""
+        with self._lock:
+            stats = self._stat_key()
+            if self._compiled is not None and stats == self._stats:
+                return self._compiled
+            self._compiled = self._load_or_compile()
+            self._stats = stats
+            return self._compiled
+
+    def _load_or_compile(self) -> CompiledSteering:
+        paths = self._source_paths()
+        cached = self._load_artifact()
+        if cached is not None:
+            current = [_fingerprint(p, with_hash=False) for p in paths]
+            stale_meta = [
+                (c["path"], c["mtime"], c["size"]) for c in current
+            ] != [(s.get("path"), s.get("mtime"), s.get("size")) for s in cached.sources]
+            if not stale_meta:
+                return cached
+            hashed = [_fingerprint(p, with_hash=True) for p in paths]
+            if [h["sha1"] for h in hashed] == [s.get("sha1") for s in cached.sources]:
+                cached.sources = hashed
+                self._save(cached)
+                return cached
+        return self.compile(paths)
+
+    def compile(self, paths: list[str] | None = None) -> CompiledSteering:
+        t0 = time.perf_counter()
+        paths = self._source_paths() if paths is None else paths
+        rules = _builtin_rules()
+        seen = {r.text.lower() for r in rules}
+        for p in paths:
+            try:
+                with open(p, "r", encoding="utf-8") as f:
+                    content = f.read()
+            except OSError:
+                continue
+            for r in parse_doc(os.path.basename(p), content):
+                if r.text.lower() not in seen:
+                    seen.add(r.text.lower())
+                    rules.append(r)
+        compiled = CompiledSteering(
+            version=COMPILER_VERSION,
+            sources=[_fingerprint(p, with_hash=True) for p in paths],
+            rules=rules,
+        )
+        self._save(compiled)
+        emit(
+            "steering.compiled",
+            rules=len(rules),
+            sources=len(paths),
+            duration_ms=round((time.perf_counter() - t0) * 1000.0, 1),
+        )
+        return compiled
+
+    def _load_artifact(self) -> CompiledSteering | None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != COMPILER_VERSION:
+                return None
+            rules = [
+                SteeringRule(
+                    **{**r, "task_types": tuple(r.get("task_types", ())), "failure_classes": tuple(r.get("failure_classes", ()))}
+                )
+                for r in data.get("rules", [])
+            ]
+            return CompiledSteering(version=COMPILER_VERSION, sources=list(data.get("sources", [])), rules=rules)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _save(self, compiled: CompiledSteering) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": compiled.version, "sources": compiled.sources, "rules": [asdict(r) for r in compiled.rules]},
+                    f,
+                    ensure_ascii=False,
+                    indent=1,
+                )
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+_compilers: dict[str, SteeringCompiler] = {}
+_compilers_lock = threading.Lock()
+
+
+def get_compiled_steering(repo_root: str | None = None) -> CompiledSteering:
+    """Process-wide compiled steering (one compiler per repo root)."""
+    root = os.path.abspath(repo_root or _repo_root())
+    with _compilers_lock:
+        compiler = _compilers.get(root)
+        if compiler is None:
+            compiler = _compilers[root] = SteeringCompiler(repo_root=root)
+    return compiler.get()
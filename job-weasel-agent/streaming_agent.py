@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import re
+import time
+from typing import Any, Callable
+
+from browser_use import Agent
+from browser_use.agent.service import log_response
+from browser_use.llm.google.chat import ChatGoogle
+from browser_use.llm.google.serializer import GoogleMessageSerializer
+from browser_use.llm.schema import SchemaOptimizer
+from browser_use.llm.views import ChatInvokeCompletion
+
+from perf_context import current_step, current_task_id
+from perf_logger import emit, span
+from timed_llm import TimedLLM
+
+
+_HEADER_KEYS = ("thinking", "evaluation_previous_goal", "memory", "next_goal")
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+class IncrementalActionParser:
+    """
+    Feeds on the streamed AgentOutput JSON and returns each element of the top-level
+    "action" array as soon as its closing brace arrives (the rest of the document may
+    still be incomplete).
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack: list[str] = []
+        self._in_str = False
+        self._esc = False
+        self._actions_depth: int | None = None
+        self._item_start: int | None = None
+
+    def feed(self, chunk: str) -> list[dict[str, Any]]:
+        self.text += chunk
+        out: list[dict[str, Any]] = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                continue
+            if c == '"':
+                self._in_str = True
+            elif c in "{[":
+                if c == "[" and len(self._stack) == 1 and self._actions_depth is None and self._key_before(i) == "action":
+                    self._actions_depth = len(self._stack) + 1
+                self._stack.append(c)
+                if c == "{" and self._actions_depth is not None and len(self._stack) == self._actions_depth + 1:
+                    self._item_start = i
+            elif c in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if self._actions_depth is None:
+                    continue
+                if c == "}" and self._item_start is not None and len(self._stack) == self._actions_depth:
+                    try:
+                        item = json.loads(text[self._item_start : i + 1])
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        out.append(item)
+                    self._item_start = None
+                elif c == "]" and len(self._stack) == self._actions_depth - 1:
+                    self._actions_depth = -1  # array closed; never reopen
+        self._pos = len(text)
+        return out
+
+    def _key_before(self, i: int) -> str | None:
+        m = re.search(r'"(\w+)"\s*:\s*$', self.text[max(0, i - 64) : i])
+        return m.group(1) if m else None
+
+    def document(self) -> str:
+        return _FENCE_RE.sub("", self.text.strip())
+
+    def header(self) -> dict[str, str]:
+        """Top-level string fields written so far (for salvaging a truncated document)."""
+        fields: dict[str, str] = {}
+        for key in _HEADER_KEYS:
+            m = re.search(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)"' % key, self.text)
+            if m:
+                try:
+                    fields[key] = json.loads(f'"{m.group(1)}"')
+                except ValueError:
+                    fields[key] = m.group(1)
+        return fields
+
+
+class StreamingChat:
+    """
+    ChatGoogle variant whose ainvoke() streams the structured response and reports each
+    fully written action to `on_action`. Mirrors ChatGoogle's request config; anything it
+    can't stream raises, and the caller falls back to the plain call.
+    """
+
+    def __init__(self, llm: ChatGoogle):
+        self._llm = llm
+        self.on_action: Callable[[dict[str, Any]], None] | None = None
+        self.last_parser: IncrementalActionParser | None = None
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._llm, item)
+
+    def _config(self, system_instruction: Any, output_format: Any) -> dict[str, Any]:
+        llm = self._llm
+        config: dict[str, Any] = dict(llm.config or {})
+        if llm.temperature is not None:
+            config["temperature"] = llm.temperature
+        if system_instruction:
+            config["system_instruction"] = system_instruction
+        if llm.top_p is not None:
+            config["top_p"] = llm.top_p
+        if llm.seed is not None:
+            config["seed"] = llm.seed
+        thinking_budget = llm.thinking_budget
+        if thinking_budget is None and ("gemini-2.5-flash" in llm.model or "gemini-flash" in llm.model):
+            thinking_budget = 0
+        if thinking_budget is not None:
+            config["thinking_config"] = {"thinking_budget": thinking_budget}
+        if llm.max_output_tokens is not None:
+            config["max_output_tokens"] = llm.max_output_tokens
+        if output_format is not None:
+            if not llm.supports_structured_output:
+                raise NotImplementedError("streaming needs native JSON mode")
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = llm._fix_gemini_schema(SchemaOptimizer.create_gemini_optimized_schema(output_format))
+        return config
+
+    async def ainvoke(self, messages: list[Any], output_format: Any = None, **kwargs: Any) -> Any:
+        llm = self._llm
+        contents, system_instruction = GoogleMessageSerializer.serialize_messages(
+            messages, include_system_in_user=llm.include_system_in_user
+        )
+        config = self._config(system_instruction, output_format)
+        parser = IncrementalActionParser()
+        self.last_parser = parser
+        last_with_usage = None
+        stream = await llm.get_client().aio.models.generate_content_stream(model=llm.model, contents=contents, config=config)
+        async for chunk in stream:
+            if getattr(chunk, "usage_metadata", None) is not None:
+                last_with_usage = chunk
+            for raw in parser.feed(chunk.text or ""):
+                if self.on_action is not None:
+                    self.on_action(raw)
+        usage = llm._get_usage(last_with_usage) if last_with_usage is not None else None
+        text = parser.document()
+        completion = output_format.model_validate_json(text) if output_format is not None else text
+        return ChatInvokeCompletion(completion=completion, usage=usage)
+
+
+class EarlyActionRunner:
+    """
+    Executes one step's actions in order as they stream in, with the same rules as
+    Agent.multi_act: `done` only as the first action, wait_between_actions between
+    actions, stop after a done result or an error.
+    """
+
+    def __init__(self, agent: Agent, urls_replaced: dict[str, str] | None, limit: int):
+        self.agent = agent
+        self.urls_replaced = urls_replaced
+        self.limit = limit
+        self.dispatched: list[Any] = []
+        self.results: list[Any] = []
+        self.stopped = False
+        self.rejected = False
+        self.first_dispatch_s: float | None = None
+        self._t0 = time.perf_counter()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._error: BaseException | None = None
+
+    def submit(self, raw: dict[str, Any]) -> None:
+        if self.stopped or self.rejected or len(self.dispatched) >= self.limit:
+            return
+        try:
+            action = self.agent.ActionModel.model_validate(raw)
+        except Exception:
+            # Leave this one and everything after it to the regular multi_act path
+            self.rejected = True
+            return
+        if self.urls_replaced:
+            self.agent._recursive_process_all_strings_inside_pydantic_model(action, self.urls_replaced)
+        self._enqueue(action)
+        if self.first_dispatch_s is None:
+            self.first_dispatch_s = time.perf_counter() - self._t0
+
+    def _enqueue(self, action: Any) -> None:
+        self.dispatched.append(action)
+        self._queue.put_nowait(action)
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        i = 0
+        while True:
+            action = await self._queue.get()
+            if action is None:
+                return
+            if self.stopped:
+                continue
+            try:
+                await self._act(i, action)
+            except Exception as e:
+                # Cancellation is not an action error: let it end the drain
+                self._error = e
+                self.stopped = True
+            i += 1
+
+    async def _act(self, i: int, action: Any) -> None:
+        agent = self.agent
+        action_data = action.model_dump(exclude_unset=True)
+        if i > 0:
+            if action_data.get("done") is not None:
+                self.stopped = True
+                return
+            await asyncio.sleep(agent.browser_profile.wait_between_actions)
+        await agent._check_stop_or_pause()
+        agent._log_action(action, next(iter(action_data.keys()), "unknown"), i + 1, len(self.dispatched))
+        result = await agent.tools.act(
+            action=action,
+            browser_session=agent.browser_session,
+            file_system=agent.file_system,
+            page_extraction_llm=agent.settings.page_extraction_llm,
+            sensitive_data=agent.sensitive_data,
+            available_file_paths=agent.available_file_paths,
+        )
+        self.results.append(result)
+        if result.is_done or result.error:
+            self.stopped = True
+
+    async def finish(self, actions: list[Any]) -> list[Any]:
+        """Run whatever of `actions` wasn't dispatched yet, then wait for all of them."""
+        if not self.stopped:
+            for action in actions[len(self.dispatched) :]:
+                self._enqueue(action)
+        if self._task is None:
+            return self.results
+        self._queue.put_nowait(None)
+        await self._task
+        if self._error is not None:
+            raise self._error
+        return self.results
+
+    async def aclose(self) -> None:
+        """Cancel actions still running and wait for them to stop (the caller's own cancellation still propagates)."""
+        task = self._task
+        if task is None or task.done():
+            return
+        task.cancel()
+        # gather() hands back the task's own CancelledError instead of raising it
+        await asyncio.gather(task, return_exceptions=True)
+
+
+class StreamingAgent(Agent):
+    """
+    Browser-Use Agent that streams the step's model output and starts each action as soon
+    as it is fully written and validates, instead of waiting for the whole response.
+    BrowserAgent uses it when WEASZEL_STREAMING=1.
+
+    Only for ChatGoogle behind a TimedLLM (the stream goes through the same middleware
+    stack, minus retry/hedge which would run actions twice). If the stream fails before any
+    action started, the step falls back to the regular call; if it fails after, the step
+    keeps the actions already running plus whatever header the model wrote.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._early: EarlyActionRunner | None = None
+        self._stream_chat: StreamingChat | None = None
+        self._stream_llm: TimedLLM | None = None
+        base = getattr(self.llm, "_llm", None)
+        if isinstance(self.llm, TimedLLM) and isinstance(base, ChatGoogle):
+            self._stream_chat = StreamingChat(base)
+            # Keep Browser-Use's own usage accounting for streamed steps
+            token_cost_service = getattr(self, "token_cost_service", None)
+            if token_cost_service is not None:
+                token_cost_service.register_llm(self._stream_chat)
+            self._stream_llm = self.llm.derive(self._stream_chat, drop=("retry", "hedge"))
+
+    async def get_model_output(self, input_messages: list[Any]) -> Any:
+        if self._stream_llm is None:
+            return await super().get_model_output(input_messages)
+        if self._early is not None:
+            # Left over from a step that never reached multi_act (timeout, pause)
+            await self._early.aclose()
+            self._early = None
+
+        urls_replaced = self._process_messsages_and_replace_long_urls_shorter_ones(input_messages)
+        runner = EarlyActionRunner(self, urls_replaced, self.settings.max_actions_per_step)
+        try:
+            parsed = await self._stream_step(input_messages, runner, urls_replaced)
+        except BaseException:
+            # Timeout, cancellation or a failed step: early actions must not run into the next step
+            await runner.aclose()
+            raise
+        return parsed
+
+    async def _stream_step(self, input_messages: list[Any], runner: EarlyActionRunner, urls_replaced: Any) -> Any:
+        fallback = False
+        self._stream_chat.on_action = runner.submit
+        t0 = time.perf_counter()
+        try:
+            with span("agent.stream", task_id=current_task_id.get(), step=current_step.get()):
+                response = await self._stream_llm.ainvoke(input_messages, output_format=self.AgentOutput)
+            parsed = response.completion
+        except Exception as e:
+            self._stream_chat.on_action = None
+            parsed = self._salvage(runner) if runner.dispatched else None
+            if parsed is None:
+                await runner.aclose()
+                if runner.dispatched:
+                    raise
+                fallback = True
+                emit("agent.stream_fallback", task_id=current_task_id.get(), step=current_step.get(), error=str(e)[:300])
+                response = await self.llm.ainvoke(input_messages, output_format=self.AgentOutput)
+                parsed = response.completion
+        finally:
+            self._stream_chat.on_action = None
+
+        if urls_replaced:
+            self._recursive_process_all_strings_inside_pydantic_model(parsed, urls_replaced)
+        if len(parsed.action) > self.settings.max_actions_per_step:
+            parsed.action = parsed.action[: self.settings.max_actions_per_step]
+        self._early = None if fallback else runner
+
+        emit(
+            "agent.stream",
+            task_id=current_task_id.get(),
+            step=current_step.get(),
+            fallback=fallback,
+            actions=len(parsed.action),
+            early_actions=len(runner.dispatched),
+            first_action_ms=round(runner.first_dispatch_s * 1000.0, 1) if runner.first_dispatch_s is not None else None,
+            stream_ms=round((time.perf_counter() - t0) * 1000.0, 1),
+        )
+        if not (hasattr(self.state, "paused") and (self.state.paused or self.state.stopped)):
+            log_response(parsed, self.tools.registry.registry, self.logger)
+        self._log_next_action_summary(parsed)
+        return parsed
+
+    def _salvage(self, runner: EarlyActionRunner) -> Any | None:
+        parser = self._stream_chat.last_parser if self._stream_chat is not None else None
+        header = parser.header() if parser is not None else {}
+        try:
+            return self.AgentOutput.model_validate(
+                {**header, "action": [a.model_dump(exclude_unset=True) for a in runner.dispatched]}
+            )
+        except Exception:
+            return None
+
+    async def multi_act(self, actions: list[Any], *args: Any, **kwargs: Any) -> list[Any]:
+        runner, self._early = self._early, None
+        if runner is None or not runner.dispatched:
+            if runner is not None:
+                await runner.aclose()
+            return await super().multi_act(actions, *args, **kwargs)
+        try:
+            return await runner.finish(actions)
+        finally:
+            await runner.aclose()
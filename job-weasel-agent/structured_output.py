@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import threading
+from typing import Any, TypeVar
+
+from browser_use.llm.exceptions import ModelProviderError
+from browser_use.llm.messages import UserMessage
+from pydantic import BaseModel, ValidationError
+
+from perf_context import current_step, current_task_id
+from perf_logger import emit
+
+
+T = TypeVar("T", bound=BaseModel)
+
+_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$", re.I)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+def repair_json(text: str) -> str:
+    """
+    Local, deterministic fixes for the usual ways model JSON is broken: code fences, prose
+    around the object, trailing commas, and a response cut off before its closing brackets.
+    """
+    t = _FENCE_RE.sub("", (text or "").strip())
+    start = t.find("{")
+    if start > 0:
+        t = t[start:]
+
+    # Cut after the object closes (trailing prose); close whatever is still open (truncated output)
+    stack: list[str] = []
+    in_str = esc = False
+    for i, c in enumerate(t):
+        if in_str:
+            if esc:
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]" and stack:
+            stack.pop()
+            if not stack:
+                t = t[: i + 1]
+                break
+    if in_str:
+        t += '"'
+    t += "".join(reversed(stack))
+    return _TRAILING_COMMA_RE.sub(r"\1", t)
+
+
+def parse_output(schema: type[T], text: str) -> T | None:
+    for candidate in (text, repair_json(text)):
+        try:
+            return schema.model_validate(json.loads(candidate))
+        except (ValueError, ValidationError, TypeError):
+            continue
+    return None
+
+
+def _repair_calls() -> int:
+    """LLM repair attempts after a failed schema call (WEASZEL_SCHEMA_REPAIR_CALLS, default 1)."""
+    try:
+        return max(0, int(os.environ.get("WEASZEL_SCHEMA_REPAIR_CALLS", "1")))
+    except ValueError:
+        return 1
+
+
+_stats: dict[str, dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(name: str, outcome: str, calls: int, error: str = "") -> None:
+    with _stats_lock:
+        s = _stats.setdefault(name, {"ok": 0, "repaired": 0, "failed": 0, "calls": 0, "wasted_calls": 0})
+        s[outcome] += 1
+        s["calls"] += calls
+        # Calls whose output was thrown away: every call of a failure, all but the last of a repair
+        s["wasted_calls"] += calls if outcome == "failed" else calls - 1
+        snapshot = dict(s)
+    emit(
+        "llm.structured",
+        task_id=current_task_id.get(),
+        step=current_step.get(),
+        name=name,
+        outcome=outcome,
+        attempts=calls,
+        error=error[:300] if error else None,
+        **snapshot,
+    )
+
+
+def structured_stats() -> dict[str, dict[str, int]]:
+    with _stats_lock:
+        return {name: dict(s) for name, s in _stats.items()}
+
+
+async def ainvoke_structured(llm: Any, messages: list[Any], schema: type[T], *, name: str) -> T | None:
+    """
+    Call `llm` with `schema` as the native response schema and return the parsed model.
+
+    If the provider can't parse its own output, make at most WEASZEL_SCHEMA_REPAIR_CALLS
+    plain-text calls that restate the schema, and parse those locally with repair_json().
+    Returns None when nothing parses; every call is counted in llm.structured events.
+    """
+    try:
+        resp = await llm.ainvoke(messages, output_format=schema)
+        completion = resp.completion
+        if isinstance(completion, schema):
+            _record(name, "ok", 1)
+            return completion
+        parsed = parse_output(schema, completion) if isinstance(completion, str) else schema.model_validate(completion)
+        if parsed is not None:
+            _record(name, "ok", 1)
+            return parsed
+        error = "unparseable completion"
+    except (ValueError, ValidationError) as e:
+        error = str(e)
+    except ModelProviderError as e:
+        # The provider raises its own JSON/schema failures as ModelProviderError from the
+        # ValueError (JSONDecodeError, ValidationError); anything else isn't ours to repair
+        if not isinstance(e.__cause__, (ValueError, ValidationError)):
+            raise
+        error = str(e)
+
+    calls = 1
+    schema_text = json.dumps(schema.model_json_schema(), separators=(",", ":"))
+    repair_messages = [
+        *messages,
+        UserMessage(
+            content=f"Your previous answer was not valid JSON for the required schema. Reply with ONLY one JSON object "
+            f"matching this JSON schema, no prose, no code fences:\n{schema_text}"
+        ),
+    ]
+    for _ in range(_repair_calls()):
+        calls += 1
+        try:
+            resp = await llm.ainvoke(repair_messages)
+        except Exception as e:
+            error = str(e)
+            continue
+        parsed = parse_output(schema, str(resp.completion or ""))
+        if parsed is not None:
+            _record(name, "repaired", calls, error)
+            return parsed
+    _record(name, "failed", calls, error)
+    return None
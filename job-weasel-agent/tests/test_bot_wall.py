@@ -0,0 +1,103 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_wall import SiteBlockStats, classify_bot_wall, domain_of  # noqa: E402
+
+_RECAPTCHA = {"src": "https://www.google.com/recaptcha/api2/anchor?k=x", "visible": True}
+
+
+def _signals(**overrides):
+    base = {
+        "url": "https://example.com/page",
+        "title": "Example",
+        "status": 200,
+        "frames": [],
+        "markers": [],
+        "text": "",
+        "text_len": 300,
+        "auth_inputs": 0,
+    }
+    base.update(overrides)
+    return base
+
+
+class ClassifyBotWallTest(unittest.TestCase):
+    def test_normal_page(self):
+        self.assertIsNone(classify_bot_wall(_signals(text_len=8000)))
+        self.assertIsNone(classify_bot_wall({}))
+
+    def test_cloudflare_marker(self):
+        wall = classify_bot_wall(_signals(markers=["#challenge-form"], title="Just a moment..."))
+        self.assertEqual(wall.kind, "cloudflare")
+
+    def test_cloudflare_turnstile_frame_on_short_page(self):
+        frames = [{"src": "https://challenges.cloudflare.com/cdn-cgi/challenge-platform/x", "visible": True}]
+        self.assertEqual(classify_bot_wall(_signals(frames=frames)).kind, "cloudflare")
+
+    def test_interstitial_marker(self):
+        wall = classify_bot_wall(_signals(markers=["#px-captcha"]))
+        self.assertEqual((wall.kind, wall.detail), ("captcha", "#px-captcha"))
+
+    def test_login_page_with_recaptcha_is_not_a_wall(self):
+        signals = _signals(title="Sign in", frames=[_RECAPTCHA], markers=[".g-recaptcha"], auth_inputs=2)
+        self.assertIsNone(classify_bot_wall(signals))
+        # No form inputs and no challenge wording either: still just a widget
+        self.assertIsNone(classify_bot_wall(_signals(title="Contact us", frames=[_RECAPTCHA])))
+
+    def test_recaptcha_with_challenge_wording(self):
+        wall = classify_bot_wall(_signals(title="Are you a robot?", frames=[_RECAPTCHA]))
+        self.assertEqual(wall.kind, "captcha")
+        self.assertIn("recaptcha", wall.detail)
+
+    def test_recaptcha_with_blocking_status(self):
+        self.assertEqual(classify_bot_wall(_signals(status=429, frames=[_RECAPTCHA])).kind, "captcha")
+
+    def test_invisible_frames_ignored(self):
+        frames = [{"src": _RECAPTCHA["src"], "visible": False}]
+        self.assertIsNone(classify_bot_wall(_signals(title="Are you a robot?", frames=frames, text_len=5000)))
+
+    def test_http_block(self):
+        wall = classify_bot_wall(_signals(status=403))
+        self.assertEqual((wall.kind, wall.detail), ("http_block", "HTTP 403"))
+        # A long 403 page is content (e.g. a paywall article), not a wall
+        self.assertIsNone(classify_bot_wall(_signals(status=403, text_len=9000)))
+
+    def test_challenge_text(self):
+        wall = classify_bot_wall(_signals(text="We detected unusual traffic from your network."))
+        self.assertEqual((wall.kind, wall.detail), ("challenge_text", "unusual traffic"))
+
+
+class SiteBlockStatsTest(unittest.TestCase):
+    def test_block_rate_and_rank(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = SiteBlockStats(path=os.path.join(tmp, "blocks.json"))
+            stats.record("a.com", blocked=True)
+            stats.record("b.com", blocked=False)
+            self.assertAlmostEqual(stats.block_rate("a.com"), 1 / 3)
+            self.assertEqual(stats.block_rate("unseen.com"), 0.0)
+            self.assertEqual(stats.rank(["https://a.com/x", "https://www.b.com/y"]), ["https://www.b.com/y", "https://a.com/x"])
+
+    def test_flush_writes_only_when_dirty(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "logs", "blocks.json")
+            stats = SiteBlockStats(path=path)
+            asyncio.run(stats.flush())
+            self.assertFalse(os.path.exists(path))
+            stats.record("a.com", blocked=True)
+            asyncio.run(stats.flush())
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(json.load(f), {"a.com": {"visits": 1, "blocks": 1}})
+            self.assertEqual(SiteBlockStats(path=path).counts["a.com"]["blocks"], 1)
+
+    def test_domain_of(self):
+        self.assertEqual(domain_of("https://www.Indeed.com/jobs?q=x"), "indeed.com")
+
+
+if __name__ == "__main__":
+    unittest.main()
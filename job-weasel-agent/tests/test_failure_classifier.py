@@ -0,0 +1,83 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from failure_classifier import THRESHOLDS, classify_step  # noqa: E402
+
+
+def _cls(**kwargs):
+    kwargs.setdefault("errors", [])
+    kwargs.setdefault("eval_text", "")
+    failure = classify_step(**kwargs)
+    return failure.cls if failure is not None else None
+
+
+class ClassifyStepTest(unittest.TestCase):
+    def test_success(self):
+        self.assertIsNone(_cls(eval_text="Success - the search results are shown."))
+        self.assertIsNone(_cls(eval_text="Form submitted with no errors."))
+        self.assertIsNone(_cls())
+
+    def test_success_verdict_wins_over_failure_words(self):
+        self.assertIsNone(_cls(eval_text="Successful. The earlier error banner is gone."))
+
+    def test_bot_wall_first(self):
+        self.assertEqual(_cls(errors=["Element with index 4 does not exist"], bot_wall=True), "blocked")
+
+    def test_action_errors(self):
+        cases = {
+            "Element with index 12 does not exist - retry or use alternative actions": "element_not_found",
+            "Node is detached from document": "stale_dom",
+            "TimeoutError: Navigation timeout of 30000 ms exceeded": "navigation_timeout",
+            "net::ERR_CONNECTION_RESET": "navigation_timeout",
+            "429 Resource exhausted": "rate_limit",
+            "Could not parse response: JSONDecodeError": "llm_parse",
+            "403 Forbidden": "blocked",
+        }
+        for error, expected in cases.items():
+            with self.subTest(error=error):
+                self.assertEqual(_cls(errors=[error]), expected)
+
+    def test_validation_from_page_state(self):
+        failure = classify_step(
+            errors=[], eval_text="Failed: the form did not submit.", page={"invalid_fields": 2, "alerts": ["Email is required"]}
+        )
+        self.assertEqual((failure.cls, failure.evidence), ("validation_error", "Email is required"))
+        self.assertEqual(_cls(eval_text="Unable to continue, please enter a phone number"), "validation_error")
+
+    def test_still_loading(self):
+        self.assertEqual(_cls(eval_text="Failed to see results", page={"ready_state": "loading"}), "navigation_timeout")
+
+    def test_network_signals_pick_the_class(self):
+        page = {"net_failed": [{"url": "https://a.com/api/search", "status": 503}]}
+        failure = classify_step(errors=[], eval_text="The search did not work.", page=page)
+        self.assertEqual(failure.cls, "navigation_timeout")
+        self.assertIn("HTTP 503", failure.evidence)
+        page["net_failed"].append({"url": "https://a.com/api/x", "status": 429})
+        self.assertEqual(_cls(eval_text="The search did not work.", page=page), "rate_limit")
+
+    def test_console_errors_pick_the_class(self):
+        page = {"console_errors": ["Uncaught TypeError: node is not attached to the document"]}
+        failure = classify_step(errors=[], eval_text="Click failed.", page=page)
+        self.assertEqual(failure.cls, "stale_dom")
+        self.assertTrue(failure.evidence.startswith("console: "))
+
+    def test_page_signals_never_turn_success_into_failure(self):
+        page = {"net_failed": [{"url": "https://ads.example/x", "status": 500}], "console_errors": ["Uncaught 403"]}
+        self.assertIsNone(_cls(eval_text="Success - opened the job posting.", page=page))
+
+    def test_eval_text_patterns_and_fallback(self):
+        self.assertEqual(_cls(eval_text="Failed: could not find the element for the Apply button"), "element_not_found")
+        self.assertEqual(_cls(eval_text="Unable to proceed for unclear reasons"), "unknown")
+
+    def test_every_class_has_thresholds(self):
+        for cls in ("element_not_found", "navigation_timeout", "blocked", "stale_dom", "validation_error", "llm_parse",
+                    "rate_limit", "unknown"):
+            self.assertIn(cls, THRESHOLDS)
+        self.assertEqual(THRESHOLDS["blocked"].switch_site, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import io
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import intervention  # noqa: E402
+from intervention import InterventionChannel, default_timeout_s, unattended  # noqa: E402
+
+
+class _Attended(unittest.TestCase):
+    """A human is (nominally) present; the terminal reader is kept off the real stdin."""
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(intervention, "unattended", return_value=False),
+            mock.patch.object(InterventionChannel, "_ensure_reader", lambda self: None),
+            mock.patch.object(sys, "stdout", io.StringIO()),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.channel = InterventionChannel()
+
+
+class UnattendedTest(unittest.TestCase):
+    def test_env_flag(self):
+        with mock.patch.dict(os.environ, {"WEASZEL_UNATTENDED": "1"}):
+            self.assertTrue(unattended())
+
+    def test_ask_returns_default_without_waiting(self):
+        channel = InterventionChannel()
+        with mock.patch.dict(os.environ, {"WEASZEL_UNATTENDED": "yes"}):
+            answer = asyncio.run(channel.ask("Solve the captcha?", choices=["y", "n"], default="n", timeout_s=3600))
+            self.assertEqual(answer, "n")
+            self.assertEqual(channel.ask_sync("Continue?", default="skip", timeout_s=3600), "skip")
+        self.assertEqual(channel.pending(), [])
+
+    def test_default_timeout_env(self):
+        for raw, expected in (("", None), ("0", None), ("abc", None), ("-3", None), ("2.5", 2.5)):
+            with mock.patch.dict(os.environ, {"WEASZEL_INTERVENTION_TIMEOUT": raw}):
+                self.assertEqual(default_timeout_s(), expected, raw)
+
+
+class TimeoutTest(_Attended):
+    def test_async_timeout_takes_default(self):
+        answer = asyncio.run(self.channel.ask("Pick a site", choices=["a", "b"], default="a", timeout_s=0.05))
+        self.assertEqual(answer, "a")
+        self.assertEqual(self.channel.pending(), [])
+        self.assertIn("(auto: a in 0.05s)", sys.stdout.getvalue())
+
+    def test_sync_timeout_takes_default(self):
+        self.assertEqual(self.channel.ask_sync("Retry?", default="no", timeout_s=0.05), "no")
+        self.assertEqual(self.channel.pending(), [])
+
+    def test_env_timeout_used_when_not_given(self):
+        with mock.patch.dict(os.environ, {"WEASZEL_INTERVENTION_TIMEOUT": "0.05"}):
+            self.assertEqual(asyncio.run(self.channel.ask("Retry?", default="later")), "later")
+
+    def test_event_loop_keeps_running_while_waiting(self):
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.005)
+
+            t = asyncio.create_task(ticker())
+            await self.channel.ask("Wait", default="", timeout_s=0.1)
+            t.cancel()
+            return ticks
+
+        self.assertGreater(asyncio.run(run()), 5)
+
+
+class SubmitTest(_Attended):
+    def test_submit_answers_async_question(self):
+        async def run():
+            task = asyncio.create_task(self.channel.ask("Continue?", choices=["y", "n"], default="n", timeout_s=5))
+            await asyncio.sleep(0.01)
+            [req] = self.channel.pending()
+            self.assertFalse(self.channel.submit(req.id, "maybe"))
+            self.assertTrue(self.channel.submit(req.id, " y\n"))
+            self.assertFalse(self.channel.submit(req.id, "n"))
+            return await task
+
+        self.assertEqual(asyncio.run(run()), "y")
+
+    def test_submit_from_another_thread_answers_sync_question(self):
+        def answer():
+            while not self.channel.pending():
+                time.sleep(0.005)
+            self.channel.submit(self.channel.pending()[0].id, "done")
+
+        threading.Thread(target=answer, daemon=True).start()
+        self.assertEqual(self.channel.ask_sync("Tell me when", timeout_s=5), "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_hedge  # noqa: E402
+import llm_scheduler  # noqa: E402
+from llm_middleware import HedgeMiddleware, LLMPipeline, RateLimitMiddleware  # noqa: E402
+from llm_scheduler import Priority, get_scheduler  # noqa: E402
+
+
+class _AlternatingLLM:
+    """Every other request hangs, so each hedged call has a slow primary and a fast hedge."""
+
+    model = "m"
+    provider = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        self.calls += 1
+        if self.calls % 2:
+            await asyncio.sleep(3600)
+        return "ok"
+
+
+class HedgeCapacityTest(unittest.TestCase):
+    def setUp(self):
+        env = {
+            "WEASZEL_LLM_SCHEDULER": "1",
+            "WEASZEL_LLM_LIMITS": '{"m": {"rpm": 10000, "tpm": 10000000, "concurrency": 2}}',
+            "WEASZEL_HEDGE": "1",
+            "WEASZEL_HEDGE_SITES": "agent",
+            "WEASZEL_HEDGE_MIN_DELAY_S": "0.01",
+            "WEASZEL_HEDGE_MAX_PER_TASK": "100",
+        }
+        for k, v in env.items():
+            self.addCleanup(os.environ.pop, k, None)
+        os.environ.update(env)
+        llm_scheduler._scheduler = None
+        llm_hedge._policy = None
+        self.addCleanup(setattr, llm_scheduler, "_scheduler", None)
+        self.addCleanup(setattr, llm_hedge, "_policy", None)
+        for _ in range(llm_hedge.HedgePolicy.MIN_SAMPLES):
+            llm_hedge.get_hedge_policy().observe("m", 0.01)
+
+    def test_hedging_keeps_scheduler_capacity(self):
+        llm = _AlternatingLLM()
+        pipeline = LLMPipeline(llm, [HedgeMiddleware(), RateLimitMiddleware()], site="agent", priority=Priority.FOREGROUND)
+
+        async def scenario():
+            for _ in range(5):
+                self.assertEqual(await asyncio.wait_for(pipeline.ainvoke(["hi"]), timeout=2), "ok")
+                # The cancelled primary has already handed its slot back
+                lane = get_scheduler().stats()["lanes"]["m"]
+                self.assertEqual(lane["in_flight"], 0)
+                self.assertEqual(lane["concurrency_limit"], 2)
+
+        asyncio.run(scenario())
+        self.assertEqual(llm_hedge.get_hedge_policy().stats()["m"]["won"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
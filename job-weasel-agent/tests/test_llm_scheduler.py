@@ -0,0 +1,48 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_scheduler import LLMScheduler, Priority  # noqa: E402
+
+
+class SchedulerCancellationTest(unittest.TestCase):
+    def setUp(self):
+        os.environ["WEASZEL_LLM_SCHEDULER"] = "1"
+        os.environ["WEASZEL_LLM_LIMITS"] = '{"m": {"rpm": 10000, "tpm": 10000000, "concurrency": 2}}'
+        self.addCleanup(os.environ.pop, "WEASZEL_LLM_LIMITS", None)
+        self.scheduler = LLMScheduler()
+
+    def test_cancelled_calls_release_their_slots(self):
+        async def scenario():
+            async def hang():
+                await asyncio.sleep(3600)
+
+            tasks = [asyncio.create_task(self.scheduler.run("m", hang, priority=Priority.THINKING)) for _ in range(2)]
+            while self.scheduler.stats()["lanes"].get("m", {}).get("in_flight", 0) < 2:
+                await asyncio.sleep(0.01)
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            async def quick():
+                return "ok"
+
+            return await asyncio.wait_for(self.scheduler.run("m", quick), timeout=2)
+
+        self.assertEqual(asyncio.run(scenario()), "ok")
+        self.assertEqual(self.scheduler.stats()["lanes"]["m"]["in_flight"], 0)
+
+    def test_sync_interrupt_releases_slot(self):
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.scheduler.run_sync("m", interrupted)
+        self.assertEqual(self.scheduler.stats()["lanes"]["m"]["in_flight"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loop_detector import LoopDetector, StepFingerprint, action_signature  # noqa: E402
+
+
+def _fp(url="https://a.com/", dom="d1", *actions):
+    return StepFingerprint(url=url, dom_hash=dom, actions=tuple(actions) or ("click:{\"index\": 1}",))
+
+
+def _scroll(down, url="https://a.com/list"):
+    return StepFingerprint(url=url, dom_hash="s", actions=(f"scroll:{'down' if down else 'up'}",))
+
+
+class _Action:
+    def __init__(self, data):
+        self.data = data
+
+    def model_dump(self, **kwargs):
+        return self.data
+
+
+class LoopDetectorTest(unittest.TestCase):
+    def test_repeat(self):
+        d = LoopDetector(min_repeats=3)
+        self.assertIsNone(d.observe(_fp()))
+        self.assertIsNone(d.observe(_fp()))
+        event = d.observe(_fp())
+        self.assertEqual((event.kind, event.period, event.repeats), ("repeat", 1, 3))
+        self.assertEqual(d.loops_detected, 1)
+
+    def test_window_cleared_after_event(self):
+        d = LoopDetector(min_repeats=3)
+        for _ in range(3):
+            d.observe(_fp())
+        self.assertIsNone(d.observe(_fp()))
+        self.assertIsNone(d.observe(_fp()))
+        self.assertIsNotNone(d.observe(_fp()))
+        self.assertEqual(d.loops_detected, 2)
+
+    def test_oscillation(self):
+        d = LoopDetector()
+        a, b = _fp("https://a.com/1", "x"), _fp("https://a.com/2", "y")
+        events = [d.observe(fp) for fp in (a, b, a)]
+        self.assertEqual(events, [None, None, None])
+        event = d.observe(b)
+        self.assertEqual((event.kind, event.period), ("oscillation", 2))
+        self.assertIn("https://a.com/1 → https://a.com/2", event.detail)
+
+    def test_progress_is_not_a_loop(self):
+        d = LoopDetector()
+        for i in range(12):
+            self.assertIsNone(d.observe(_fp(f"https://a.com/{i}", str(i))))
+
+    def test_same_page_different_actions_is_not_oscillation(self):
+        # Filling a form: same url + dom, different actions each step
+        d = LoopDetector()
+        for i in range(6):
+            self.assertIsNone(d.observe(_fp("https://a.com/form", "f", f"input:{i}")))
+
+    def test_scroll_thrash(self):
+        d = LoopDetector()
+        events = [d.observe(_scroll(down)) for down in (True, False, True)]
+        self.assertEqual(events, [None, None, None])
+        event = d.observe(_scroll(False))
+        self.assertEqual((event.kind, event.repeats), ("scroll_thrash", 3))
+
+    def test_scrolling_one_way_is_not_thrash(self):
+        d = LoopDetector(min_repeats=5)
+        pages = [StepFingerprint(url="https://a.com/list", dom_hash=str(i), actions=("scroll:down",)) for i in range(4)]
+        self.assertEqual([d.observe(p) for p in pages], [None] * 4)
+
+    def test_reset(self):
+        d = LoopDetector(min_repeats=2)
+        d.observe(_fp())
+        d.reset()
+        self.assertIsNone(d.observe(_fp()))
+        self.assertEqual(d.loops_detected, 0)
+
+
+class ActionSignatureTest(unittest.TestCase):
+    def test_stable_param_order(self):
+        a = action_signature(_Action({"click": {"index": 3, "new_tab": False}}))
+        b = action_signature(_Action({"click": {"new_tab": False, "index": 3}}))
+        self.assertEqual(a, b)
+
+    def test_scroll_keeps_direction_only(self):
+        self.assertEqual(action_signature(_Action({"scroll": {"down": False, "pages": 2}})), "scroll:up")
+        self.assertEqual(action_signature(_Action({"scroll": {}})), "scroll:down")
+
+    def test_empty_and_plain(self):
+        self.assertEqual(action_signature(_Action({})), "noop")
+        self.assertEqual(action_signature("go_back"), "go_back")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from replan import ReplanAlternative, ReplanCache, ReplanOutput  # noqa: E402
+except ImportError:  # pydantic not installed
+    ReplanCache = None
+
+
+def _output(approach="Use the site search box"):
+    return ReplanOutput(
+        diagnosis="The filter panel is collapsed.",
+        alternatives=[ReplanAlternative(approach=approach, first_action="click search", confidence=0.7)],
+    )
+
+
+@unittest.skipIf(ReplanCache is None, "pydantic is not installed")
+class ReplanCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "logs", "replan_cache.json")
+        self.key = ReplanCache.key("indeed.com", "  Find React jobs ", "element_not_found")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_normalizes_goal(self):
+        self.assertEqual(self.key, ReplanCache.key("indeed.com", "find react jobs", "element_not_found"))
+
+    def test_hit_within_ttl(self):
+        cache = ReplanCache(path=self.path, ttl_s=60)
+        cache.put(self.key, _output())
+        got = cache.get(self.key)
+        self.assertEqual(got.chosen_alternative().approach, "Use the site search box")
+
+    def test_expired_entry_is_dropped(self):
+        cache = ReplanCache(path=self.path, ttl_s=60)
+        cache.put(self.key, _output())
+        cache._items[self.key]["ts"] = time.time() - 61
+        self.assertIsNone(cache.get(self.key))
+        self.assertNotIn(self.key, cache._items)
+
+    def test_lru_eviction(self):
+        cache = ReplanCache(path=self.path, max_entries=2)
+        keys = [ReplanCache.key("a.com", f"goal {i}", "unknown") for i in range(3)]
+        cache.put(keys[0], _output())
+        cache.put(keys[1], _output())
+        cache.get(keys[0])
+        cache.put(keys[2], _output())
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNotNone(cache.get(keys[0]))
+
+    def test_invalidate(self):
+        cache = ReplanCache(path=self.path)
+        cache.put(self.key, _output())
+        self.assertTrue(cache.invalidate(self.key))
+        self.assertFalse(cache.invalidate(self.key))
+        self.assertIsNone(cache.get(self.key))
+
+    def test_flush_persists_off_loop(self):
+        cache = ReplanCache(path=self.path)
+        cache.put(self.key, _output())
+        self.assertFalse(os.path.exists(self.path))
+        asyncio.run(cache.flush())
+        with open(self.path, encoding="utf-8") as f:
+            self.assertIn(self.key, json.load(f))
+        self.assertIsNotNone(ReplanCache(path=self.path).get(self.key))
+        # Invalidation is persisted too
+        cache.invalidate(self.key)
+        asyncio.run(cache.flush())
+        self.assertIsNone(ReplanCache(path=self.path).get(self.key))
+
+
+@unittest.skipIf(ReplanCache is None, "pydantic is not installed")
+class ReplanOutputTest(unittest.TestCase):
+    def test_out_of_range_choice_falls_back_to_first(self):
+        out = _output()
+        out.chosen = 5
+        self.assertIs(out.chosen_alternative(), out.alternatives[0])
+
+    def test_render_for_history(self):
+        out = _output()
+        out.alternatives.append(ReplanAlternative(approach="Go back to the home page", first_action="go_back", confidence=0.3))
+        text = out.render_for_history()
+        self.assertIn("Try next: Use the site search box", text)
+        self.assertIn("If that fails: Go back to the home page", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
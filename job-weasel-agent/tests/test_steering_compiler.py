@@ -0,0 +1,72 @@
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from steering_compiler import DEFAULT_DOCS, SteeringCompiler, _repo_root, parse_doc  # noqa: E402
+
+# Phrases from the real docs that are notes for whoever builds the agent, not for the agent.
+_DEVELOPER_NOTES = (
+    "Only inject profile",
+    "Add an explicit instruction",
+    "confirmation gate",
+    "Fuse calls",
+    "Keep one Browser session",
+    "Default to headless",
+    "Standardize a",
+    "Pick one primary client",
+)
+
+
+class CompiledRealDocsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        compiler = SteeringCompiler(path=os.path.join(self.tmp.name, "steering_compiled.json"))
+        self.assertTrue(compiler._source_paths(), "steering docs not found next to the package")
+        self.compiled = compiler.compile()
+        self.doc_rules = [r for r in self.compiled.rules if r.source != "builtin"]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_no_developer_notes_in_rules(self):
+        for rule in self.doc_rules:
+            for phrase in _DEVELOPER_NOTES:
+                self.assertNotIn(phrase.lower(), rule.text.lower(), rule.source)
+            self.assertIsNone(re.search(r"\b(inject|Gemini|Browser-Use)\b", rule.text), rule.text)
+
+    def test_quoted_agent_instruction_is_kept(self):
+        texts = [r.text for r in self.doc_rules]
+        self.assertIn("Pause and ask for confirmation before submitting payment / irreversible actions.", texts)
+        self.assertTrue(any("captcha" in t.lower() and "switch website" in t for t in texts))
+
+    def test_rendered_prompt_is_clean(self):
+        for task_type in ("", "shopping", "job_application", "job_search"):
+            for failure_class in ("", "blocked", "llm_parse"):
+                text = self.compiled.render(task_type=task_type, failure_class=failure_class)
+                for phrase in _DEVELOPER_NOTES:
+                    self.assertNotIn(phrase.lower(), text.lower())
+
+
+class ParseDocTest(unittest.TestCase):
+    def test_only_agent_sections(self):
+        doc = (
+            "# Title\n"
+            "### Improvements to planning\n"
+            "- Ask the user which site to use before searching for jobs.\n"
+            "### Safety prompting\n"
+            "- Never enter card numbers without the user confirming first.\n"
+        )
+        texts = [r.text for r in parse_doc("X.md", doc)]
+        self.assertEqual(texts, ["Never enter card numbers without the user confirming first."])
+
+    def test_default_docs_exist(self):
+        for name in DEFAULT_DOCS:
+            self.assertTrue(os.path.exists(os.path.join(_repo_root(), name)), name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from streaming_agent import EarlyActionRunner, IncrementalActionParser  # noqa: E402
+except ImportError:  # browser_use not installed
+    IncrementalActionParser = None
+
+_DOC = {
+    "thinking": 'Need the "Jobs" tab {first}',
+    "evaluation_previous_goal": "Success",
+    "memory": "on home page",
+    "next_goal": "Search",
+    "action": [
+        {"click": {"index": 4}},
+        {"input_text": {"index": 7, "text": "react } developer ]"}},
+        {"send_keys": {"keys": "Enter"}},
+    ],
+}
+
+
+def _feed_in_chunks(parser, text, size):
+    out = []
+    for i in range(0, len(text), size):
+        out.append(parser.feed(text[i : i + size]))
+    return out
+
+
+@unittest.skipIf(IncrementalActionParser is None, "browser_use is not installed")
+class IncrementalActionParserTest(unittest.TestCase):
+    def test_actions_in_order_for_any_chunking(self):
+        text = json.dumps(_DOC)
+        for size in (1, 3, 17, len(text)):
+            with self.subTest(size=size):
+                parser = IncrementalActionParser()
+                actions = [a for chunk in _feed_in_chunks(parser, text, size) for a in chunk]
+                self.assertEqual(actions, _DOC["action"])
+
+    def test_action_emitted_as_soon_as_it_closes(self):
+        parser = IncrementalActionParser()
+        self.assertEqual(parser.feed('{"thinking": "x", "action": [{"click": {"index": 4}}'), [{"click": {"index": 4}}])
+        self.assertEqual(parser.feed(', {"scroll": {"down": tr'), [])
+        self.assertEqual(parser.feed("ue}}"), [{"scroll": {"down": True}}])
+
+    def test_only_top_level_action_array(self):
+        text = json.dumps({"memory": {"action": [{"click": {"index": 1}}]}, "action": [{"go_back": {}}], "extra": [{"a": 1}]})
+        parser = IncrementalActionParser()
+        self.assertEqual(parser.feed(text), [{"go_back": {}}])
+
+    def test_code_fence_and_header(self):
+        parser = IncrementalActionParser()
+        text = "```json\n" + json.dumps(_DOC)[:60]
+        parser.feed(text)
+        self.assertEqual(parser.header()["thinking"], _DOC["thinking"])
+        self.assertTrue(parser.document().startswith("{"))
+
+
+class _Action:
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def model_validate(cls, raw):
+        if not isinstance(raw, dict) or len(raw) != 1:
+            raise ValueError("not one action")
+        return cls(raw)
+
+    def model_dump(self, **kwargs):
+        return dict(self.data)
+
+
+class _Tools:
+    def __init__(self, hang_on=None):
+        self.hang_on = hang_on
+        self.acted = []
+        self.cancelled = False
+
+    async def act(self, action, **kwargs):
+        name = next(iter(action.data))
+        self.acted.append(name)
+        if name == self.hang_on:
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+        return SimpleNamespace(is_done=name == "done", error="boom" if name == "fail" else None)
+
+
+def _agent(tools):
+    async def _no_pause():
+        return None
+
+    return SimpleNamespace(
+        ActionModel=_Action,
+        tools=tools,
+        browser_profile=SimpleNamespace(wait_between_actions=0),
+        browser_session=None,
+        file_system=None,
+        settings=SimpleNamespace(page_extraction_llm=None),
+        sensitive_data=None,
+        available_file_paths=None,
+        _check_stop_or_pause=_no_pause,
+        _log_action=lambda *args: None,
+    )
+
+
+@unittest.skipIf(IncrementalActionParser is None, "browser_use is not installed")
+class EarlyActionRunnerTest(unittest.TestCase):
+    def test_runs_streamed_then_remaining_actions(self):
+        async def run():
+            tools = _Tools()
+            runner = EarlyActionRunner(_agent(tools), None, limit=10)
+            runner.submit({"click": {"index": 1}})
+            actions = [_Action({"click": {"index": 1}}), _Action({"scroll": {}})]
+            results = await runner.finish(actions)
+            return tools.acted, len(results)
+
+        self.assertEqual(asyncio.run(run()), (["click", "scroll"], 2))
+
+    def test_invalid_action_leaves_rest_to_multi_act(self):
+        runner = EarlyActionRunner(_agent(_Tools()), None, limit=10)
+        runner.submit({"click": {}, "scroll": {}})
+        runner.submit({"click": {"index": 1}})
+        self.assertTrue(runner.rejected)
+        self.assertEqual(runner.dispatched, [])
+
+    def test_error_stops_and_late_done_is_skipped(self):
+        async def run():
+            tools = _Tools()
+            runner = EarlyActionRunner(_agent(tools), None, limit=10)
+            for raw in ({"click": {}}, {"done": {}}, {"scroll": {}}):
+                runner.submit(raw)
+            await runner.finish([])
+            failing = _Tools()
+            runner = EarlyActionRunner(_agent(failing), None, limit=10)
+            for raw in ({"fail": {}}, {"scroll": {}}):
+                runner.submit(raw)
+            await runner.finish([])
+            return tools.acted, failing.acted
+
+        self.assertEqual(asyncio.run(run()), (["click"], ["fail"]))
+
+    def test_aclose_cancels_running_action(self):
+        async def run():
+            tools = _Tools(hang_on="wait")
+            runner = EarlyActionRunner(_agent(tools), None, limit=10)
+            runner.submit({"wait": {}})
+            await asyncio.sleep(0.01)
+            await runner.aclose()
+            return tools.cancelled, runner._task.done()
+
+        self.assertEqual(asyncio.run(run()), (True, True))
+
+    def test_caller_cancellation_propagates(self):
+        async def run():
+            tools = _Tools(hang_on="wait")
+            runner = EarlyActionRunner(_agent(tools), None, limit=10)
+
+            async def step():
+                runner.submit({"wait": {}})
+                try:
+                    await asyncio.sleep(3600)
+                finally:
+                    await runner.aclose()
+
+            task = asyncio.create_task(step())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return tools.cancelled
+
+        self.assertTrue(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from browser_use.llm.exceptions import ModelProviderError  # noqa: E402
+    from pydantic import BaseModel  # noqa: E402
+
+    import structured_output  # noqa: E402
+    from structured_output import ainvoke_structured, parse_output, repair_json  # noqa: E402
+except ImportError:  # browser_use not installed
+    structured_output = None
+    BaseModel = object
+
+
+class _Out(BaseModel):
+    answer: str
+    score: int = 0
+
+
+class _Resp:
+    def __init__(self, completion):
+        self.completion = completion
+
+
+class _LLM:
+    """Native schema call raises `first`; plain-text repair calls return `repair_text`."""
+
+    def __init__(self, first, repair_text='{"answer": "fixed"}'):
+        self.first = first
+        self.repair_text = repair_text
+        self.calls = []
+
+    async def ainvoke(self, messages, output_format=None):
+        self.calls.append(output_format)
+        if output_format is not None:
+            if isinstance(self.first, BaseException):
+                raise self.first
+            return _Resp(self.first)
+        return _Resp(self.repair_text)
+
+
+def _provider_parse_error():
+    try:
+        json.loads("{oops")
+    except ValueError as e:
+        try:
+            raise ModelProviderError("Failed to parse or validate response", status_code=500) from e
+        except ModelProviderError as wrapped:
+            return wrapped
+
+
+@unittest.skipIf(structured_output is None, "browser_use is not installed")
+class RepairJsonTest(unittest.TestCase):
+    def test_fences_and_prose(self):
+        text = 'Sure! Here it is:\n```json\n{"answer": "x"}\n```'
+        self.assertEqual(json.loads(repair_json(text)), {"answer": "x"})
+        self.assertEqual(json.loads(repair_json('{"answer": "x"} hope this helps {')), {"answer": "x"})
+
+    def test_trailing_commas(self):
+        self.assertEqual(json.loads(repair_json('{"a": [1, 2,], "b": 3,}')), {"a": [1, 2], "b": 3})
+
+    def test_truncated_output(self):
+        self.assertEqual(json.loads(repair_json('{"a": {"b": [1, 2')), {"a": {"b": [1, 2]}})
+        self.assertEqual(json.loads(repair_json('{"answer": "cut off mid')), {"answer": "cut off mid"})
+
+    def test_braces_inside_strings(self):
+        text = '{"answer": "use } and { freely", "score": 1} trailing'
+        self.assertEqual(json.loads(repair_json(text)), {"answer": "use } and { freely", "score": 1})
+
+
+@unittest.skipIf(structured_output is None, "browser_use is not installed")
+class ParseOutputTest(unittest.TestCase):
+    def test_valid_and_repaired(self):
+        self.assertEqual(parse_output(_Out, '{"answer": "a", "score": 2}').score, 2)
+        self.assertEqual(parse_output(_Out, '```json\n{"answer": "a",}\n```').answer, "a")
+
+    def test_schema_mismatch(self):
+        self.assertIsNone(parse_output(_Out, '{"score": 2}'))
+        self.assertIsNone(parse_output(_Out, "no json here"))
+
+
+@unittest.skipIf(structured_output is None, "browser_use is not installed")
+class AinvokeStructuredTest(unittest.TestCase):
+    def setUp(self):
+        os.environ.pop("WEASZEL_SCHEMA_REPAIR_CALLS", None)
+
+    def test_native_success(self):
+        llm = _LLM(_Out(answer="ok"))
+        self.assertEqual(asyncio.run(ainvoke_structured(llm, [], _Out, name="t.ok")).answer, "ok")
+        self.assertEqual(llm.calls, [_Out])
+
+    def test_string_completion_parsed_locally(self):
+        llm = _LLM('```json\n{"answer": "ok",}\n```')
+        self.assertEqual(asyncio.run(ainvoke_structured(llm, [], _Out, name="t.str")).answer, "ok")
+        self.assertEqual(len(llm.calls), 1)
+
+    def test_provider_parse_error_is_repaired(self):
+        llm = _LLM(_provider_parse_error())
+        self.assertEqual(asyncio.run(ainvoke_structured(llm, [], _Out, name="t.repair")).answer, "fixed")
+        self.assertEqual(llm.calls, [_Out, None])
+        stats = structured_output.structured_stats()["t.repair"]
+        self.assertEqual((stats["repaired"], stats["wasted_calls"]), (1, 1))
+
+    def test_other_provider_errors_propagate(self):
+        llm = _LLM(ModelProviderError("could not parse quota: 503 service unavailable", status_code=503))
+        with self.assertRaises(ModelProviderError):
+            asyncio.run(ainvoke_structured(llm, [], _Out, name="t.raise"))
+        self.assertEqual(len(llm.calls), 1)
+
+    def test_gives_up_after_repair_budget(self):
+        os.environ["WEASZEL_SCHEMA_REPAIR_CALLS"] = "2"
+        try:
+            llm = _LLM(_provider_parse_error(), repair_text="still not json")
+            self.assertIsNone(asyncio.run(ainvoke_structured(llm, [], _Out, name="t.fail")))
+        finally:
+            os.environ.pop("WEASZEL_SCHEMA_REPAIR_CALLS", None)
+        self.assertEqual(llm.calls, [_Out, None, None])
+        self.assertEqual(structured_output.structured_stats()["t.fail"]["wasted_calls"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_profile import ProfileCardCache, build_profile_card, compile_profile, render_profile_card  # noqa: E402
+
+_USER_DATA = """\
+## Candidate Profile
+Name: Ada Lovelace
+**Email:** ada@example.com
+- Phone (mobile): 555-0100
+Address: 12 Analytical Way, London, UK
+Links: https://github.com/ada, linkedin.com/in/ada.
+Visa Status: No sponsorship needed
+Favourite editor: vim
+
+**Target Job Titles:**
+- Software Engineer
+- Compiler Engineer
+
+Resume is at `/home/ada/cv.pdf`
+"""
+
+
+class CompileProfileTest(unittest.TestCase):
+    def setUp(self):
+        self.profile = compile_profile(_USER_DATA)
+
+    def test_labelled_fields(self):
+        p = self.profile
+        self.assertEqual((p.name, p.email, p.phone), ("Ada Lovelace", "ada@example.com", "555-0100"))
+        self.assertEqual(p.location, "12 Analytical Way, London, UK")
+        self.assertEqual(p.work_authorization, "No sponsorship needed")
+        self.assertEqual((p.first_name, p.last_name), ("Ada", "Lovelace"))
+
+    def test_links_are_split_by_host(self):
+        self.assertEqual(self.profile.github, "https://github.com/ada")
+        self.assertEqual(self.profile.linkedin, "https://linkedin.com/in/ada")
+
+    def test_bullet_list_under_empty_label(self):
+        self.assertEqual(self.profile.target_titles, "Software Engineer, Compiler Engineer")
+
+    def test_resume_path_found_in_prose(self):
+        self.assertEqual(self.profile.resume_path, "/home/ada/cv.pdf")
+
+    def test_unknown_labels_kept_in_extra(self):
+        self.assertEqual(self.profile.extra, {"favourite editor": "vim"})
+
+    def test_field_values_for_forms(self):
+        values = self.profile.field_values()
+        self.assertEqual(values["city"], "London")
+        self.assertEqual(values["website"], self.profile.github)
+        self.assertNotIn("salary", values)
+
+    def test_empty_input(self):
+        self.assertTrue(compile_profile("").is_empty())
+        self.assertTrue(compile_profile("# Just a heading\nSome prose.").is_empty())
+
+
+class ProfileCardTest(unittest.TestCase):
+    def setUp(self):
+        self.card = build_profile_card(compile_profile(_USER_DATA))
+
+    def test_empty_values_dropped(self):
+        self.assertNotIn("salary", self.card["job"])
+        self.assertEqual(self.card["shopping"], {"shipping_location": "12 Analytical Way, London, UK"})
+
+    def test_sections_per_task_type(self):
+        job = json.loads(render_profile_card(self.card, "job_application"))
+        self.assertEqual(set(job), {"identity", "job", "notes"})
+        # Searches planned from "apply to ..." queries still know who is applying
+        self.assertEqual(set(json.loads(render_profile_card(self.card, "job_search"))), {"identity", "job", "notes"})
+        self.assertEqual(set(json.loads(render_profile_card(self.card, "shopping"))), {"identity", "shopping", "notes"})
+        self.assertEqual(set(json.loads(render_profile_card(self.card, "research"))), {"identity", "notes"})
+
+    def test_free_form_notes_rendered(self):
+        rendered = json.loads(render_profile_card(self.card, "flight_search"))
+        self.assertEqual(rendered["notes"], {"favourite editor": "vim"})
+
+    def test_compact_and_empty(self):
+        self.assertEqual(render_profile_card({"identity": {"name": "A B"}}, "shopping"), '{"identity":{"name":"A B"}}')
+        self.assertEqual(render_profile_card(build_profile_card(compile_profile("")), "job_application"), "")
+
+
+class ProfileCardCacheTest(unittest.TestCase):
+    def test_reused_from_disk_until_content_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "profile_card.json")
+            _, card = ProfileCardCache(path).get(_USER_DATA)
+            fresh = ProfileCardCache(path)
+            profile, cached = fresh.get(_USER_DATA)
+            self.assertEqual((profile.name, cached), ("Ada Lovelace", card))
+            profile, _ = fresh.get(_USER_DATA.replace("Ada Lovelace", "Grace Hopper"))
+            self.assertEqual(profile.name, "Grace Hopper")
+
+
+if __name__ == "__main__":
+    unittest.main()
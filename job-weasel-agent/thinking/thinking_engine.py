@@ -9,9 +9,14 @@ from pydantic import BaseModel, Field
 from browser_use.llm.google.chat import ChatGoogle
 from browser_use.llm.messages import UserMessage
 
+from failure_classifier import classify_step
+from llm_scheduler import Priority
+from perf_context import current_step
+from thinking_cache import fingerprint, get_thinking_cache
 from thinking.context import current_failure_count, current_goal, current_last_error, current_speed_mode, current_task_type
-from thinking.steering_loader import SteeringLoader
+from steering_compiler import get_compiled_steering
 from thinking.working_memory import WorkingMemory
+from timed_llm import TimedLLM
 
 
 class DeepThinkOutput(BaseModel):
@@ -43,18 +48,15 @@ class ThinkingEngine:
 
     def __init__(self, memory: WorkingMemory, repo_root: str | None = None):
         self.memory = memory
-        self.steering_loader = SteeringLoader(repo_root=repo_root)
-        self._steering_cached: str | None = None
+        self.repo_root = repo_root
 
         self.deep_model_name = os.environ.get("WEASZEL_DEEP_THINK_MODEL", "gemini-2.5-flash-lite")
-        self._deep_llm: ChatGoogle | None = None
+        self._deep_llm: TimedLLM | None = None
+        self.cache = get_thinking_cache()
 
     def steering_text(self) -> str:
-        if self._steering_cached is not None:
-            return self._steering_cached
-        docs = self.steering_loader.load()
-        self._steering_cached = self.steering_loader.extract_principles(docs)
-        return self._steering_cached
+        # Compiled once per process (logs/steering_compiled.json); only rules for this task type
+        return get_compiled_steering(self.repo_root).render(task_type=current_task_type.get() or "", outer=None)
 
     def should_deep_think(self, task: str) -> bool:
         if os.environ.get("WEASZEL_DEEP_THINK", "auto").lower() in ("0", "false", "off", "no"):
@@ -73,7 +75,7 @@ class ThinkingEngine:
 
     def build_context(self, task: str) -> ThinkContext:
         steering = self.steering_text()
-        memory_text = self.memory.to_prompt()
+        memory_text = self.memory.to_prompt(query=task, task_type=current_task_type.get() or "")
         return ThinkContext(
             task=task,
             goal=current_goal.get(),
@@ -122,11 +124,27 @@ class ThinkingEngine:
         }
 
     async def deep_think(self, ctx: ThinkContext) -> DeepThinkOutput:
+        failure = classify_step(errors=[ctx.last_error], eval_text="") if ctx.last_error else None
+        cache_key = fingerprint(
+            "deep",
+            task=ctx.task,
+            failure_class=failure.cls if failure else "",
+            step=current_step.get() or 1,
+            task_type=ctx.task_type or "",
+            failures=min(ctx.failures, 3),
+        )
+        cached = self.cache.get("deep", cache_key)
+        if cached is not None:
+            try:
+                return DeepThinkOutput.model_validate(cached)
+            except Exception:
+                pass
+
         if self._deep_llm is None:
-            self._deep_llm = ChatGoogle(
-                model=self.deep_model_name,
-                api_key=os.getenv("GEMINI_API_KEY"),
-                temperature=0.0,
+            self._deep_llm = TimedLLM(
+                ChatGoogle(model=self.deep_model_name, api_key=os.getenv("GEMINI_API_KEY"), temperature=0.0),
+                priority=Priority.THINKING,
+                site="thinking",
             )
 
         prompt = f"""You are Weaszel's deep reasoning layer.
@@ -155,6 +173,8 @@ THINK:
 Return JSON per the schema."""
 
         res = await self._deep_llm.ainvoke([UserMessage(content=prompt)], output_format=DeepThinkOutput)
+        self.cache.put("deep", cache_key, res.completion.model_dump())
+        await self.cache.flush()
         return res.completion
 
 
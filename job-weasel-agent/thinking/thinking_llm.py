@@ -1,41 +1,43 @@
 from __future__ import annotations
 
+import json
 import os
 from typing import Any
 
 from browser_use.llm.messages import SystemMessage
 
+from llm_middleware import Handler, LLMCall, Middleware
+from llm_scheduler import Priority
 from perf_context import current_step, current_task_id
 from perf_logger import emit, span
+from prompt_budget import Section, fit
 from thinking.thinking_engine import ThinkingEngine
 from thinking.working_memory import WorkingMemory
+from timed_llm import TimedLLM
 
 
-class ThinkingLLM:
+class ThinkingInjection(Middleware):
     """
-    Injects a "thinking layer" into each LLM call without adding overhead by default.
+    Middleware that injects a "thinking layer" into each LLM call without adding overhead by default.
 
     - Always runs quick_think() (rule-based).
     - Optionally runs deep_think() (LLM) when WEASZEL_DEEP_THINK triggers.
     - Injects steering principles + working memory + thinking output as a SystemMessage.
     """
 
-    def __init__(self, llm: Any, engine: ThinkingEngine, memory: WorkingMemory):
-        self._llm = llm
-        self.engine = engine
-        self.memory = memory
+    name = "thinking"
 
-    def __getattr__(self, item: str) -> Any:
-        return getattr(self._llm, item)
+    def __init__(self, engine: ThinkingEngine):
+        self.engine = engine
 
-    async def ainvoke(self, messages: list[Any], *args: Any, **kwargs: Any) -> Any:
+    async def __call__(self, call: LLMCall, call_next: Handler) -> Any:
         if os.environ.get("WEASZEL_THINKING", "1").lower() in ("0", "false", "off", "no"):
-            return await self._llm.ainvoke(messages, *args, **kwargs)
+            return await call_next(call)
 
         # Best-effort extract a task string from the latest user message
         task = ""
         try:
-            for m in reversed(messages):
+            for m in reversed(call.messages):
                 if getattr(m, "role", None) == "user":
                     task = m.content if isinstance(m.content, str) else str(m.content)
                     break
@@ -45,23 +47,31 @@ class ThinkingLLM:
         ctx = self.engine.build_context(task=task)
         quick = self.engine.quick_think(ctx)
 
+        # Compact quick_think: drop empty fields instead of the full dict repr
+        quick_text = "quick_think=" + json.dumps({k: v for k, v in quick.items() if v}, ensure_ascii=False)
+        fitted = fit(
+            [
+                Section("quick_think", quick_text),
+                Section("working_memory", f"<working_memory>\n{ctx.memory}\n</working_memory>" if ctx.memory else ""),
+                Section("steering", f"<steering_principles>\n{ctx.steering}\n</steering_principles>" if ctx.steering else ""),
+            ],
+            where="thinking_llm",
+        )
+
         injected_parts = [
             "<weaszel_thinking>",
             f"task_id={current_task_id.get()} step={current_step.get()}",
-            f"quick_think={quick}",
         ]
-        if ctx.memory:
-            injected_parts.append(f"<working_memory>\n{ctx.memory}\n</working_memory>")
-        if ctx.steering:
-            injected_parts.append(f"<steering_principles>\n{ctx.steering}\n</steering_principles>")
+        injected_parts.extend(t for t in (fitted["quick_think"], fitted["working_memory"], fitted["steering"]) if t)
         injected_parts.append(
             "RULES: Think before acting. Consider at least 2 options, pick safest+fastest, avoid repeating failed actions. "
             "Batch simple actions, and add fallback strategies if blocked."
         )
         injected_parts.append("</weaszel_thinking>")
 
-        # Optional deep-think (only on anomalies/risk)
-        if self.engine.should_deep_think(task):
+        # Optional deep-think (only on anomalies/risk); decided once per call
+        deep_enabled = self.engine.should_deep_think(task)
+        if deep_enabled:
             with span("thinking.deep", task_id=current_task_id.get(), step=current_step.get()):
                 deep = await self.engine.deep_think(ctx)
             injected_parts.append(f"<deep_think>{deep.model_dump()}</deep_think>")
@@ -69,8 +79,17 @@ class ThinkingLLM:
         sys_msg = SystemMessage(content="\n".join(injected_parts), cache=True)
 
         # Place injected system message before the rest so it conditions the step
-        new_messages = [sys_msg, *messages]
-        emit("thinking.injected", task_id=current_task_id.get(), step=current_step.get(), deep=self.engine.should_deep_think(task))
-        return await self._llm.ainvoke(new_messages, *args, **kwargs)
+        call.messages = [sys_msg, *call.messages]
+        call.meta["deep_think"] = deep_enabled
+        emit("thinking.injected", task_id=current_task_id.get(), step=current_step.get(), deep=deep_enabled)
+        return await call_next(call)
+
 
+class ThinkingLLM(TimedLLM):
+    """TimedLLM with the ThinkingInjection layer right below the before_invoke hooks."""
 
+    def __init__(self, llm: Any, engine: ThinkingEngine, memory: WorkingMemory, site: str = "agent"):
+        super().__init__(llm, priority=Priority.FOREGROUND, site=site)
+        self.engine = engine
+        self.memory = memory
+        self.use(ThinkingInjection(engine), after="hooks")
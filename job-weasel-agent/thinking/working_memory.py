@@ -6,6 +6,8 @@ import time
 from dataclasses import dataclass
 from typing import Any
 
+from memory_store import MemoryStore
+
 
 @dataclass
 class MemoryItem:
@@ -16,57 +18,49 @@ class MemoryItem:
 
 class WorkingMemory:
     """
-    Small persistent memory intended for *prompt injection* (short, pruned).
-    Stored as JSON for debuggability.
+    Small memory view intended for *prompt injection* (short, relevant).
+    Backed by the shared MemoryStore (SQLite, single-row writes); `path` is only used to
+    import the old JSON file once.
     """
 
-    def __init__(self, path: str | None = None, max_items: int = 50):
+    def __init__(self, path: str | None = None, max_items: int = 50, store: MemoryStore | None = None):
         self.path = path or os.path.abspath("logs/working_memory.json")
         self.max_items = max_items
-        self._items: list[MemoryItem] = []
+        self._store = store
         self._loaded = False
 
     def load(self) -> None:
         if self._loaded:
             return
         self._loaded = True
-        try:
-            with open(self.path, "r", encoding="utf-8") as f:
-                raw = json.load(f)
-            items = []
-            for x in raw.get("items", []):
-                items.append(MemoryItem(ts=float(x["ts"]), kind=str(x["kind"]), data=dict(x["data"])))
-            self._items = items[-self.max_items :]
-        except FileNotFoundError:
-            self._items = []
-        except Exception:
-            # If corrupted, start fresh; do not break the agent.
-            self._items = []
+        if self._store is None:
+            self._store = MemoryStore(legacy_json=self.path)
 
-    def _persist(self) -> None:
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        data = {"items": [{"ts": i.ts, "kind": i.kind, "data": i.data} for i in self._items[-self.max_items :]]}
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    @staticmethod
+    def _text(data: dict[str, Any]) -> str:
+        if "text" in data:
+            return str(data["text"])
+        return json.dumps(data, ensure_ascii=False, default=str)
 
     def add(self, kind: str, **data: Any) -> None:
         self.load()
-        self._items.append(MemoryItem(ts=time.time(), kind=kind, data=data))
-        self._items = self._items[-self.max_items :]
-        self._persist()
+        tags = {k: str(data.pop(k)) for k in ("domain", "task_type", "failure_class") if k in data}
+        self._store.add(kind, self._text(data), **tags)
+
+    def items(self) -> list[MemoryItem]:
+        self.load()
+        return [MemoryItem(ts=r.last_seen, kind=r.kind, data={"text": r.text}) for r in self._store.recent(self.max_items)]
 
-    def to_prompt(self, max_chars: int = 800) -> str:
+    def to_prompt(self, max_chars: int = 800, query: str = "", **tags: str) -> str:
         self.load()
-        if not self._items:
-            return ""
-        # Keep only recent items, render compactly.
+        records = self._store.search(query, token_budget=max_chars // 4, **tags) if query else []
+        if not records:
+            records = self._store.recent(15)
         lines = []
-        for item in self._items[-15:]:
-            t = time.strftime("%H:%M:%S", time.localtime(item.ts))
-            lines.append(f"- [{t}] {item.kind}: {item.data}")
+        for item in records:
+            t = time.strftime("%H:%M:%S", time.localtime(item.last_seen))
+            lines.append(f"- [{t}] {item.kind}: {item.text}")
         out = "\n".join(lines)
         if len(out) > max_chars:
             out = out[-max_chars:]
         return out
-
-
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+from urllib.parse import parse_qsl, urlsplit
+
+from perf_context import current_step, current_task_id
+from perf_logger import emit
+
+
+_BLOCK_RE = re.compile(r"<(\w+)>.*?</\1>", re.S)
+_URL_RE = re.compile(r"https?://\S+")
+_EMAIL_RE = re.compile(r"\S+@\S+\.\w+")
+_QUOTED_RE = re.compile(r"\"[^\"]*\"|'[^']*'")
+_NUM_RE = re.compile(r"\d+(?:[.,]\d+)*")
+_ID_SEGMENT_RE = re.compile(r"^(?=.*\d)[\w-]{6,}$|^\d+$")
+
+
+def task_template(task: str) -> str:
+    """
+    The task with numbers, quotes, URLs and emails replaced by placeholders, so "top 5 jobs
+    under $120k" and "top 10 jobs under $90k" share a template. Injected <...> blocks (profile,
+    done policy, memory) are dropped; they don't change what the next step should be.
+    """
+    t = _BLOCK_RE.sub(" ", task or "")
+    t = _URL_RE.sub("<url>", t)
+    t = _EMAIL_RE.sub("<email>", t)
+    t = _QUOTED_RE.sub("<q>", t)
+    t = _NUM_RE.sub("<n>", t)
+    return " ".join(t.lower().split())[:2000]
+
+
+def url_pattern(url: str) -> str:
+    """host + path with id-like segments collapsed + sorted query keys (values dropped)."""
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return ""
+    host = (parts.hostname or "").lower().removeprefix("www.")
+    segs = ["*" if _ID_SEGMENT_RE.match(s) else s.lower() for s in parts.path.split("/") if s]
+    keys = sorted({k for k, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    return host + "/" + "/".join(segs) + (("?" + "&".join(keys)) if keys else "")
+
+
+def step_bucket(step: int) -> str:
+    """1, 2-3, 4-7, 8-15, 16+: early steps matter most, later ones look alike."""
+    if step <= 1:
+        return "1"
+    lo = 1 << (max(step, 2).bit_length() - 1)
+    return "16+" if lo >= 16 else f"{lo}-{2 * lo - 1}"
+
+
+def fingerprint(
+    kind: str,
+    *,
+    task: str,
+    url: str = "",
+    failure_class: str = "",
+    step: int = 1,
+    **extra: Any,
+) -> str:
+    parts = [kind, task_template(task), url_pattern(url), failure_class or "", step_bucket(step)]
+    parts += [f"{k}={extra[k]}" for k in sorted(extra)]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ThinkingCache:
+    """
+    Thinking outputs keyed by situation fingerprint (task template, URL pattern, failure
+    class, step bucket), so a situation seen before reuses the earlier answer.
+
+    LRU with TTL (WEASZEL_THINKING_CACHE_TTL_H, default 24h; WEASZEL_THINKING_CACHE=0 disables),
+    persisted to logs/thinking_cache.json. put() only touches memory; flush() writes pending
+    entries off the event loop. Every lookup emits thinking.cache with running hit/miss
+    counts per kind.
+    """
+
+    def __init__(self, path: str | None = None, max_entries: int = 500, ttl_s: float | None = None):
+        self.path = path or os.path.abspath("logs/thinking_cache.json")
+        self.max_entries = max_entries
+        if ttl_s is None:
+            try:
+                ttl_s = float(os.environ.get("WEASZEL_THINKING_CACHE_TTL_H", "24")) * 3600
+            except ValueError:
+                ttl_s = 24 * 3600
+        self.ttl_s = ttl_s
+        self.enabled = os.environ.get("WEASZEL_THINKING_CACHE", "1").lower() not in ("0", "off", "false", "no")
+        self._items: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._stats: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            now = time.time()
+            for k, v in raw.items():
+                if now - float(v.get("ts", 0)) <= self.ttl_s:
+                    self._items[k] = v
+        except (OSError, ValueError, AttributeError, TypeError):
+            self._items = OrderedDict()
+
+    def _save(self, payload: dict[str, Any]) -> None:
+        # Two flushes can overlap in worker threads; they share the tmp file.
+        with self._save_lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.path)
+
+    async def flush(self) -> None:
+        """Persist pending puts (no-op when nothing changed since the last flush)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            payload = dict(self._items)
+        try:
+            await asyncio.to_thread(self._save, payload)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+
+    def _record(self, kind: str, hit: bool) -> None:
+        hits_misses = self._stats.setdefault(kind, [0, 0])
+        hits_misses[0 if hit else 1] += 1
+        hits, misses = hits_misses
+        emit(
+            "thinking.cache",
+            task_id=current_task_id.get(),
+            step=current_step.get(),
+            kind=kind,
+            hit=hit,
+            hits=hits,
+            misses=misses,
+            hit_rate=round(hits / (hits + misses), 3),
+        )
+
+    def get(self, kind: str, key: str) -> dict[str, Any] | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None and time.time() - float(entry.get("ts", 0)) > self.ttl_s:
+                self._items.pop(key, None)
+                entry = None
+            if entry is not None:
+                self._items.move_to_end(key)
+            self._record(kind, hit=entry is not None)
+        return dict(entry["output"]) if entry is not None else None
+
+    def put(self, kind: str, key: str, output: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._items[key] = {"ts": time.time(), "kind": kind, "output": output}
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+            self._dirty = True
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        with self._lock:
+            return {
+                kind: {"hits": h, "misses": m, "hit_rate": round(h / (h + m), 3) if h + m else 0.0}
+                for kind, (h, m) in self._stats.items()
+            }
+
+
+_cache: ThinkingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_thinking_cache() -> ThinkingCache:
+    """Process-wide cache shared by both thinking engines."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ThinkingCache()
+        return _cache
@@ -1,33 +1,63 @@
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import Any
+import time
+from typing import Any, Callable
 
 from browser_use.agent.message_manager.views import HistoryItem
 from browser_use.agent.service import Agent
+from browser_use.llm.messages import UserMessage
 
 from perf_context import current_step, current_task_id
 from perf_logger import emit
-from thinking_engine import ThinkingEngine
+from bot_wall import domain_of
+from thinking_engine import StepOutcome, ThinkingEngine, ThinkOutput
+from reflection_queue import ReflectionQueue
+from prompt_budget import Section, fit, task_sections
 
 
 def _enabled() -> bool:
     return os.environ.get("WEASZEL_THINKING_MODE", "quick").lower() not in ("0", "off", "false", "no")
 
 
+def _deadline_s() -> float:
+    # How long the main LLM call may wait for still-running pre-step thinking, measured from launch.
+    return float(os.environ.get("WEASZEL_THINKING_DEADLINE_MS", "2500")) / 1000.0
+
+
 class ThinkingController:
     """
     Integrates ThinkingEngine into the Browser-Use loop via hooks.
 
     Strategy:
-    - On step start: generate short pre-step thinking and inject as a system history item.
-      This makes it visible to Browser-Use MessageManager's agent_history_description.
-    - On step end: reflect and update working memory.
+    - On step start: launch pre-step thinking as a background task, so it overlaps with
+      Browser-Use's DOM/screenshot capture instead of delaying it.
+    - Right before the step's LLM call (TimedLLM.before_invoke): if thinking is done, or finishes
+      within the deadline, attach it to that call. Otherwise carry it forward and inject it
+      into agent history at the next step start.
+    - On step end: queue the outcome for batched reflection (ReflectionQueue), off the step loop.
     """
 
-    def __init__(self, engine: ThinkingEngine, task: str):
+    def __init__(
+        self,
+        engine: ThinkingEngine,
+        task: str,
+        task_type: str = "",
+        failure_class_of: Callable[[], str] | None = None,
+    ):
         self.engine = engine
         self.task = task
+        self.task_type = task_type
+        # Latest failure class from the retry controller (tags memory reads/writes)
+        self.failure_class_of = failure_class_of or (lambda: "")
+        self.task_id = current_task_id.get()
+        self._pending: asyncio.Task[ThinkOutput | None] | None = None
+        self._pending_step = 0
+        self._launched_at = 0.0
+        self.reflections = ReflectionQueue(engine, task, task_type=task_type)
+        # Done policy / profile blocks ride along in every step prompt
+        self._task_sections = task_sections(task)
 
     def _get_state_hint(self, agent: Agent) -> str:
         # Best-effort: use cached browser summary if available, otherwise minimal.
@@ -41,6 +71,21 @@ class ThinkingController:
             pass
         return f"url={url or 'unknown'} title={title or 'unknown'}"
 
+    @staticmethod
+    def _get_url(agent: Agent) -> str:
+        bs = getattr(agent.browser_session, "_cached_browser_state_summary", None)
+        return str(getattr(bs, "url", "") or "")
+
+    @classmethod
+    def _get_domain(cls, agent: Agent) -> str:
+        return domain_of(cls._get_url(agent))
+
+    @staticmethod
+    def _get_last_error(agent: Agent) -> str:
+        last_result = getattr(agent.state, "last_result", None) or []
+        errs = [str(getattr(r, "error", "")) for r in last_result if getattr(r, "error", None)]
+        return errs[-1][:500] if errs else ""
+
     def _get_outcome_hint(self, agent: Agent) -> str:
         last_output = getattr(agent.state, "last_model_output", None)
         last_result = getattr(agent.state, "last_result", None) or []
@@ -57,6 +102,44 @@ class ThinkingController:
             parts.append(f"errors={errs[-1]}")
         return " | ".join(parts)[:900]
 
+    @staticmethod
+    def _render(out: ThinkOutput) -> str:
+        snippet_lines = ["<weaszel_thinking>"]
+        if out.reasoning:
+            snippet_lines.append(out.reasoning.strip())
+        if out.recommendations:
+            snippet_lines.append("Recommendations:")
+            snippet_lines.extend([f"- {r}" for r in out.recommendations[:6]])
+        if out.risks:
+            snippet_lines.append("Risks:")
+            snippet_lines.extend([f"- {r}" for r in out.risks[:4]])
+        snippet_lines.append("</weaszel_thinking>")
+        return "\n".join(snippet_lines)
+
+    def _take_result(self) -> ThinkOutput | None:
+        """Consume the finished background task (None on error/cancel)."""
+        task, self._pending = self._pending, None
+        if task is None or task.cancelled():
+            return None
+        try:
+            return task.result()
+        except Exception:
+            return None
+
+    def _emit_overlap(self, outcome: str, *, call_at: float | None = None, waited_s: float = 0.0) -> None:
+        now = time.perf_counter()
+        think_s = now - self._launched_at
+        overlap_s = ((call_at or now) - self._launched_at) - waited_s
+        emit(
+            "thinking.overlap",
+            task_id=current_task_id.get(),
+            step=self._pending_step,
+            outcome=outcome,  # injected | carried | deadline_missed
+            think_ms=round(think_s * 1000.0, 1),
+            overlap_ms=round(max(0.0, min(overlap_s, think_s)) * 1000.0, 1),
+            waited_ms=round(waited_s * 1000.0, 1),
+        )
+
     async def on_step_start(self, agent: Agent) -> None:
         if not _enabled():
             return
@@ -65,40 +148,95 @@ class ThinkingController:
         failures = getattr(agent.state, "consecutive_failures", 0)
         current_step.set(step)
 
+        if self._pending is not None:
+            if not self._pending.done():
+                # Previous step's thinking is still running; don't stack another call on top.
+                return
+            # Missed its step's deadline: carry forward into history for this step.
+            out = self._take_result()
+            if out is not None:
+                self._inject_history(agent, out)
+                self._emit_overlap("carried")
+
+        if not self.engine.should_think(step=step, consecutive_failures=failures, task=self.task):
+            return
+
         state_hint = self._get_state_hint(agent)
-        out = await self.engine.pre_step_think(
-            task=self.task,
-            state_hint=state_hint,
-            step=step,
-            consecutive_failures=failures,
+        self._pending_step = step
+        self._launched_at = time.perf_counter()
+        self._pending = asyncio.create_task(
+            self.engine.pre_step_think(
+                task=self.task,
+                state_hint=state_hint,
+                step=step,
+                consecutive_failures=failures,
+                task_type=self.task_type,
+                domain=self._get_domain(agent),
+                failure_class=self.failure_class_of() if failures else "",
+                url=self._get_url(agent),
+                last_error=self._get_last_error(agent),
+            )
         )
-        if out is None:
-            return
 
-        # Inject into agent history. MessageManager includes this as part of agent_history_description.
+    async def before_llm_call(self, messages: list[Any], kwargs: dict[str, Any]) -> list[Any]:
+        """TimedLLM.before_invoke hook: attach pre-step thinking to this task's step call."""
+        if current_task_id.get() != self.task_id:
+            return messages
+        output_format = kwargs.get("output_format")
+        if "AgentOutput" not in getattr(output_format, "__name__", ""):
+            return messages
+
+        out = await self._await_pending() if self._pending is not None else None
+        # Budget (and log) every step call, also when there's nothing to attach
+        text = self._fit(self._render(out) if out is not None else "", where="step")
+        if not text:
+            return messages
+        emit("thinking.injected", task_id=current_task_id.get(), step=self._pending_step)
+        return [*messages, UserMessage(content=text)]
+
+    async def _await_pending(self) -> ThinkOutput | None:
+        call_at = time.perf_counter()
+        waited_s = 0.0
+        remaining = _deadline_s() - (call_at - self._launched_at)
+        if not self._pending.done() and remaining > 0:
+            await asyncio.wait({self._pending}, timeout=remaining)
+            waited_s = time.perf_counter() - call_at
+        if not self._pending.done():
+            self._emit_overlap("deadline_missed", call_at=call_at, waited_s=waited_s)
+            return None
+
+        self._emit_overlap("injected", call_at=call_at, waited_s=waited_s)
+        return self._take_result()
+
+    def _fit(self, rendered: str, *, where: str) -> str:
+        """Trim the thinking block to what the task-level sections leave of the step budget."""
+        sections = [*self._task_sections, Section("weaszel_thinking", rendered)]
+        return fit(sections, where=where)["weaszel_thinking"]
+
+    def _inject_history(self, agent: Agent, out: ThinkOutput) -> None:
+        # MessageManager includes this as part of agent_history_description.
         try:
             mm = agent.message_manager
-            snippet_lines = ["<weaszel_thinking>"]
-            if out.reasoning:
-                snippet_lines.append(out.reasoning.strip())
-            if out.recommendations:
-                snippet_lines.append("Recommendations:")
-                snippet_lines.extend([f"- {r}" for r in out.recommendations[:6]])
-            if out.risks:
-                snippet_lines.append("Risks:")
-                snippet_lines.extend([f"- {r}" for r in out.risks[:4]])
-            snippet_lines.append("</weaszel_thinking>")
-            snippet = "\n".join(snippet_lines)
-
-            mm.state.agent_history_items.append(HistoryItem(system_message=snippet))
+            text = self._fit(self._render(out), where="history")
+            if not text:
+                return
+            mm.state.agent_history_items.append(HistoryItem(system_message=text))
             # Keep history from bloating too much
             if len(mm.state.agent_history_items) > 50:
                 mm.state.agent_history_items = mm.state.agent_history_items[-50:]
-
-            emit("thinking.injected", task_id=current_task_id.get(), step=step)
+            emit("thinking.injected", task_id=current_task_id.get(), step=self._pending_step, carried=True)
         except Exception:
             return
 
+    async def aclose(self) -> None:
+        """Task end: drop in-flight pre-step thinking, flush queued reflections."""
+        task, self._pending = self._pending, None
+        if task is not None and not task.done():
+            task.cancel()
+            # Wait for the cancel to unwind so the think's scheduler slot is back before the next task starts
+            await asyncio.gather(task, return_exceptions=True)
+        await self.reflections.close()
+
     async def on_step_end(self, agent: Agent) -> None:
         if not _enabled():
             return
@@ -107,6 +245,14 @@ class ThinkingController:
         last_result = getattr(agent.state, "last_result", None) or []
         had_error = any(getattr(r, "error", None) for r in last_result)
         outcome = self._get_outcome_hint(agent)
-        await self.engine.post_step_reflect(task=self.task, outcome_hint=outcome, step=step, had_error=had_error)
+        self.reflections.submit(
+            StepOutcome(
+                step=step,
+                hint=outcome,
+                had_error=had_error,
+                domain=self._get_domain(agent),
+                failure_class=self.failure_class_of() if had_error else "",
+            )
+        )
 
 
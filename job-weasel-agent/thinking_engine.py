@@ -1,22 +1,52 @@
 from __future__ import annotations
 
+import asyncio
 import os
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from typing import Any, Literal
 
 from browser_use.llm.google.chat import ChatGoogle
 from browser_use.llm.messages import UserMessage
+from pydantic import BaseModel, Field
 
 from perf_context import current_step, current_task_id
 from perf_logger import span, emit
 from timed_llm import TimedLLM
-from steering_loader import load_steering_principles
-from working_memory import WorkingMemory
+from llm_middleware import llm_site
+from llm_scheduler import Priority, llm_priority
+from steering_compiler import get_compiled_steering
+from memory_store import MemoryStore
+from prompt_budget import Section, fit
+from thinking_rules import RuleContext, ThinkingRules, min_confidence
+from thinking_cache import fingerprint, get_thinking_cache
+from structured_output import ainvoke_structured
 
 
 ThinkMode = Literal["off", "quick", "deep"]
 
 
+@dataclass
+class StepOutcome:
+    step: int
+    hint: str
+    had_error: bool
+    domain: str = ""
+    failure_class: str = ""
+
+
+class PreThinkOutput(BaseModel):
+    reasoning: str = Field(description="Short paragraph: what is happening and the best next move")
+    confidence: float = Field(ge=0.0, le=1.0)
+    recommendations: list[str] = Field(default_factory=list, description="Concrete next-step bullets")
+    risks: list[str] = Field(default_factory=list, description="What could go wrong and how to verify success")
+
+
+class ReflectionOutput(BaseModel):
+    insights: list[str] = Field(default_factory=list, description="1-4 short reusable insights")
+    mistakes: list[str] = Field(default_factory=list, description="0-2 mistakes to avoid")
+    next_checks: list[str] = Field(default_factory=list, description="0-3 checks for the next steps")
+
+
 @dataclass
 class ThinkOutput:
     reasoning: str
@@ -29,35 +59,42 @@ class ThinkingEngine:
     """
     Self-thinking layer:
     - pre-step: produce short, actionable guidance for the agent
-    - post-step: reflect on outcome and store memory
+    - post-step: reflect on outcome and store memory (MemoryStore, retrieved by relevance)
 
     Designed to be *cheap*:
     - default uses gemini-2.5-flash-lite
     - triggered only on first step, failures, or risky tasks
+    - answered by deterministic rules (thinking_rules.json) when one fires confidently
+    - LLM answers cached per situation fingerprint (ThinkingCache)
     """
 
     def __init__(
         self,
         model_quick: str = "gemini-2.5-flash-lite",
         model_deep: str = "gemini-2.5-pro",
-        max_memory_items: int = 12,
+        memory_token_budget: int = 300,
+        memory: MemoryStore | None = None,
     ):
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in environment variables")
 
         self._api_key = api_key
-        self._llm_quick = TimedLLM(ChatGoogle(model=model_quick, api_key=api_key, temperature=0.0))
-        self._llm_deep = TimedLLM(ChatGoogle(model=model_deep, api_key=api_key, temperature=0.0))
+        self._llm_quick = TimedLLM(ChatGoogle(model=model_quick, api_key=api_key, temperature=0.0), priority=Priority.THINKING, site="thinking")
+        self._llm_deep = TimedLLM(ChatGoogle(model=model_deep, api_key=api_key, temperature=0.0), priority=Priority.THINKING, site="thinking")
 
-        self.principles = load_steering_principles()
-        self.memory_path = os.path.abspath("logs/working_memory.json")
-        self.memory = WorkingMemory.load(self.memory_path, max_items=max_memory_items)
+        # Old JSON window is imported once into the SQLite store
+        self.memory = memory if memory is not None else MemoryStore(legacy_json=os.path.abspath("logs/working_memory.json"))
+        self.memory_token_budget = memory_token_budget
+        self.rules = ThinkingRules()
+        self.cache = get_thinking_cache()
+        # Engines are session-scoped: pay for steering parsing here, not on the first step
+        get_compiled_steering()
 
     def _mode(self) -> ThinkMode:
         return os.environ.get("WEASZEL_THINKING_MODE", "quick").lower()  # off|quick|deep
 
-    def _should_think(self, *, step: int, consecutive_failures: int, task: str) -> bool:
+    def should_think(self, *, step: int, consecutive_failures: int, task: str) -> bool:
         if self._mode() == "off":
             return False
         # Always on for step 1 (helps initial navigation quality)
@@ -71,22 +108,81 @@ class ThinkingEngine:
         risky = any(w in t for w in ["checkout", "pay", "payment", "credit card", "submit application", "delete"])
         return risky
 
-    async def pre_step_think(self, *, task: str, state_hint: str, step: int, consecutive_failures: int) -> ThinkOutput | None:
-        if not self._should_think(step=step, consecutive_failures=consecutive_failures, task=task):
+    async def pre_step_think(
+        self,
+        *,
+        task: str,
+        state_hint: str,
+        step: int,
+        consecutive_failures: int,
+        task_type: str = "",
+        domain: str = "",
+        failure_class: str = "",
+        url: str = "",
+        last_error: str = "",
+    ) -> ThinkOutput | None:
+        if not self.should_think(step=step, consecutive_failures=consecutive_failures, task=task):
             return None
 
+        # Known situations are answered by local rules; the LLM only sees the unfamiliar ones.
+        verdict = self.rules.evaluate(
+            RuleContext(
+                step=step,
+                failures=consecutive_failures,
+                task=task,
+                task_type=task_type,
+                domain=domain,
+                url=url,
+                failure_class=failure_class,
+                last_error=last_error,
+            )
+        )
+        local = bool(verdict.fired) and verdict.confidence >= min_confidence()
+        emit(
+            "thinking.rules",
+            task_id=current_task_id.get(),
+            step=step,
+            fired=verdict.fired,
+            confidence=verdict.confidence,
+            path="local" if local else "llm",
+        )
+        if local:
+            return ThinkOutput(
+                reasoning=verdict.reasoning,
+                confidence=verdict.confidence,
+                recommendations=verdict.recommendations,
+                risks=verdict.risks,
+            )
+
         mode = self._mode()
         llm = self._llm_deep if mode == "deep" else self._llm_quick
 
-        wm_text = self.memory.render_for_prompt()
-        steering = (
-            "<steering>\n"
-            f"<safety>\n{self.principles.safety}\n</safety>\n"
-            f"<efficiency>\n{self.principles.efficiency}\n</efficiency>\n"
-            f"<reliability>\n{self.principles.reliability}\n</reliability>\n"
-            f"<prompting>\n{self.principles.prompting}\n</prompting>\n"
-            "</steering>"
+        cache_key = fingerprint(
+            "pre",
+            task=task,
+            url=url,
+            failure_class=failure_class,
+            step=step,
+            task_type=task_type,
+            mode=mode,
+            failures=min(consecutive_failures, 3),
         )
+        cached = self.cache.get("pre", cache_key)
+        if cached is not None:
+            return ThinkOutput(**cached)
+
+        wm_text = self.memory.render_for_prompt(
+            f"{task} {state_hint}",
+            domain=domain,
+            task_type=task_type,
+            failure_class=failure_class,
+            token_budget=self.memory_token_budget,
+            task_id=current_task_id.get(),
+        )
+        # Only the rules tagged for this task type / failure class (parsed once per process)
+        steering = get_compiled_steering().render(task_type=task_type, failure_class=failure_class)
+        fitted = fit([Section("working_memory", wm_text), Section("steering", steering)], where="thinking")
+        wm_text, steering = fitted["working_memory"], fitted["steering"]
 
         prompt = f"""
 You are Weaszel's self-thinking layer. Your job is to improve decision quality and reduce errors.
@@ -109,89 +205,81 @@ state_hint:
 <task>
 {task}
 </task>
-
-Return JSON ONLY:
-{{
-  "reasoning": "short paragraph",
-  "confidence": 0.0-1.0,
-  "recommendations": ["bullets..."],
-  "risks": ["bullets..."]
-}}
 """.strip()
 
         with span("thinking.pre", task_id=current_task_id.get(), step=current_step.get(), mode=mode):
-            resp = await llm.ainvoke([UserMessage(content=prompt)])
-
-        # Parse (best-effort)
-        import json
+            parsed = await ainvoke_structured(llm, [UserMessage(content=prompt)], PreThinkOutput, name="thinking.pre")
+        if parsed is None:
+            return None
+        out = ThinkOutput(
+            reasoning=parsed.reasoning.strip(),
+            confidence=parsed.confidence,
+            recommendations=parsed.recommendations[:8],
+            risks=parsed.risks[:8],
+        )
+        self.cache.put("pre", cache_key, asdict(out))
+        await self.cache.flush()
+        return out
 
-        text = (resp.completion or "").strip()
-        if text.startswith("```"):
-            text = text.split("```", 2)[1] if "```" in text else text
-            text = text.replace("json", "").strip()
-        try:
-            data = json.loads(text)
-            return ThinkOutput(
-                reasoning=str(data.get("reasoning", "")).strip(),
-                confidence=float(data.get("confidence", 0.5)),
-                recommendations=[str(x) for x in (data.get("recommendations") or [])][:8],
-                risks=[str(x) for x in (data.get("risks") or [])][:8],
-            )
-        except Exception:
-            # Fall back to raw text as a single recommendation
-            return ThinkOutput(reasoning=text[:800], confidence=0.3, recommendations=[], risks=[])
+    def should_reflect(self, *, step: int, had_error: bool) -> bool:
+        if self._mode() == "off":
+            return False
+        # Only reflect when something went wrong or periodically
+        return had_error or step % 5 == 0
 
     async def post_step_reflect(self, *, task: str, outcome_hint: str, step: int, had_error: bool) -> None:
-        if self._mode() == "off":
+        if not self.should_reflect(step=step, had_error=had_error):
             return
-        # Only reflect when something went wrong or periodically
-        if not had_error and step % 5 != 0:
+        await self.reflect_batch(task=task, outcomes=[StepOutcome(step=step, hint=outcome_hint, had_error=had_error)])
+
+    async def reflect_batch(self, *, task: str, outcomes: list[StepOutcome], task_type: str = "") -> None:
+        """One reflection call over several step outcomes."""
+        if not outcomes or self._mode() == "off":
             return
 
         mode = self._mode()
         llm = self._llm_quick if mode != "deep" else self._llm_deep
 
+        outcome_text = "\n".join(
+            f'<outcome step="{o.step}" error="{str(o.had_error).lower()}">{o.hint}</outcome>' for o in outcomes
+        )
         prompt = f"""
 You are Weaszel's reflection layer. Extract ONLY useful, reusable insights.
-Be extremely short. Do NOT restate the whole step.
+Be extremely short. Do NOT restate the steps. Merge what the outcomes have in common.
 
 <task>{task}</task>
-<outcome>{outcome_hint}</outcome>
-
-Return JSON ONLY:
-{{
-  "insights": ["1-4 short insights max"],
-  "mistakes": ["0-2 items max"],
-  "next_checks": ["0-3 items max"]
-}}
+{outcome_text}
 """.strip()
 
-        with span("thinking.post", task_id=current_task_id.get(), step=current_step.get(), mode=mode):
-            resp = await llm.ainvoke([UserMessage(content=prompt)])
+        with span(
+            "thinking.post",
+            task_id=current_task_id.get(),
+            step=outcomes[-1].step,
+            mode=mode,
+            batch_size=len(outcomes),
+        ):
+            with llm_priority(Priority.REFLECTION), llm_site("reflection"):
+                data = await ainvoke_structured(
+                    llm, [UserMessage(content=prompt)], ReflectionOutput, name="thinking.reflect"
+                )
+        if data is None:
+            return
 
-        import json
+        # Tag with where the batch happened (last outcome wins) so retrieval can match site/failure.
+        last = outcomes[-1]
+        failure_class = next((o.failure_class for o in reversed(outcomes) if o.failure_class), "")
+        rows = [("insight", x) for x in data.insights[:4]]
+        rows += [("mistake", x) for x in data.mistakes[:2]]
+        rows += [("next_check", x) for x in data.next_checks[:3]]
 
-        text = (resp.completion or "").strip()
-        if text.startswith("```"):
-            text = text.split("```", 2)[1] if "```" in text else text
-            text = text.replace("json", "").strip()
-        try:
-            data = json.loads(text)
-        except Exception:
-            data = {"insights": [text[:300]]}
-
-        for ins in (data.get("insights") or [])[:4]:
-            self.memory.add("insight", str(ins))
-        for m in (data.get("mistakes") or [])[:2]:
-            self.memory.add("mistake", str(m))
-        for nc in (data.get("next_checks") or [])[:3]:
-            self.memory.add("next_check", str(nc))
+        def _persist() -> None:
+            for kind, text in rows:
+                self.memory.add(kind, str(text), domain=last.domain, task_type=task_type, failure_class=failure_class)
 
+        # Single-row upserts, off the event loop
         try:
-            self.memory.save(self.memory_path)
+            await asyncio.to_thread(_persist)
         except Exception:
             pass
 
-        emit("thinking.memory_saved", task_id=current_task_id.get(), step=current_step.get())
-
-
+        emit("thinking.memory_saved", task_id=current_task_id.get(), step=outcomes[-1].step, batch_size=len(outcomes))
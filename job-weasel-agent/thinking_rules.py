@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+
+def _rules_path() -> str:
+    return os.environ.get(
+        "WEASZEL_THINKING_RULES",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "thinking_rules.json"),
+    )
+
+
+def min_confidence() -> float:
+    """Local rules answer when their combined confidence reaches this (WEASZEL_THINKING_RULE_CONFIDENCE)."""
+    try:
+        return float(os.environ.get("WEASZEL_THINKING_RULE_CONFIDENCE", "0.6"))
+    except ValueError:
+        return 0.6
+
+
+@dataclass
+class RuleContext:
+    step: int
+    failures: int = 0
+    task: str = ""
+    task_type: str = ""
+    domain: str = ""
+    url: str = ""
+    failure_class: str = ""
+    last_error: str = ""
+
+
+@dataclass
+class ThinkRule:
+    """
+    One declarative rule. Every key in `when` must hold:
+    task_type / failure_class (any of), domain (suffix match, any of), url / last_error / task
+    (regex search, case-insensitive), step_min / step_max, failures_min / failures_max.
+    """
+
+    id: str
+    confidence: float
+    when: dict[str, Any]
+    reasoning: str = ""
+    recommendations: list[str] = field(default_factory=list)
+    risks: list[str] = field(default_factory=list)
+    # Upper bound on the combined confidence when this rule fires (forces the LLM path)
+    cap_confidence: float | None = None
+    _patterns: dict[str, re.Pattern[str]] = field(default_factory=dict, repr=False)
+
+    def __post_init__(self) -> None:
+        for key in ("url", "last_error", "task"):
+            if key in self.when:
+                self._patterns[key] = re.compile(str(self.when[key]), re.I)
+
+    def matches(self, ctx: RuleContext) -> bool:
+        w = self.when
+        if "task_type" in w and ctx.task_type not in w["task_type"]:
+            return False
+        if "failure_class" in w and ctx.failure_class not in w["failure_class"]:
+            return False
+        if "domain" in w and not any(ctx.domain == d or ctx.domain.endswith("." + d) for d in w["domain"]):
+            return False
+        if ctx.step < w.get("step_min", 0) or ctx.step > w.get("step_max", ctx.step):
+            return False
+        if ctx.failures < w.get("failures_min", 0) or ctx.failures > w.get("failures_max", ctx.failures):
+            return False
+        for key, pattern in self._patterns.items():
+            if not pattern.search(getattr(ctx, key) or ""):
+                return False
+        return True
+
+
+@dataclass
+class RuleVerdict:
+    """Merged advice of the rules that fired (same fields as ThinkOutput)."""
+
+    confidence: float
+    fired: list[str]
+    reasoning: str = ""
+    recommendations: list[str] = field(default_factory=list)
+    risks: list[str] = field(default_factory=list)
+
+
+class ThinkingRules:
+    """
+    Deterministic pre-step thinking.
+
+    Rules live in thinking_rules.json (override: WEASZEL_THINKING_RULES). All matching rules
+    are merged, most confident first; the verdict's confidence is the best rule's, limited by
+    any `cap_confidence` that fired. The caller only spends an LLM call when it is below
+    min_confidence().
+    """
+
+    def __init__(self, rules: list[ThinkRule] | None = None):
+        self.rules = rules if rules is not None else self.load()
+
+    @staticmethod
+    def load(path: str | None = None) -> list[ThinkRule]:
+        try:
+            with open(path or _rules_path(), "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return []
+        rules = []
+        for r in raw if isinstance(raw, list) else []:
+            try:
+                rules.append(
+                    ThinkRule(
+                        id=str(r["id"]),
+                        confidence=float(r.get("confidence", 0.5)),
+                        when=dict(r.get("when") or {}),
+                        reasoning=str(r.get("reasoning", "")),
+                        recommendations=[str(x) for x in r.get("recommendations") or []],
+                        risks=[str(x) for x in r.get("risks") or []],
+                        cap_confidence=r.get("cap_confidence"),
+                    )
+                )
+            except (KeyError, TypeError, ValueError, re.error):
+                continue
+        return rules
+
+    def evaluate(self, ctx: RuleContext) -> RuleVerdict:
+        fired = sorted((r for r in self.rules if r.matches(ctx)), key=lambda r: -r.confidence)
+        if not fired:
+            return RuleVerdict(confidence=0.0, fired=[])
+
+        confidence = fired[0].confidence
+        caps = [r.cap_confidence for r in fired if r.cap_confidence is not None]
+        if caps:
+            confidence = min(confidence, *caps)
+
+        recs: list[str] = []
+        risks: list[str] = []
+        for r in fired:
+            recs.extend(x for x in r.recommendations if x not in recs)
+            risks.extend(x for x in r.risks if x not in risks)
+        return RuleVerdict(
+            confidence=confidence,
+            fired=[r.id for r in fired],
+            reasoning=" ".join(r.reasoning for r in fired if r.reasoning),
+            recommendations=recs[:6],
+            risks=risks[:4],
+        )
@@ -1,66 +1,80 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Awaitable, Callable
 
+from llm_middleware import LAYERS, HooksMiddleware, LLMPipeline, Middleware, layers_for, priority_site
+from llm_scheduler import Priority
 from perf_context import current_step, current_task_id
-from perf_logger import emit, span
+from perf_logger import span
 
 
 class TimedLLM:
     """
-    Lightweight wrapper that times LLM calls (ainvoke/invoke) and emits perf events.
-    Works with Browser-Use BaseChatModel implementations (e.g., ChatGoogle).
+    Wrapper every Weaszel LLM call goes through. Works with Browser-Use BaseChatModel
+    implementations (e.g., ChatGoogle).
+
+    Async calls run through the llm_middleware stack (hooks, timing, usage, budget, response
+    cache, retry, hedge, rate limit); the layers are chosen per call site (`site`: agent, planner, thinking,
+    reflection, replan) and can be overridden with WEASZEL_LLM_LAYERS_<SITE>. `priority` is
+    the scheduler default for this wrapper; `llm_priority(...)` / `llm_site(...)` override
+    both per call.
+
+    `before_invoke` hooks get (messages, kwargs) right before a call is sent and return
+    the messages to send; this is the last point where late context can be attached.
     """
 
-    def __init__(self, llm: Any):
+    def __init__(self, llm: Any, priority: int = Priority.FOREGROUND, site: str | None = None):
         self._llm = llm
+        self.priority = priority
+        self.site = site or priority_site(priority)
+        self.before_invoke: list[Callable[[list[Any], dict[str, Any]], Awaitable[list[Any]]]] = []
+        self.pipeline = LLMPipeline(
+            llm,
+            [LAYERS[name](self) for name in layers_for(self.site)],
+            site=self.site,
+            priority=priority,
+        )
 
     def __getattr__(self, item: str) -> Any:
         # Delegate unknown attrs to the wrapped instance.
         return getattr(self._llm, item)
 
+    def derive(self, llm: Any, *, drop: tuple[str, ...] = ()) -> "TimedLLM":
+        """Sibling wrapper over another client with this one's site, priority and before_invoke hooks."""
+        twin = TimedLLM(llm, priority=self.priority, site=self.site)
+        twin.before_invoke = self.before_invoke
+        twin.pipeline.layers = [
+            HooksMiddleware(self.before_invoke) if layer.name == "hooks" else layer
+            for layer in twin.pipeline.layers
+            if layer.name not in drop
+        ]
+        return twin
+
+    def use(self, layer: Middleware, *, after: str | None = "hooks") -> "TimedLLM":
+        self.pipeline.use(layer, after=after)
+        return self
+
     @property
     def provider(self) -> str:
-        return getattr(self._llm, "provider", "unknown")
+        return self.pipeline.provider
 
     @property
     def model(self) -> str:
-        return str(getattr(self._llm, "model", getattr(self._llm, "name", "unknown")))
+        return self.pipeline.model
 
     async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
-        with span(
-            "llm.ainvoke",
-            provider=self.provider,
-            model=self.model,
-            task_id=current_task_id.get(),
-            step=current_step.get(),
-        ):
-            result = await self._llm.ainvoke(*args, **kwargs)
-        # Best-effort usage reporting (varies by provider)
-        usage = getattr(result, "usage", None)
-        if usage is not None:
-            emit(
-                "llm.usage",
-                provider=self.provider,
-                model=self.model,
-                task_id=current_task_id.get(),
-                step=current_step.get(),
-                prompt_tokens=getattr(usage, "prompt_tokens", None),
-                completion_tokens=getattr(usage, "completion_tokens", None),
-                total_tokens=getattr(usage, "total_tokens", None),
-                prompt_image_tokens=getattr(usage, "prompt_image_tokens", None),
-                prompt_cached_tokens=getattr(usage, "prompt_cached_tokens", None),
-            )
-        return result
+        if args:
+            return await self.pipeline.ainvoke(args[0], *args[1:], **kwargs)
+        messages = kwargs.pop("messages")
+        return await self.pipeline.ainvoke(messages, **kwargs)
 
     def invoke(self, *args: Any, **kwargs: Any) -> Any:
         with span(
             "llm.invoke",
             provider=self.provider,
             model=self.model,
+            site=self.site,
             task_id=current_task_id.get(),
             step=current_step.get(),
         ):
             return self._llm.invoke(*args, **kwargs)
-
-
@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+
+# Label (lowercased, without trailing parentheticals) -> profile attribute.
+_LABEL_ALIASES: dict[str, str] = {
+    "name": "name",
+    "full name": "name",
+    "email": "email",
+    "e-mail": "email",
+    "phone": "phone",
+    "phone number": "phone",
+    "location": "location",
+    "address": "location",
+    "links": "links",
+    "link": "links",
+    "github": "github",
+    "linkedin": "linkedin",
+    "portfolio": "website",
+    "website": "website",
+    "work authorization": "work_authorization",
+    "visa status": "work_authorization",
+    "sponsorship": "work_authorization",
+    "resume": "resume_path",
+    "resume file path": "resume_path",
+    "resume path": "resume_path",
+    "salary": "salary",
+    "salary floor": "salary",
+    "budget": "budget",
+    "budget constraints": "budget",
+    "target titles": "target_titles",
+    "target job titles": "target_titles",
+    "locations": "preferred_locations",
+    "default location for searches": "preferred_locations",
+    "experience": "experience",
+    "skills": "skills",
+}
+
+_LIST_ATTRS = {"target_titles", "preferred_locations", "skills"}
+
+_KV_RE = re.compile(r"^\s*(?:[-*]\s*)?\**([A-Za-z][A-Za-z /&-]*?)(?:\s*\([^)]*\))?\**\s*:\s*\**\s*(.*?)\s*$")
+_URL_RE = re.compile(r"(https?://\S+|(?:www\.)?(?:linkedin\.com|github\.com)/\S+)", re.IGNORECASE)
+_RESUME_RE = re.compile(r"[`'\"]?((?:~|/|[A-Za-z]:\\)[^\s`'\"]+\.(?:pdf|docx?))", re.IGNORECASE)
+
+
+@dataclass
+class UserProfile:
+    """
+    Structured identity fields compiled from user_data.md.
+    Only fields present in the file are set; everything else stays empty.
+    """
+
+    name: str = ""
+    email: str = ""
+    phone: str = ""
+    location: str = ""
+    linkedin: str = ""
+    github: str = ""
+    website: str = ""
+    work_authorization: str = ""
+    resume_path: str = ""
+    salary: str = ""
+    budget: str = ""
+    target_titles: str = ""
+    preferred_locations: str = ""
+    experience: str = ""
+    skills: str = ""
+    extra: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def first_name(self) -> str:
+        return self.name.split()[0] if self.name.split() else ""
+
+    @property
+    def last_name(self) -> str:
+        parts = self.name.split()
+        return parts[-1] if len(parts) > 1 else ""
+
+    def is_empty(self) -> bool:
+        return not any([self.name, self.email, self.phone, self.location, self.linkedin, self.github, self.website])
+
+    def field_values(self) -> dict[str, str]:
+        """Flat key -> value map used by form filling (empty values omitted)."""
+        parts = [p.strip() for p in self.location.split(",") if p.strip()]
+        # "27 Main St, Stamford, CT" -> skip the street part
+        if len(parts) > 1 and parts[0][:1].isdigit():
+            parts = parts[1:]
+        city = parts[0] if parts else ""
+        values = {
+            "full_name": self.name,
+            "first_name": self.first_name,
+            "last_name": self.last_name,
+            "email": self.email,
+            "phone": self.phone,
+            "location": self.location,
+            "city": city,
+            "linkedin": self.linkedin,
+            "github": self.github,
+            "website": self.website or self.github or self.linkedin,
+            "work_authorization": self.work_authorization,
+        }
+        return {k: v for k, v in values.items() if v}
+
+
+def _assign_links(profile: UserProfile, value: str) -> None:
+    for url in _URL_RE.findall(value):
+        url = url.rstrip(").,;")
+        if not url.lower().startswith("http"):
+            url = "https://" + url
+        lc = url.lower()
+        if "linkedin.com" in lc and not profile.linkedin:
+            profile.linkedin = url
+        elif "github.com" in lc and not profile.github:
+            profile.github = url
+        elif not profile.website:
+            profile.website = url
+
+
+def compile_profile(user_data: str) -> UserProfile:
+    """
+    Parse `Key: value` lines from user_data.md into a UserProfile.
+
+    Unknown keys are kept in `extra` (lowercased label) so later consumers can
+    pick them up without re-reading the markdown.
+    """
+    profile = UserProfile()
+    if not user_data:
+        return profile
+
+    # A label with an empty value followed by a bullet list ("**Target Job Titles:**\n- A\n- B")
+    list_attr: str | None = None
+    for line in user_data.splitlines():
+        m = _KV_RE.match(line)
+        if not m:
+            bullet = line.strip()
+            if list_attr and bullet[:1] in ("-", "*") and bullet[1:].strip():
+                current = getattr(profile, list_attr)
+                item = bullet[1:].strip()
+                setattr(profile, list_attr, f"{current}, {item}" if current else item)
+            elif bullet:
+                list_attr = None
+            continue
+        label = m.group(1).strip().lower()
+        value = m.group(2).strip().strip("*").strip()
+        attr = _LABEL_ALIASES.get(label)
+        list_attr = attr if (not value and attr in _LIST_ATTRS and not getattr(profile, attr)) else None
+        if not value:
+            continue
+        if attr is None:
+            profile.extra.setdefault(label, value[:300])
+            continue
+        if attr == "links":
+            _assign_links(profile, value)
+        elif attr in ("linkedin", "github", "website"):
+            if not getattr(profile, attr):
+                _assign_links(profile, value)
+                if not getattr(profile, attr):
+                    setattr(profile, attr, value)
+        elif not getattr(profile, attr):
+            setattr(profile, attr, value)
+
+    if not profile.resume_path:
+        m = _RESUME_RE.search(user_data)
+        if m:
+            profile.resume_path = m.group(1)
+    return profile
+
+
+def find_user_data_path() -> str | None:
+    """
+    Locate user_data.md.
+
+    Search order:
+    1) ./user_data.md (repo root / current working directory)
+    2) job-weasel-agent/user_data.md (legacy location next to this file)
+    """
+    candidates = [
+        os.path.abspath("user_data.md"),
+        os.path.join(os.path.dirname(__file__), "user_data.md"),
+    ]
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_user_profile() -> UserProfile | None:
+    path = find_user_data_path()
+    if path is None:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            profile, _ = ProfileCardCache().get(f.read())
+    except OSError:
+        return None
+    return None if profile.is_empty() else profile
+
+
+_CARD_VERSION = 2
+
+# Which card sections each task type needs. Everything else stays out of the prompt.
+# "Apply to …" queries are often planned as job_search, so it carries identity too; "notes"
+# (free-form lines from user_data.md, e.g. "Anything else the agent should remember") go everywhere.
+_CARD_SECTIONS: dict[str, tuple[str, ...]] = {
+    "form_filling": ("identity", "notes"),
+    "job_application": ("identity", "job", "notes"),
+    "job_search": ("identity", "job", "notes"),
+    "shopping": ("identity", "shopping", "notes"),
+}
+_DEFAULT_SECTIONS = ("identity", "notes")
+
+
+def build_profile_card(profile: UserProfile) -> dict[str, dict[str, str]]:
+    """Group profile fields into compact, task-selectable sections (empty values dropped)."""
+    sections = {
+        "identity": {
+            "name": profile.name,
+            "email": profile.email,
+            "phone": profile.phone,
+            "location": profile.location,
+            "linkedin": profile.linkedin,
+            "github": profile.github,
+            "website": profile.website,
+        },
+        "job": {
+            "work_authorization": profile.work_authorization,
+            "salary": profile.salary,
+            "target_titles": profile.target_titles,
+            "preferred_locations": profile.preferred_locations,
+            "experience": profile.experience,
+            "skills": profile.skills,
+            "resume_path": profile.resume_path,
+        },
+        "shopping": {
+            "budget": profile.budget,
+            "shipping_location": profile.location,
+        },
+        "notes": dict(profile.extra),
+    }
+    return {name: {k: v for k, v in fields.items() if v} for name, fields in sections.items()}
+
+
+class ProfileCardCache:
+    """
+    Compiles user_data.md into a profile card once per content hash.
+
+    The card is persisted next to other runtime artifacts so a restart with an
+    unchanged user_data.md skips parsing entirely.
+    """
+
+    def __init__(self, cache_path: str | None = None):
+        self.cache_path = cache_path or os.path.abspath("logs/profile_card.json")
+        self._digest: str | None = None
+        self._card: dict[str, Any] | None = None
+        self._profile: UserProfile | None = None
+
+    def _load_disk(self, digest: str) -> bool:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if raw.get("sha256") != digest or raw.get("version") != _CARD_VERSION:
+            return False
+        self._card = dict(raw.get("card") or {})
+        self._profile = UserProfile(**dict(raw.get("profile") or {}))
+        return True
+
+    def _save_disk(self, digest: str) -> None:
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        payload = {
+            "version": _CARD_VERSION,
+            "sha256": digest,
+            "card": self._card,
+            "profile": asdict(self._profile) if self._profile else {},
+        }
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.cache_path)
+
+    def get(self, user_data: str) -> tuple[UserProfile, dict[str, Any]]:
+        """Return (profile, card) for the given user_data text, recompiling only on change."""
+        digest = hashlib.sha256((user_data or "").encode("utf-8")).hexdigest()
+        if digest != self._digest or self._card is None:
+            if not self._load_disk(digest):
+                self._profile = compile_profile(user_data)
+                self._card = build_profile_card(self._profile)
+                try:
+                    self._save_disk(digest)
+                except OSError:
+                    pass
+            self._digest = digest
+        return self._profile or UserProfile(), self._card or {}
+
+
+def render_profile_card(card: dict[str, Any], task_type: str) -> str:
+    """
+    Render only the sections relevant to task_type as compact JSON.
+    Returns "" if the card has nothing useful for this task type.
+    """
+    sections = _CARD_SECTIONS.get(task_type, _DEFAULT_SECTIONS)
+    selected = {name: card[name] for name in sections if card.get(name)}
+    if not selected:
+        return ""
+    return json.dumps(selected, ensure_ascii=False, separators=(",", ":"))